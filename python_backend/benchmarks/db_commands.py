@@ -0,0 +1,107 @@
+"""
+Daily-limit check throughput: the old synchronous session inside the async
+handler, the async session doing SELECT + INSERT/UPDATE, and the single
+upsert with its in-memory rejection cache (database/players.py).
+
+Runs COMMANDS /battle limit checks, CONCURRENCY at a time, against a fresh
+SQLite file, and reports commands/sec plus the longest event-loop stall seen
+by a 10 ms ticker (how long every other command - and the Discord heartbeat -
+had to wait).
+
+    python python_backend/benchmarks/db_commands.py [commands] [concurrency]
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+DB_FILE = os.path.join(tempfile.mkdtemp(), "bench.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{DB_FILE}"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import select
+from database.db_manager import init_db, get_db, db_session, async_engine
+from database.models import Player
+from database.players import DailyBattleLimiter
+
+COMMANDS = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+CONCURRENCY = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+USERS = COMMANDS // 2 # every user tries twice, so half the checks are rejections
+# "allowed" above USERS means two racing checks both let the same player through
+
+async def sync_daily_check(discord_id):
+    """The pre-async handler body: blocking session, next(get_db()) dance."""
+    db_gen = get_db()
+    db = next(db_gen)
+    try:
+        player = db.query(Player).filter_by(discord_id=discord_id).first()
+        if player and player.last_1v1_battle_at and player.last_1v1_battle_at.date() == datetime.utcnow().date():
+            return False
+        if not player:
+            player = Player(discord_id=discord_id)
+            db.add(player)
+        player.last_1v1_battle_at = datetime.utcnow()
+        db.commit()
+        return True
+    finally:
+        try:
+            next(db_gen)
+        except StopIteration:
+            pass
+
+async def select_daily_check(discord_id):
+    """Async session, but still SELECT then INSERT/UPDATE in separate round-trips."""
+    async with db_session() as db:
+        player = (await db.execute(select(Player).filter_by(discord_id=discord_id))).scalar_one_or_none()
+        if player and player.last_1v1_battle_at and player.last_1v1_battle_at.date() == datetime.utcnow().date():
+            return False
+        if not player:
+            player = Player(discord_id=discord_id)
+            db.add(player)
+        player.last_1v1_battle_at = datetime.utcnow()
+        await db.commit()
+        return True
+
+async def watch_loop(stop, interval=0.01):
+    """Longest delay between ticks beyond the interval."""
+    worst = 0.0
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        worst = max(worst, time.perf_counter() - started - interval)
+    return worst
+
+async def run(label, check):
+    limiter = DailyBattleLimiter()
+    await limiter.reset()
+    check = check or limiter.claim
+    slots = asyncio.Semaphore(CONCURRENCY)
+    allowed = 0
+
+    async def command(i):
+        nonlocal allowed
+        async with slots:
+            if await check(str(i % USERS)):
+                allowed += 1
+
+    stop = asyncio.Event()
+    watcher = asyncio.create_task(watch_loop(stop))
+    started = time.perf_counter()
+    await asyncio.gather(*(command(i) for i in range(COMMANDS)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    stall = await watcher
+    print(f"{label:<6} {COMMANDS / elapsed:8.0f} commands/s  max loop stall {stall * 1000:7.1f} ms  ({allowed} allowed)")
+
+async def main():
+    init_db()
+    print(f"{COMMANDS} daily-limit checks, {CONCURRENCY} concurrent, {USERS} users ({DB_FILE})")
+    await run("sync", sync_daily_check)
+    await run("select", select_daily_check)
+    await run("upsert", None)
+    await async_engine.dispose()
+
+if __name__ == "__main__":
+    asyncio.run(main())
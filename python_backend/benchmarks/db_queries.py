@@ -0,0 +1,88 @@
+"""
+Game-schema query timings on a synthetic dataset, before and after the
+index migration (database/migrations.py), on the tuned SQLite connection.
+
+Builds PLAYERS players, a bracket of matches per tournament and BETS bets in
+a fresh SQLite file, drops the migration's indexes, times the hot queries,
+runs the migrations and times them again.
+
+    python python_backend/benchmarks/db_queries.py [bets]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+DB_FILE = os.path.join(tempfile.mkdtemp(), "bench.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{DB_FILE}"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text
+from database.db_manager import engine
+from database.models import Base
+from database.migrations import MIGRATIONS, run_migrations
+
+BETS = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+PLAYERS = max(1000, BETS // 10)
+TOURNAMENTS = max(100, BETS // 100)
+MATCHES_PER_TOURNAMENT = 7 # 8-player bracket: 4 + 2 + 1
+LOOKUPS = 200
+
+QUERIES = {
+    "bets by match": ("SELECT player_id, amount, predicted_winner_id FROM bets WHERE match_id = :id", "match"),
+    "matches by tournament round": ("SELECT id, player1_id, player2_id FROM matches WHERE tournament_id = :id AND round_number = 2", "tournament"),
+    "top 10 by wins": ("SELECT discord_id, wins FROM players ORDER BY wins DESC LIMIT 10", None),
+}
+
+def build():
+    Base.metadata.create_all(bind=engine)
+    rng = random.Random(42)
+    started = time.perf_counter()
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO players (discord_id, balance, wins, losses) VALUES (:d, 100, :w, :l)"),
+                     [{'d': str(i), 'w': rng.randint(0, 500), 'l': rng.randint(0, 500)} for i in range(PLAYERS)])
+        conn.execute(text("INSERT INTO tournaments (status, bracket_size, current_round) VALUES ('completed', 8, 3)"),
+                     [{} for _ in range(TOURNAMENTS)])
+        matches = []
+        for t in range(1, TOURNAMENTS + 1):
+            for slot in range(MATCHES_PER_TOURNAMENT):
+                round_number = 1 if slot < 4 else 2 if slot < 6 else 3
+                a, b = rng.randint(1, PLAYERS), rng.randint(1, PLAYERS)
+                matches.append({'t': t, 'a': a, 'b': b, 'w': a, 'r': round_number})
+        conn.execute(text("INSERT INTO matches (tournament_id, player1_id, player2_id, winner_id, round_number) VALUES (:t, :a, :b, :w, :r)"), matches)
+        conn.execute(text("INSERT INTO bets (match_id, player_id, amount, predicted_winner_id) VALUES (:m, :p, :a, :w)"),
+                     [{'m': rng.randint(1, len(matches)), 'p': rng.randint(1, PLAYERS), 'a': rng.uniform(1, 50), 'w': rng.randint(1, PLAYERS)}
+                      for _ in range(BETS)])
+    print(f"Built {PLAYERS} players, {TOURNAMENTS} tournaments, {len(matches)} matches, {BETS} bets in {time.perf_counter() - started:.1f}s")
+    return len(matches)
+
+def time_queries(label, match_count):
+    rng = random.Random(7)
+    with engine.connect() as conn:
+        for name, (sql, key) in QUERIES.items():
+            started = time.perf_counter()
+            for _ in range(LOOKUPS):
+                bound = rng.randint(1, match_count if key == "match" else TOURNAMENTS)
+                conn.execute(text(sql), {'id': bound}).fetchall()
+            per_query = (time.perf_counter() - started) / LOOKUPS * 1000
+            print(f"  {label:<7} {name:<28} {per_query:9.3f} ms/query")
+
+def main():
+    match_count = build()
+    with engine.begin() as conn:
+        # Start from the pre-migration schema
+        for statement in MIGRATIONS[0][2]:
+            index_name = statement.split(" IF NOT EXISTS ")[1].split()[0]
+            conn.execute(text(f"DROP INDEX IF EXISTS {index_name}"))
+        conn.execute(text("DROP TABLE IF EXISTS schema_migrations"))
+        print(f"journal_mode={conn.execute(text('PRAGMA journal_mode')).scalar()}, synchronous={conn.execute(text('PRAGMA synchronous')).scalar()}")
+
+    time_queries("before", match_count)
+    started = time.perf_counter()
+    run_migrations(engine)
+    print(f"  migrations took {time.perf_counter() - started:.1f}s")
+    time_queries("after", match_count)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Settling a betting market: one ledger transaction for the whole market
+(database/ledger.py) vs paying each winner separately, the way the old
+add_balance loop did (one read + one write + one commit per winner).
+
+Markets of each size in MARKET_SIZES get that many bets from distinct
+players, half on each side; both ways are timed on the same SQLite file and
+the ledger is checked to still add up afterwards.
+
+    python python_backend/benchmarks/ledger_settlement.py [size ...]
+"""
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+import uuid
+
+DB_FILE = os.path.join(tempfile.mkdtemp(), "bench.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{DB_FILE}"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from datetime import datetime
+from sqlalchemy import func, select, update
+from database.db_manager import init_db, db_session, async_engine
+from database.ledger import Ledger
+from database.models import Bet, LedgerEntry, Player
+
+MARKET_SIZES = [int(n) for n in sys.argv[1:]] or [100, 1000, 5000]
+
+async def fill_market(ledger, size):
+    market_id = str(uuid.uuid4())
+    rng = random.Random(size)
+    for i in range(size):
+        await ledger.place_bet(market_id, f"{market_id[:8]}-{i}", 'A' if i % 2 else 'B', rng.randint(1, 50))
+    return market_id
+
+async def settle_per_winner(market_id, winning_team):
+    """The old shape: pay winners one at a time, each its own transaction."""
+    async with db_session() as db:
+        bets = (await db.execute(select(Bet.id, Bet.player_id, Bet.amount, Bet.team).where(Bet.market_id == market_id, Bet.settled_at.is_(None)))).all()
+    pot = sum(bet.amount for bet in bets)
+    odds = pot / sum(bet.amount for bet in bets if bet.team == winning_team)
+    for bet in bets:
+        payout = bet.amount * odds if bet.team == winning_team else 0.0
+        async with db_session() as db:
+            if payout:
+                player = await db.get(Player, bet.player_id)
+                player.balance += payout
+                db.add(LedgerEntry(player_id=bet.player_id, amount=payout, reason='payout', bet_id=bet.id, market_id=market_id))
+            await db.execute(update(Bet).where(Bet.id == bet.id).values(payout=payout, settled_at=datetime.utcnow()))
+            await db.commit()
+    return len(bets)
+
+async def check_books():
+    async with db_session() as db:
+        balances = (await db.execute(select(func.sum(Player.balance)))).scalar() or 0.0
+        entries = (await db.execute(select(func.sum(LedgerEntry.amount)))).scalar() or 0.0
+        open_bets = (await db.execute(select(func.count()).where(Bet.settled_at.is_(None)))).scalar()
+    return abs(balances - entries) < 1e-6, open_bets
+
+async def main():
+    init_db()
+    ledger = Ledger(starting_balance=1000)
+    print(f"Settling markets ({DB_FILE})")
+    for size in MARKET_SIZES:
+        loop_market = await fill_market(ledger, size)
+        batch_market = await fill_market(ledger, size)
+
+        started = time.perf_counter()
+        await settle_per_winner(loop_market, 'A')
+        per_winner = time.perf_counter() - started
+
+        started = time.perf_counter()
+        winners = await ledger.settle(batch_market, 'A')
+        batched = time.perf_counter() - started
+
+        print(f"  {size:>6} bets: per-winner {per_winner * 1000:8.1f} ms, one transaction {batched * 1000:7.1f} ms "
+              f"({per_winner / batched:5.1f}x, {len(winners)} winners)")
+
+    balanced, open_bets = await check_books()
+    print(f"Ledger balanced: {balanced}, unsettled bets left: {open_bets}")
+    await async_engine.dispose()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -4,8 +4,17 @@ from discord import app_commands
 import json
 import os
 from engine.fighter import Fighter
-from database.db_manager import get_db
-from database.models import Player
+from database.players import daily_limiter
+from integrations.http_client import http_client
+from integrations.provider_router import provider_router
+from integrations.rate_limiter import rate_limiter
+from integrations.image_payload import recent_peaks
+from integrations.transcoder import transcoder
+from engine.deadline import stage_overruns
+from engine.round_scheduler import round_scheduler
+from engine.prefetcher import prefetch_stats
+from integrations.cluster import ClusterClient, shard_metrics
+from config import settings
 
 # Default Configuration
 DEFAULT_CONFIG = {
@@ -19,15 +28,34 @@ DEFAULT_CONFIG = {
     "house_edge": 0.05,
     "theme": "cyberpunk",
     "nft_collection": "None",
-    "narrator_style": "Dynamic"
+    "narrator_style": "Dynamic",
+    "scene_concurrency": 3 # Max scene images generated at once per battle
 }
 
 CONFIG_FILE = "server_config.json"
 
+# Discord rejects messages longer than this
+MESSAGE_LIMIT = 2000
+
+def split_lines(lines, limit=MESSAGE_LIMIT):
+    """Packs lines into as few messages as fit under Discord's length limit (an over-long line is cut)."""
+    messages, current = [], ""
+    for line in lines:
+        line = line[:limit]
+        if current and len(current) + 1 + len(line) > limit:
+            messages.append(current)
+            current = line
+        else:
+            current = f"{current}\n{line}" if current else line
+    if current:
+        messages.append(current)
+    return messages
+
 class Admin(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
         self.config = self.load_config()
+        self.cluster = ClusterClient()
 
     def load_config(self):
         if os.path.exists(CONFIG_FILE):
@@ -160,6 +188,16 @@ class Admin(commands.Cog):
         self.save_config()
         await ctx.send(f"✅ Tournament size set to **{size}** players.")
 
+    @commands.hybrid_command(name="admin_scene_concurrency", description="Set how many battle scenes generate at once")
+    @commands.has_permissions(administrator=True)
+    async def admin_scene_concurrency(self, ctx, scenes: int):
+        if scenes not in [1, 2, 3]:
+            await ctx.send("❌ Invalid value. Please choose 1 (sequential), 2, or 3 (all scenes at once).")
+            return
+        self.config["scene_concurrency"] = scenes
+        self.save_config()
+        await ctx.send(f"✅ Battles will now generate up to **{scenes}** scene(s) at once.")
+
     @commands.hybrid_command(name="admin_give_token", description="Give tokens to a user (Faucet)")
     @commands.has_permissions(administrator=True)
     async def admin_give_token(self, ctx, member: discord.Member, amount: float):
@@ -172,7 +210,7 @@ class Admin(commands.Cog):
             await ctx.send("❌ Betting module not loaded.")
             return
             
-        betting_cog.add_balance(member.id, amount)
+        await betting_cog.add_balance(member.id, amount)
         await ctx.send(f"💸 Sent **{amount} {self.config['payout_token']}** to {member.mention}")
 
     @commands.hybrid_command(name="admin_debug_tournament", description="Test tournament flow")
@@ -186,9 +224,10 @@ class Admin(commands.Cog):
             return
 
         # Reset Queue
-        battle_cog.queue = []
-        battle_cog.tournament_mode = 'ROYALE'
-        battle_cog.debug_mode = True
+        session = battle_cog.sessions.get(ctx)
+        session.queue = []
+        session.tournament_mode = 'ROYALE'
+        session.debug_mode = True
         
         # Mock Member Class
         class MockMember:
@@ -213,11 +252,11 @@ class Admin(commands.Cog):
             Fighter(MockMember("Pepe H", 1008))
         ]
         
-        battle_cog.queue.extend(pepes)
+        session.queue.extend(pepes)
         
         await ctx.send(f"✅ Registered {len(pepes)} fighters. Starting bracket...")
         await battle_cog.start_tournament(ctx)
-        battle_cog.debug_mode = False # Reset after start
+        session.debug_mode = False # Reset after start
 
     @commands.hybrid_command(name="gang_choice", description="Set up Gang Battle (Host Collection)")
     @commands.has_permissions(administrator=True)
@@ -227,11 +266,12 @@ class Admin(commands.Cog):
         if not battle_cog:
             return await ctx.send("❌ Battle module not loaded.")
             
-        battle_cog.tournament_mode = 'GANG'
-        battle_cog.team_names['A'] = team_a
-        battle_cog.team_names['B'] = team_b
-        battle_cog.queue = []
-        battle_cog.team_rosters = {'A': [], 'B': []}
+        session = battle_cog.sessions.get(ctx)
+        session.tournament_mode = 'GANG'
+        session.team_names['A'] = team_a
+        session.team_names['B'] = team_b
+        session.queue = []
+        session.team_rosters = {'A': [], 'B': []}
         
         await ctx.send(f"⚔️ **Gang Battle Setup!**\nTeams: **{team_a}** vs **{team_b}**\nUse `/register` to join.")
 
@@ -246,7 +286,168 @@ class Admin(commands.Cog):
     @commands.has_permissions(administrator=True)
     async def admin_health(self, ctx):
         latency = round(self.bot.latency * 1000)
-        await ctx.send(f"💚 **System Healthy**\nLatency: {latency}ms\nDatabase: Connected")
+        lines = ["💚 **System Healthy**", f"Latency: {latency}ms", "Database: Connected"]
+        
+        http = http_client.stats()
+        lines.append(
+            f"HTTP Pool: {http['connections_reused']} reused / {http['connections_created']} new connections "
+            f"({http['reuse_ratio']*100:.0f}% reuse, {http['requests']} requests)"
+        )
+        
+        battle_cog = self.bot.get_cog("Battle")
+        if battle_cog:
+            cache = battle_cog.vision.cache.get_stats()
+            lines.append(
+                f"Avatar Cache: {cache['hit_ratio']*100:.0f}% hit rate "
+                f"({cache['memory_hits']} memory / {cache['disk_hits']} disk / {cache['hash_hits']} hash hits, {cache['misses']} misses)"
+            )
+            pool = battle_cog.assets.get_stats()
+            lines.append(
+                f"Asset Pool ({pool['themes']} themes): {pool['backdrops']} backdrops / {pool['snippets']} snippet sets ready, "
+                f"{pool['backdrops_used']} backdrops and {pool['snippets_used']} snippets used"
+            )
+            narrator = battle_cog.narrator.stats
+            lines.append(
+                f"Narrator: {narrator['requests']} LLM calls, {narrator['prompt_tokens'] + narrator['completion_tokens']} tokens, "
+                f"{narrator['fallback_beats']} beats from the local narrator"
+            )
+        
+        supermachine = getattr(self.bot, 'supermachine', None)
+        if supermachine:
+            ctrl = supermachine.control_images.get_stats()
+            lines.append(
+                f"Control Images: {ctrl['entries']} cached ({ctrl['bytes'] / 1024 / 1024:.1f} MB), "
+                f"{ctrl['hits']} hits / {ctrl['revalidated']} revalidated / {ctrl['downloads']} downloads"
+            )
+            pending = supermachine.pending_requests.get_stats()
+            lines.append(
+                f"Supermachine Requests: {pending['outstanding']} outstanding, {pending['completed']} completed, "
+                f"{pending['cancelled']} cancelled, {pending['expired']} expired, {pending['late_arrivals']} late webhooks"
+            )
+        
+        encode = transcoder.get_stats()
+        if encode['enabled']:
+            lines.append(
+                f"Transcoding: {encode['images']} scenes, saved {encode['saved_bytes'] / 1024 / 1024:.1f} MB "
+                f"({encode['skipped']} kept as-is, {encode['failures']} failed)"
+            )
+        
+        if recent_peaks:
+            lines.append(
+                f"Image Memory: last battle peak {recent_peaks[-1] / 1024 / 1024:.1f} MB, "
+                f"worst of last {len(recent_peaks)} {max(recent_peaks) / 1024 / 1024:.1f} MB"
+            )
+        
+        rounds = round_scheduler.get_stats()
+        lines.append(
+            f"Match Slots: {rounds['active']}/{rounds['slots']} generating, {rounds['waiting']} waiting "
+            f"({rounds['matches']} matches over {rounds['rounds']} rounds, {rounds['failed']} failed)"
+        )
+        if battle_cog:
+            sessions = battle_cog.sessions.get_stats()
+            lines.append(f"Sessions: {sessions['sessions']} open, {sessions['tournaments']} tournaments running, {sessions['registering']} registering")
+            lines.append(
+                f"Prefetch: {prefetch_stats['used']}/{prefetch_stats['prefetched']} prefetched matches used, "
+                f"{prefetch_stats['dropped']} dropped, {sessions['prefetching']} pending"
+            )
+            if battle_cog.jobs:
+                jobs = await battle_cog.jobs.get_stats()
+                counts = jobs['jobs']
+                lines.append(
+                    f"Job Queue: {counts['queued']} queued, {counts['running']} running, {jobs['waiting']} awaited here "
+                    f"({jobs.get('done', 0)} done, {jobs.get('failed', 0)} failed, {jobs.get('timed_out', 0)} timed out)"
+                )
+
+        limits = daily_limiter.get_stats()
+        lines.append(
+            f"Daily 1v1 Limit: {limits['allowed']} allowed, {limits['rejected_cached'] + limits['rejected_db']} rejected "
+            f"({limits['rejected_cached']} from memory), {limits['cached']} players remembered today"
+        )
+
+        betting_cog = self.bot.get_cog("Betting")
+        if betting_cog:
+            book = betting_cog.ledger.get_stats()
+            lines.append(
+                f"Ledger: {book['bets']} bets ({book['rejected_bets']} rejected), {book['settled_markets']} markets settled, "
+                f"{book['refunded_bets']} bets refunded, balance cache {book['cache_hits']}/{book['cache_hits'] + book['cache_misses']} hits"
+            )
+
+        if stage_overruns:
+            lines.append("Deadline Overruns: " + ", ".join(f"{stage} x{count}" for stage, count in stage_overruns.most_common()))
+        
+        for host, limits in rate_limiter.get_stats().items():
+            lines.append(
+                f"Rate Limit ({host}): waited {limits['wait_seconds']:.1f}s on {limits['delayed']}/{limits['acquired']} requests, "
+                f"{limits['throttled']} x 429"
+            )
+        
+        # Every subsystem adds lines here - a busy bot easily goes past one message
+        for message in split_lines(lines):
+            await ctx.send(message)
+
+    @commands.hybrid_command(name="admin_providers", description="Live image provider scoreboard")
+    @commands.has_permissions(administrator=True)
+    async def admin_providers(self, ctx):
+        """Shows latency, success rate and circuit breaker state per image provider."""
+        embed = discord.Embed(title="📡 Provider Scoreboard", color=discord.Color.teal())
+        rows = provider_router.scoreboard()
+        if not rows:
+            embed.description = "No provider calls recorded yet."
+        
+        state_icons = {"closed": "🟢", "half-open": "🟡", "open": "🔴"}
+        fmt = lambda seconds: f"{seconds:.1f}s" if seconds is not None else "n/a"
+        for row in rows[:25]:
+            success = f"{row['success_rate']*100:.0f}%" if row['success_rate'] is not None else "n/a"
+            embed.add_field(
+                name=f"{state_icons.get(row['state'], '⚪')} {row['provider']}",
+                value=(
+                    f"Expected: **{fmt(row['expected'])}**\n"
+                    f"p50 {fmt(row['p50'])} · p90 {fmt(row['p90'])}\n"
+                    f"Success {success} of {row['calls']} calls\n"
+                    f"Breaker: {row['state']} (opened {row['times_opened']}x)"
+                ),
+                inline=True
+            )
+        embed.set_footer(text="Providers are tried fastest-expected first; red circuits are skipped.")
+        await ctx.send(embed=embed)
+
+    @commands.hybrid_command(name="admin_shards", description="Shard latency and guild counts")
+    @commands.has_permissions(administrator=True)
+    async def admin_shards(self, ctx):
+        """Shows every shard's latency and guild count (all processes when running under launcher.py)."""
+        embed = discord.Embed(title="🧩 Shards", color=discord.Color.teal())
+        reports = [shard_metrics(self.bot)]
+        
+        view = await self.cluster.cluster_view() if self.cluster.enabled() else None
+        if view:
+            # Our own numbers are live; the others are as of their last report
+            reports = [r for r in view['reports'] if r['process'] != settings.PROCESS_INDEX] + reports
+            reports.sort(key=lambda r: r['process'])
+            stats = view['stats']
+            embed.description = (
+                f"{view['processes']} processes · {stats['webhooks_routed']} webhooks routed "
+                f"({stats['webhooks_unroutable']} unroutable) · {stats['rate_limit_requests']} shared rate-limit grants"
+            )
+        elif self.cluster.enabled():
+            embed.description = "⚠️ Coordinator unreachable - showing this process only."
+        
+        fmt = lambda latency: f"{latency * 1000:.0f}ms" if latency is not None else "n/a"
+        total_guilds = 0
+        for report in reports:
+            age = ""
+            if view and report['process'] != settings.PROCESS_INDEX:
+                age = f" · reported {view['now'] - report['received_at']:.0f}s ago"
+            lines = []
+            for shard in report['shards']:
+                total_guilds += shard['guilds']
+                state = "🔴" if shard['closed'] else "🟢"
+                lines.append(f"{state} Shard {shard['id']}: {fmt(shard['latency'])}, {shard['guilds']} guilds")
+            if len(lines) > 20:
+                lines = lines[:20] + [f"... and {len(lines) - 20} more"]
+            embed.add_field(name=f"Process {report['process']} (pid {report['pid']}){age}", value="\n".join(lines) or "No shards", inline=False)
+        
+        embed.set_footer(text=f"{reports[-1]['shard_count']} shards · {total_guilds} guilds")
+        await ctx.send(embed=embed)
 
     @commands.hybrid_command(name="admin_reset", description="Soft Reset: Clears tournament state and 1v1 timers")
     @commands.has_permissions(administrator=True)
@@ -256,29 +457,19 @@ class Admin(commands.Cog):
         if not battle_cog:
             return await ctx.send("❌ Battle module not loaded.")
         
-        # Reset Tournament State
-        battle_cog.queue = []
-        battle_cog.tournament_active = False
-        battle_cog.current_match_id = None
-        battle_cog.tournament_mode = None
-        battle_cog.team_rosters = {'A': [], 'B': []}
-        battle_cog.team_names = {'A': 'Team A', 'B': 'Team B'}
+        # Reset Tournament State (every session in this server)
+        for session in battle_cog.sessions.for_guild(ctx.guild.id if ctx.guild else None):
+            battle_cog.sessions.release(session)
         
         # Reset 1v1 Timers in DB
-        db_gen = get_db()
-        db = next(db_gen)
         try:
-            # Set last_1v1_battle_at to NULL for all players
-            db.query(Player).update({Player.last_1v1_battle_at: None})
-            db.commit()
+            await daily_limiter.reset()
             db_msg = "✅ Daily 1v1 limits reset for all players."
+            # Other shard processes remember who already fought today - tell them too
+            if self.cluster.enabled() and not await self.cluster.publish("daily_reset"):
+                db_msg += "\n⚠️ Couldn't reach the other shard processes; they may refuse 1v1s until midnight."
         except Exception as e:
             db_msg = f"⚠️ Failed to reset DB timers: {e}"
-        finally:
-            try:
-                next(db_gen)
-            except StopIteration:
-                pass
 
         await ctx.send(f"🔄 **System Reset Complete!**\n✅ Tournament Queue cleared.\n{db_msg}")
 
@@ -2,15 +2,23 @@ import discord
 from discord.ext import commands
 from discord.ui import View, Select, Button, Modal, TextInput
 from engine.fairness import FairnessEngine
+from engine.deadline import Deadline
+from engine.asset_pool import AssetPool
+from engine.round_scheduler import round_scheduler
+from engine.prefetcher import MatchPrefetcher
+from engine.session import SessionManager
 from integrations.nvidia_narrator import NvidiaNarrator
 from integrations.nvidia_image_generator import NvidiaImageGenerator
 from integrations.nvidia_vision import NvidiaVision
+from integrations.hybrid_image import generate_hybrid_image
+from integrations.jobs import JobBroker
+from integrations.image_payload import start_meter, finish_meter
+from integrations.transcoder import transcoder
+from integrations.provider_router import provider_router
+from config import settings
 from commands.admin import Admin # Import Admin to access config
-from database.db_manager import get_db
-from database.models import Player
-from datetime import datetime, timedelta
+from database.players import daily_limiter
 import asyncio
-import io
 import random
 import time
 import os
@@ -31,6 +39,12 @@ from engine.fighter import Fighter, AvatarProxy
 
 # --- Helper Classes ---
 
+def pair_up(players):
+    """Bracket pairs in order: ([(p1, p2), ...], bye or None)."""
+    pairs = [(players[i], players[i+1]) for i in range(0, len(players) - 1, 2)]
+    bye = players[-1] if len(players) % 2 else None
+    return pairs, bye
+
 
 # --- UI Classes for Tournament Registration ---
 
@@ -136,31 +150,32 @@ class TeamButton(Button):
 
     async def callback(self, interaction: discord.Interaction):
         cog = self.view.cog
+        session = cog.sessions.get(interaction)
         fighter = Fighter(interaction.user)
         
-        if fighter in cog.queue:
+        if fighter in session.queue:
             return await interaction.response.send_message("You are already registered!", ephemeral=True)
 
         # Balance Check
-        my_team_count = len(cog.team_rosters[self.team])
+        my_team_count = len(session.team_rosters[self.team])
         other_team = 'B' if self.team == 'A' else 'A'
-        other_team_count = len(cog.team_rosters[other_team])
+        other_team_count = len(session.team_rosters[other_team])
         
         # Strict balancing REMOVED per user request. 
         # We only enforce even numbers at start.
 
-        cog.queue.append(fighter)
-        cog.team_rosters[self.team].append(fighter)
+        session.queue.append(fighter)
+        session.team_rosters[self.team].append(fighter)
         
         await interaction.response.edit_message(
-            content=f"✅ {fighter.mention} joined **{cog.team_names[self.team]}**!",
+            content=f"✅ {fighter.mention} joined **{session.team_names[self.team]}**!",
             view=None,
-            embed=cog.get_registration_embed()
+            embed=cog.get_registration_embed(session)
         )
         
         # Check for start
         config = cog.get_config()
-        if len(cog.queue) >= config.get("tournament_size", 8):
+        if len(session.queue) >= config.get("tournament_size", 8):
             await cog.start_tournament(interaction.channel)
 
 class TeamSelectView(View):
@@ -168,12 +183,13 @@ class TeamSelectView(View):
         super().__init__(timeout=None) # No timeout for the lobby view
         self.cog = cog
         self.ctx = ctx
+        session = cog.sessions.get(ctx)
         
         # Update button labels with counts
-        name_a = self.cog.team_names['A']
-        name_b = self.cog.team_names['B']
-        count_a = len(self.cog.team_rosters['A'])
-        count_b = len(self.cog.team_rosters['B'])
+        name_a = session.team_names['A']
+        name_b = session.team_names['B']
+        count_a = len(session.team_rosters['A'])
+        count_b = len(session.team_rosters['B'])
         
         self.add_item(TeamButton(label=f"Join {name_a} ({count_a})", team='A', style=discord.ButtonStyle.red))
         self.add_item(TeamButton(label=f"Join {name_b} ({count_b})", team='B', style=discord.ButtonStyle.blurple))
@@ -225,17 +241,279 @@ class BettingView(View):
 
         amount = self.selected_amount
         if amount == "ALL":
-            amount = betting_cog.get_balance(interaction.user.id)
+            amount = await betting_cog.get_balance(interaction.user.id)
 
-        # Place the bet
-        success, msg = betting_cog.engine.place_bet(self.match_id, interaction.user, amount, self.selected_team)
+        # Place the bet (the ledger debits the stake)
+        success, msg = await betting_cog.engine.place_bet(self.match_id, interaction.user, amount, self.selected_team)
         
         if success:
-            betting_cog.add_balance(interaction.user.id, -amount)
             await interaction.response.send_message(f"✅ **Bet Placed!** {amount} on {self.selected_team}", ephemeral=True)
         else:
             await interaction.response.send_message(f"❌ {msg}", ephemeral=True)
 
+class EmbedStreamer:
+    """
+    Renders streamed narrator text into one embed field as it arrives.
+    Edits are throttled to NARRATOR_STREAM_EDIT_INTERVAL so we stay inside
+    Discord's message edit rate limit.
+    """
+    def __init__(self, message, embed, field_name, beat="meeting"):
+        self.message = message
+        self.embed = embed
+        self.field_name = field_name
+        self.beat = beat
+        self.rendered = None
+        self.last_edit = 0.0
+
+    async def follow(self, stream):
+        """Consumes a narrator stream of beat dicts and returns the last one."""
+        beats = {}
+        async for beats in stream:
+            text = beats.get(self.beat)
+            if text and text != self.rendered and time.monotonic() - self.last_edit >= settings.NARRATOR_STREAM_EDIT_INTERVAL:
+                await self.render(text)
+        # Always show the final text, even if it landed inside the throttle window
+        if beats.get(self.beat) and beats[self.beat] != self.rendered:
+            await self.render(beats[self.beat])
+        return beats
+
+    async def render(self, text):
+        self.embed.set_field_at(0, name=self.field_name, value=f"*{text[:1000]}*", inline=False)
+        self.rendered = text
+        self.last_edit = time.monotonic()
+        try:
+            await self.message.edit(embed=self.embed)
+        except discord.HTTPException as e:
+            print(f"Embed stream edit failed: {e}")
+
+class MatchProduction:
+    """
+    Everything one match shows, generated ahead of its reveal.
+    The winner is settled up front (nothing shown depends on it), then
+    run() does vision, the narrator and the three scenes. The reveal awaits
+    text(beat) / image(beat) in order while later matches keep generating.
+    If the reveal attaches a streamer before the narrator starts, the
+    stare-down is written into the channel live.
+    """
+    def __init__(self, cog, session, player_a, player_b, config):
+        self.cog = cog
+        self.session = session
+        self.player_a = player_a
+        self.player_b = player_b
+        self.config = config
+        self.theme = cog.current_theme(session)
+        self.style = session.narration_style
+        self.label = f"{player_a.display_name} vs {player_b.display_name}"
+
+        # 1. Calculate Winner (Fairness Engine)
+        try:
+            self.winner = cog.fairness.determine_winner(player_a, player_b)
+        except Exception as e:
+            # Same fallback the bracket uses for a failed match, but without sinking the whole round
+            print(f"Fairness engine failed for {self.label}: {e}. Picking a random winner.")
+            self.winner = random.choice([player_a, player_b])
+        self.loser = player_b if self.winner == player_a else player_a
+        self.winning_team = 'A' if self.winner == player_a else 'B'
+
+        self.deadline = None
+        self.status = "⏳ **Waiting for the Arena...** (Other matches are generating)"
+        self.on_status = None # Set by the reveal while it is following progress
+        self.streamer = None
+        self.narrator_started = False
+        self.texts = {} # beat -> task
+        self.images = {} # beat -> task
+        self.ready = asyncio.Event() # Set once the tasks above exist (or generation gave up)
+        self.error = None
+        self.released = False
+        self.task = None # Set when the round scheduler queues it
+
+    def matches(self, player_a, player_b):
+        """Still right for this pairing? Same fighters, same look, same arena."""
+        return (
+            (self.player_a.id, self.player_b.id) == (player_a.id, player_b.id)
+            and (self.player_a.display_name, self.player_b.display_name) == (player_a.display_name, player_b.display_name)
+            and (self.player_a.display_avatar.url, self.player_b.display_avatar.url) == (player_a.display_avatar.url, player_b.display_avatar.url)
+            and self.theme == self.cog.current_theme(self.session)
+            and self.style == self.session.narration_style
+        )
+
+    async def _set_status(self, text):
+        self.status = text
+        if self.on_status:
+            await self.on_status(text)
+
+    def attach_stream(self, streamer):
+        """Stream the meeting beat into `streamer`. False if the narrator already started."""
+        if self.narrator_started:
+            return False
+        self.streamer = streamer
+        return True
+
+    async def text(self, beat):
+        await self.ready.wait()
+        if self.error:
+            raise self.error
+        return await self.texts[beat]
+
+    async def image(self, beat):
+        await self.ready.wait()
+        if self.error:
+            raise self.error
+        return await self.images[beat]
+
+    async def run(self):
+        cog = self.cog
+        player_a, player_b, winner, loser = self.player_a, self.player_b, self.winner, self.loser
+        theme, style = self.theme, self.style
+
+        # Every image payload created below (scene tasks inherit the context) reports to this meter
+        meter = start_meter(self.label)
+        # Vision, narrator and scenes all share one time budget and degrade instead of running past it
+        deadline = self.deadline = Deadline(settings.BATTLE_TIME_BUDGET, self.label)
+        # The providers are ours now - stop any idle-time pre-generation
+        cog.battles_in_progress += 1
+        cog.assets.yield_to_battle()
+
+        try:
+            # 2. Generate Narrative & Art (Parallel)
+            print(f"DEBUG: Starting AI Generation Phase for {self.label}...")
+            await self._set_status("👁️ **Scanning Fighters...** (Analyzing Avatars)")
+            
+            # Step 2a: Analyze Avatars (Vision)
+            print("DEBUG: Calling Vision API...")
+            
+            # DEBUG / PEPE MODE OVERRIDE
+            if self.session.debug_mode or "Pepe" in player_a.display_name:
+                print("DEBUG: Using Pepe Mode (Skipping Vision)")
+                desc_a = "Pepe the Frog, green skin, big eyes, meme character"
+                desc_b = "Pepe the Frog, green skin, big eyes, meme character"
+            else:
+                desc_a_task = cog.vision.describe_avatar(player_a.display_avatar.url, deadline=deadline)
+                desc_b_task = cog.vision.describe_avatar(player_b.display_avatar.url, deadline=deadline)
+                desc_a, desc_b = await asyncio.gather(desc_a_task, desc_b_task)
+            
+            print(f"DEBUG: Vision Complete. Desc A: {desc_a[:20]}...")
+
+            # Step 2b: Generate Text (Narrator)
+            # --- PARALLEL GENERATION START ---
+            print("DEBUG: Starting Narrator Tasks...")
+            await self._set_status("🚀 **Launching Battle...** (Generating All Scenes)")
+            
+            # 1. Define Prompts (Randomized)
+            action_verb = random.choice(ACTION_VERBS)
+            weapon_a = random.choice(WEAPONS)
+            weapon_b = random.choice(WEAPONS)
+            
+            meeting_prompt = (
+                f"A comic book panel of ({desc_a}) holding a {weapon_a} and ({desc_b}) holding a {weapon_b} staring each other down "
+                f"in a {theme}, tense atmosphere, split screen composition. {COLLECTION_STYLE}"
+            )
+            clash_prompt = (
+                f"A dynamic comic book panel of ({desc_a}) using a {weapon_a} to {action_verb} ({desc_b}) "
+                f"in a {theme}, action lines, impact frames, explosion background. {COLLECTION_STYLE}"
+            )
+            # Explicitly state winner standing over loser
+            victory_prompt = (
+                f"A comic book panel of ({desc_a if winner == player_a else desc_b}) holding a {weapon_a if winner == player_a else weapon_b} standing victorious over "
+                f"a defeated ({desc_b if winner == player_a else desc_a}) lying on the ground, triumphant pose, "
+                f"in a {theme}. {COLLECTION_STYLE}"
+            )
+
+            # 2. Create Tasks
+            self.narrator_started = True
+            streamer = self.streamer
+            
+            async def script_beat(script_task, beat):
+                return (await script_task)[beat]
+            
+            if settings.NARRATOR_BATCH_MODE:
+                # One LLM call writes all three beats
+                script_args = (player_a.display_name, player_b.display_name, winner.display_name, loser.display_name, theme)
+                if streamer:
+                    task_script = asyncio.create_task(streamer.follow(cog.narrator.stream_battle_script(*script_args, style=style, deadline=deadline)))
+                else:
+                    task_script = asyncio.create_task(cog.narrator.generate_battle_script(*script_args, style=style, deadline=deadline))
+                
+                for beat in ("meeting", "clash", "victory"):
+                    self.texts[beat] = asyncio.create_task(script_beat(task_script, beat))
+            else:
+                if streamer:
+                    task_meeting_stream = asyncio.create_task(streamer.follow(cog.narrator.stream_meeting(player_a.display_name, player_b.display_name, theme, style=style, deadline=deadline)))
+                    self.texts["meeting"] = asyncio.create_task(script_beat(task_meeting_stream, "meeting"))
+                else:
+                    self.texts["meeting"] = asyncio.create_task(cog.narrator.generate_meeting(player_a.display_name, player_b.display_name, theme, style=style, deadline=deadline))
+                self.texts["clash"] = asyncio.create_task(cog.narrator.generate_clash(player_a.display_name, player_b.display_name, style=style, deadline=deadline, theme=theme))
+                self.texts["victory"] = asyncio.create_task(cog.narrator.generate_victory(winner.display_name, loser.display_name, style=style, deadline=deadline, theme=theme))
+            
+            # Launch all three images now; the reveal shows them in order as they land.
+            # The semaphore caps how many scenes of this battle hit the providers at once.
+            scene_limit = asyncio.Semaphore(max(1, int(self.config.get("scene_concurrency", 3))))
+            
+            async def render_scene_image(stage, prompt, control_image_url):
+                async with scene_limit:
+                    # Scenes run side by side, so each may use most of what is left of the budget
+                    expected = cog.expected_image_time()
+                    if expected is not None and expected > deadline.slice(settings.SCENE_BUDGET_SHARE) and cog.assets.has_backdrop(theme):
+                        print(f"DEBUG: {stage} would take ~{expected:.0f}s, over budget. Using a pooled backdrop.")
+                        return cog.assets.take_backdrop(theme)
+                    # Past the budget: a pooled backdrop if we have one, else the scene goes out without art
+                    image = await deadline.run(
+                        stage,
+                        cog.generate_image_hybrid(prompt, prefer_nvidia=False, control_image_url=control_image_url, deadline=deadline),
+                        fraction=settings.SCENE_BUDGET_SHARE,
+                        fallback=lambda: cog.assets.take_backdrop(theme),
+                    )
+                if deadline.expired():
+                    return image
+                # Shrink for upload outside the provider slot - it runs in a worker process
+                return await transcoder.transcode(image)
+
+            async def generate_scene_image(stage, prompt, control_image_url):
+                # A scene that blows up is treated like a provider that came back empty: the match goes on
+                try:
+                    return await render_scene_image(stage, prompt, control_image_url)
+                except Exception as e:
+                    print(f"Scene {stage} failed for {self.label}: {e}. Using a pooled backdrop or no art.")
+                    return cog.assets.take_backdrop(theme)
+            
+            # Player A's avatar is the control for Scenes 1 & 2, the WINNER's for Scene 3
+            self.images["meeting"] = asyncio.create_task(generate_scene_image("scene:meeting", meeting_prompt, player_a.display_avatar.url))
+            self.images["clash"] = asyncio.create_task(generate_scene_image("scene:clash", clash_prompt, player_a.display_avatar.url))
+            self.images["victory"] = asyncio.create_task(generate_scene_image("scene:victory", victory_prompt, winner.display_avatar.url))
+            self.ready.set()
+            
+            # Hold the match slot until everything has landed. Scenes never raise, so an error here is the text
+            results = await asyncio.gather(*self.texts.values(), *self.images.values(), return_exceptions=True)
+            for result in results:
+                if isinstance(result, Exception):
+                    raise result
+        except Exception as e:
+            print(f"AI Generation Critical Error ({self.label}): {e}")
+            self.error = e
+            raise
+        finally:
+            if not self.ready.is_set():
+                # Failed or cancelled before anything was launched - don't leave the reveal waiting
+                self.error = self.error or RuntimeError("Match generation was cancelled")
+                self.ready.set()
+            finish_meter(meter)
+            print(f"⏱️ {deadline.summary()}")
+            cog.battles_in_progress -= 1
+
+    def release(self):
+        """Cancels whatever is still generating and frees image buffers that never made it to Discord."""
+        if self.released:
+            return
+        self.released = True
+        if self.task and not self.task.done() and self.task is not asyncio.current_task():
+            self.task.cancel()
+        for task in list(self.texts.values()) + list(self.images.values()):
+            if not task.done():
+                task.cancel()
+        for task in self.images.values():
+            if task.done() and not task.cancelled() and not task.exception() and task.result():
+                task.result().close()
+
 class Battle(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
@@ -243,42 +521,90 @@ class Battle(commands.Cog):
         self.narrator = NvidiaNarrator()
         self.nvidia_artist = NvidiaImageGenerator()
         
-        # Tournament State
-        self.tournament_mode = None # 'ROYALE' or 'GANG'
-        self.arena_theme = None
-        self.narration_style = None
-        self.team_names = {'A': 'Team A', 'B': 'Team B'}
-        self.team_rosters = {'A': [], 'B': []}
         self.vision = NvidiaVision()
         self.supermachine = getattr(bot, 'supermachine', None)
         
-        # Tournament Queue
-        self.queue = []
-        self.tournament_active = False
-        self.current_match_id = None
-        self.debug_mode = False # Flag for debug tournament
+        # Image and vision work goes to worker.py processes through the job queue when enabled
+        self.jobs = JobBroker() if settings.JOB_QUEUE_ENABLED else None
+        self.vision.remote = self.jobs
+        
+        # Tournament State (queue, mode, rosters, open market) lives in one session per channel
+        self.sessions = SessionManager(on_create=self._attach_prefetcher)
+        self.battles_in_progress = 0
+        
+        # Backdrops and narration made while idle, used when a live generation would run out of time
+        self.assets = AssetPool(self.pool_themes, self.is_idle, self._generate_backdrop, self.narrator.generate_generic_script)
+        self.narrator.snippets = self.assets
+
+    def _attach_prefetcher(self, session):
+        # Starts next-round matches while the current round is still being revealed
+        session.prefetcher = MatchPrefetcher(
+            lambda a, b: MatchProduction(self, session, a, b, self.get_config()),
+            round_scheduler.start,
+        )
+
+    async def cog_load(self):
+        # Warm the avatar description cache so repeat fighters skip Vision from the first battle
+        await self.vision.cache.warm_load()
+        if self.jobs:
+            await self.jobs.start()
+        if settings.ASSET_POOL_ENABLED:
+            self.assets.start()
+
+    async def cog_unload(self):
+        self.assets.stop()
+        if self.jobs:
+            await self.jobs.stop()
+
+    def current_theme(self, session=None):
+        # Use the session's theme if set, else fallback to config.
+        # Without a session this is the most recently active one.
+        session = session or self.sessions.latest
+        if session and session.arena_theme:
+            return session.arena_theme
+        return self.get_config().get("theme", "Cyberpunk Alleyway")
+
+    def pool_themes(self):
+        """Themes the asset pool keeps assets for: every live session's arena, most recent first, then the default."""
+        sessions = sorted(self.sessions.sessions.values(), key=lambda s: s.last_active, reverse=True)
+        themes = [self.current_theme(s) for s in sessions] + [self.get_config().get("theme", "Cyberpunk Alleyway")]
+        return list(dict.fromkeys(themes))
+
+    def is_idle(self):
+        return self.battles_in_progress == 0
+
+    async def _generate_backdrop(self, theme):
+        prompt = f"An empty arena, establishing shot of a {theme}, dramatic lighting, no characters. {COLLECTION_STYLE}"
+        return await transcoder.transcode(await self.generate_image_hybrid(prompt))
+
+    def expected_image_time(self):
+        """Best expected time-to-image across the providers we would route to, or None if unknown."""
+        expected = [provider_router.expected_time(p) for p in provider_router.route(["supermachine", "pollinations"])]
+        expected = [e for e in expected if e is not None]
+        return min(expected) if expected else None
 
     async def finalize_setup(self, interaction, fighter, mode, arena, style, team_a="Team A", team_b="Team B"):
         """Called by View or Modal to finish host setup."""
-        if fighter in self.queue:
+        session = self.sessions.get(interaction)
+        if fighter in session.queue:
              return await interaction.response.send_message("You are already registered!", ephemeral=True)
 
         # Save Settings
-        self.tournament_mode = mode
-        self.arena_theme = arena
-        self.narration_style = style
-        self.team_names['A'] = team_a
-        self.team_names['B'] = team_b
+        session.tournament_mode = mode
+        session.arena_theme = arena
+        session.narration_style = style
+        session.team_names['A'] = team_a
+        session.team_names['B'] = team_b
         
         # Register Host
-        self.queue.append(fighter)
+        session.queue.append(fighter)
         
         if mode == 'GANG':
             # In Gang Mode, we DO NOT auto-register the host to a team yet. 
             # They must pick a team like everyone else.
             # Wait, actually, if they named "My Team", they should probably be on it.
             # Let's assume Team A is "My Team".
-            self.team_rosters['A'].append(fighter)
+            session.team_rosters['A'].append(fighter)
             
             await interaction.response.edit_message(
                 content=f"⚔️ **Gang Battle: {team_a} vs {team_b}**\nArena: {arena}\nStyle: {style}", 
@@ -295,29 +621,29 @@ class Battle(commands.Cog):
             await interaction.response.edit_message(
                 content=f"🏆 **Battle Royale Mode Selected!**\nArena: {arena}\nStyle: {style}", 
                 view=None, 
-                embed=self.get_registration_embed()
+                embed=self.get_registration_embed(session)
             )
 
-    def get_registration_embed(self):
+    def get_registration_embed(self, session):
         config = self.get_config()
         required_players = config.get("tournament_size", 8)
         
         embed = discord.Embed(title="📝 Tournament Registration", color=discord.Color.green())
         
-        if self.tournament_mode == 'ROYALE':
+        if session.tournament_mode == 'ROYALE':
             embed.add_field(name="Mode", value="🏆 Battle Royale", inline=False)
-            player_list = "\n".join([f"{i+1}. {p.display_name}" for i, p in enumerate(self.queue)])
-            embed.add_field(name=f"Registered Users ({len(self.queue)}/{required_players})", value=player_list if player_list else "None", inline=False)
+            player_list = "\n".join([f"{i+1}. {p.display_name}" for i, p in enumerate(session.queue)])
+            embed.add_field(name=f"Registered Users ({len(session.queue)}/{required_players})", value=player_list if player_list else "None", inline=False)
             
-        elif self.tournament_mode == 'GANG':
-            embed.add_field(name="Mode", value=f"⚔️ Gang Battle: {self.team_names['A']} vs {self.team_names['B']}", inline=False)
+        elif session.tournament_mode == 'GANG':
+            embed.add_field(name="Mode", value=f"⚔️ Gang Battle: {session.team_names['A']} vs {session.team_names['B']}", inline=False)
             
-            team_a_list = "\n".join([p.display_name for p in self.team_rosters['A']])
-            team_b_list = "\n".join([p.display_name for p in self.team_rosters['B']])
+            team_a_list = "\n".join([p.display_name for p in session.team_rosters['A']])
+            team_b_list = "\n".join([p.display_name for p in session.team_rosters['B']])
             
-            embed.add_field(name=f"{self.team_names['A']} ({len(self.team_rosters['A'])})", value=team_a_list if team_a_list else "None", inline=True)
-            embed.add_field(name=f"{self.team_names['B']} ({len(self.team_rosters['B'])})", value=team_b_list if team_b_list else "None", inline=True)
-            embed.add_field(name="Total", value=f"{len(self.queue)}/{required_players}", inline=False)
+            embed.add_field(name=f"{session.team_names['A']} ({len(session.team_rosters['A'])})", value=team_a_list if team_a_list else "None", inline=True)
+            embed.add_field(name=f"{session.team_names['B']} ({len(session.team_rosters['B'])})", value=team_b_list if team_b_list else "None", inline=True)
+            embed.add_field(name="Total", value=f"{len(session.queue)}/{required_players}", inline=False)
             
         else:
             embed.add_field(name="Mode", value="Not Selected", inline=False)
@@ -332,85 +658,58 @@ class Battle(commands.Cog):
             return admin_cog.config
         return {"tournament_size": 8, "theme": "Cyberpunk Alleyway"}
 
-    async def generate_image_hybrid(self, prompt, prefer_nvidia=False, control_image_url=None):
+    async def generate_image_hybrid(self, prompt, prefer_nvidia=False, control_image_url=None, deadline=None):
         """
-        Hybrid Generator:
-        1. If prefer_nvidia=True, try NVIDIA Flux (Sanitized).
-        2. If Supermachine is configured (Webhook URL set), try Supermachine.
-        3. Fallback to Pollinations.
-        4. Fallback to NVIDIA Flux (Sanitized).
+        Scene/backdrop art through the hybrid generator (integrations/hybrid_image.py).
+        With JOB_QUEUE_ENABLED the work runs in a worker.py process instead of here.
         """
-        print(f"DEBUG: Hybrid Gen Called. Prompt: {prompt[:50]}...")
-        print(f"DEBUG: Supermachine Object: {self.supermachine}")
-        if self.supermachine:
-            print(f"DEBUG: Supermachine Webhook URL: {self.supermachine.webhook_base_url}")
-        
-        # 1. NVIDIA Preference
-        if prefer_nvidia:
-            print("DEBUG: Hybrid Gen - Prefer NVIDIA")
-            img = await self.nvidia_artist.generate_image(prompt, prefer_nvidia=True)
-            if img: return img
-
-        # 2. Supermachine (The "Big Gun")
-        if self.supermachine and self.supermachine.webhook_base_url:
-            print("DEBUG: Hybrid Gen - Attempting Supermachine...")
-            img = await self.supermachine.generate_image(prompt, control_image_url=control_image_url)
-            if img: 
-                print("DEBUG: Supermachine Success!")
-                return img
-            else:
-                print("DEBUG: Supermachine Failed/Timed Out. Falling back...")
-        else:
-            print("DEBUG: Supermachine skipped (Not configured or missing Webhook URL)")
-
-        # 3. Pollinations (Standard Fallback)
-        print("DEBUG: Hybrid Gen - Attempting Pollinations...")
-        # Force Pollinations by not passing prefer_nvidia=True
-        img = await self.nvidia_artist.generate_image(prompt, prefer_nvidia=False) 
-        return img
+        if self.jobs:
+            return await self.jobs.image(prompt, prefer_nvidia=prefer_nvidia, control_image_url=control_image_url, deadline=deadline)
+        return await generate_hybrid_image(self.supermachine, self.nvidia_artist, prompt, prefer_nvidia=prefer_nvidia, control_image_url=control_image_url, deadline=deadline)
 
     @commands.hybrid_command(name='register')
     async def register(self, ctx):
         """Join the queue for the next battle/tournament."""
-        if self.tournament_active:
+        session = self.sessions.get(ctx)
+        if session.tournament_active:
             await ctx.send("⚠️ A tournament is currently in progress. Please wait for the next round.")
             return
 
         fighter = Fighter(ctx.author)
 
-        if fighter in self.queue:
+        if fighter in session.queue:
             await ctx.send("You are already in the queue!")
             return
         
         # If queue is empty, this user is the host/creator
-        if len(self.queue) == 0:
+        if len(session.queue) == 0:
             # Reset State
-            self.tournament_mode = None
-            self.arena_theme = None
-            self.narration_style = None
-            self.team_rosters = {'A': [], 'B': []}
-            self.team_names = {'A': 'Team A', 'B': 'Team B'}
+            session.tournament_mode = None
+            session.arena_theme = None
+            session.narration_style = None
+            session.team_rosters = {'A': [], 'B': []}
+            session.team_names = {'A': 'Team A', 'B': 'Team B'}
             
             view = TournamentHostView(self, ctx, fighter)
             await ctx.send(f"👋 Welcome {fighter.mention}! You are the Host.\nConfigure the Tournament:", view=view)
             return
 
         # If mode is not selected yet (shouldn't happen if first user flow works, but safety check)
-        if self.tournament_mode is None:
+        if session.tournament_mode is None:
             await ctx.send("⚠️ Waiting for the first player to select the mode...")
             return
 
         # Handle Registration based on Mode
-        if self.tournament_mode == 'ROYALE':
-            self.queue.append(fighter)
-            await ctx.send(f"✅ {fighter.mention} joined the Battle Royale!", embed=self.get_registration_embed())
+        if session.tournament_mode == 'ROYALE':
+            session.queue.append(fighter)
+            await ctx.send(f"✅ {fighter.mention} joined the Battle Royale!", embed=self.get_registration_embed(session))
             
             # Check for start
             config = self.get_config()
-            if len(self.queue) >= config.get("tournament_size", 8):
+            if len(session.queue) >= config.get("tournament_size", 8):
                 await self.start_tournament(ctx.channel)
             
-        elif self.tournament_mode == 'GANG':
+        elif session.tournament_mode == 'GANG':
             view = TeamSelectView(self, ctx)
             await ctx.send(f"⚔️ {fighter.mention}, choose your side:", view=view)
             return # View handles the rest
@@ -418,7 +717,7 @@ class Battle(commands.Cog):
         # Check if we can start (Fallback)
         config = self.get_config()
         required_players = config.get("tournament_size", 8)
-        if len(self.queue) >= required_players:
+        if len(session.queue) >= required_players:
             await self.start_tournament(ctx)
 
     @commands.hybrid_command(name='battle')
@@ -428,30 +727,10 @@ class Battle(commands.Cog):
         # --- Daily Limit Check (1 per day per user, Admins exempt) ---
         if not ctx.author.guild_permissions.administrator:
             limit_reached = False
-            db_gen = get_db()
-            db = next(db_gen)
             try:
-                player = db.query(Player).filter_by(discord_id=str(ctx.author.id)).first()
-                if player and player.last_1v1_battle_at:
-                    # Check if last battle was today (UTC)
-                    if player.last_1v1_battle_at.date() == datetime.utcnow().date():
-                        limit_reached = True
-                
-                if not limit_reached:
-                    # Update timestamp immediately to prevent spam
-                    if not player:
-                        player = Player(discord_id=str(ctx.author.id))
-                        db.add(player)
-                    player.last_1v1_battle_at = datetime.utcnow()
-                    db.commit()
+                limit_reached = not await daily_limiter.claim(str(ctx.author.id))
             except Exception as e:
                 print(f"Database Error in Daily Limit Check: {e}")
-            finally:
-                # Close DB session
-                try:
-                    next(db_gen)
-                except StopIteration:
-                    pass
 
             if limit_reached:
                 await ctx.send(f"🛑 **Daily Limit Reached!**\n{ctx.author.mention}, you have already fought your 1v1 battle today. Come back tomorrow or join a Tournament!")
@@ -463,6 +742,12 @@ class Battle(commands.Cog):
         auto_selected = False
 
         if player_b is None:
+            # With lazy member chunking the member list may not be loaded yet
+            if ctx.guild and not ctx.guild.chunked:
+                # Chunking a big guild can outlast the 3s slash-command window, so acknowledge first
+                await ctx.defer()
+                await ctx.guild.chunk()
+            
             # Select a random online user
             candidates = [
                 m for m in ctx.guild.members 
@@ -498,20 +783,21 @@ class Battle(commands.Cog):
         await self.run_battle(ctx, player_a, player_b, enable_betting=False)
 
     async def start_tournament(self, ctx):
-        self.tournament_active = True
+        session = self.sessions.get(ctx)
+        session.tournament_active = True
         config = self.get_config()
         
         # Gang Battle Balance Check
-        if self.tournament_mode == 'GANG':
-            len_a = len(self.team_rosters['A'])
-            len_b = len(self.team_rosters['B'])
+        if session.tournament_mode == 'GANG':
+            len_a = len(session.team_rosters['A'])
+            len_b = len(session.team_rosters['B'])
             if len_a != len_b:
-                self.tournament_active = False
+                session.tournament_active = False
                 await ctx.send(f"⚠️ **Cannot Start!** Teams are uneven ({len_a} vs {len_b}).\nPlease wait for more players or balance the teams.")
                 return
 
         # Countdown (Skip if debug)
-        if not self.debug_mode:
+        if not session.debug_mode:
             await ctx.send("@everyone 🚨 **TOURNAMENT STARTING IN 5 MINUTES!** 🚨\nGet your bets ready!")
             # In a real scenario, we'd wait 300 seconds. For demo/testing, maybe shorter or strictly 5 mins.
             # User asked for 5 minute countdown.
@@ -519,28 +805,28 @@ class Battle(commands.Cog):
             # For the sake of not blocking the thread for 5 mins during this dev session, I'll make it 10 seconds but comment the 5 mins
             await asyncio.sleep(10) # TODO: Change to 300 for production
 
-        await ctx.send(f"🚨 **TOURNAMENT STARTING!** 🚨\nMode: **{self.tournament_mode}**")
+        await ctx.send(f"🚨 **TOURNAMENT STARTING!** 🚨\nMode: **{session.tournament_mode}**")
         
-        if self.tournament_mode == 'ROYALE':
-            await self.run_royale_bracket(ctx)
-        elif self.tournament_mode == 'GANG':
-            await self.run_gang_battle(ctx)
+        if session.tournament_mode == 'ROYALE':
+            await self.run_royale_bracket(ctx, session)
+        elif session.tournament_mode == 'GANG':
+            await self.run_gang_battle(ctx, session)
         else:
             # Fallback for legacy/default behavior (1v1 loop) if mode not set
-            await self.run_royale_bracket(ctx)
+            await self.run_royale_bracket(ctx, session)
         
-        # Cleanup
-        self.tournament_active = False
-        self.queue = []
-        self.team_rosters = {'A': [], 'B': []}
-        self.tournament_mode = None
+        # Cleanup (drops any unclaimed prefetches with the rest of the session)
+        self.sessions.release(session)
         await ctx.send("🏆 **Tournament Concluded!** Queue is now open.")
 
-    async def run_royale_bracket(self, ctx):
+    async def run_royale_bracket(self, ctx, session):
         round_num = 1
-        current_players = list(self.queue) # Copy
+        current_players = list(session.queue) # Copy
         random.shuffle(current_players)
         
+        # Round 1 is known now - get it generating while the bracket is announced
+        session.prefetcher.prefetch(pair_up(current_players)[0])
+        
         # Tournament Stats Tracking
         tournament_history = []
         
@@ -566,19 +852,25 @@ class Battle(commands.Cog):
             next_round_players = []
             
             # Create pairs
-            matches = []
-            for i in range(0, len(current_players), 2):
-                if i + 1 < len(current_players):
-                    matches.append((current_players[i], current_players[i+1]))
-                else:
-                    # Bye
-                    await ctx.send(f"ℹ️ {current_players[i].mention} gets a bye this round!")
-                    next_round_players.append(current_players[i])
+            matches, bye = pair_up(current_players)
+            if bye:
+                await ctx.send(f"ℹ️ {bye.mention} gets a bye this round!")
+                next_round_players.append(bye)
+            
+            # Generate the whole round at once (picking up anything prefetched), reveal it in bracket order
+            productions = session.prefetcher.claim(matches)
+            # Queue this round for match slots before the prefetches below, so they can't jump ahead of it
+            for production in productions:
+                round_scheduler.start(production)
+
+            # Winners are already settled, so the next round's pairings are known - start on those too
+            predicted, _ = pair_up(next_round_players + [p.winner for p in productions])
+            session.prefetcher.prefetch(predicted)
             
-            # Run matches
-            for p1, p2 in matches:
+            async def reveal(production):
+                p1, p2 = production.player_a, production.player_b
                 await ctx.send(f"⚔️ **Match Up:** {p1.mention} vs {p2.mention}")
-                winner, match_stats = await self.run_battle(ctx, p1, p2, enable_betting=True)
+                winner, match_stats = await self.reveal_match(ctx, production, enable_betting=True)
                 
                 if winner:
                     next_round_players.append(winner)
@@ -605,7 +897,10 @@ class Battle(commands.Cog):
                         'bets': []
                     })
                 
-                await asyncio.sleep(5) # Cooldown
+                # Short pause between reveals; the rest of the round keeps generating meanwhile
+                await asyncio.sleep(settings.MATCH_REVEAL_GAP)
+            
+            await round_scheduler.run_round(productions, reveal)
             
             current_players = next_round_players
             round_num += 1
@@ -649,9 +944,9 @@ class Battle(commands.Cog):
             summary_embed.add_field(name="💰 Betting Highlights", value=bet_desc, inline=False)
             await ctx.send(embed=summary_embed)
 
-    async def run_gang_battle(self, ctx):
-        team_a = list(self.team_rosters['A'])
-        team_b = list(self.team_rosters['B'])
+    async def run_gang_battle(self, ctx, session):
+        team_a = list(session.team_rosters['A'])
+        team_b = list(session.team_rosters['B'])
         random.shuffle(team_a)
         random.shuffle(team_b)
         
@@ -660,154 +955,134 @@ class Battle(commands.Cog):
         # Determine number of matches (min size)
         num_matches = min(len(team_a), len(team_b))
         
-        await ctx.send(f"⚔️ **Gang Battle: {self.team_names['A']} vs {self.team_names['B']}**\nMatches: {num_matches}")
+        await ctx.send(f"⚔️ **Gang Battle: {session.team_names['A']} vs {session.team_names['B']}**\nMatches: {num_matches}")
         
-        for i in range(num_matches):
-            p1 = team_a[i]
-            p2 = team_b[i]
-            
-            await ctx.send(f"🥊 **Match {i+1}:** {p1.mention} ({self.team_names['A']}) vs {p2.mention} ({self.team_names['B']})")
+        # Every pairing is known up front, so the whole war generates at once and is revealed in order
+        config = self.get_config()
+        productions = [MatchProduction(self, session, team_a[i], team_b[i], config) for i in range(num_matches)]
+        
+        async def reveal(production):
+            p1, p2 = production.player_a, production.player_b
+            await ctx.send(f"🥊 **Match {productions.index(production)+1}:** {p1.mention} ({session.team_names['A']}) vs {p2.mention} ({session.team_names['B']})")
             
-            winner, _ = await self.run_battle(ctx, p1, p2, enable_betting=True)
+            winner, _ = await self.reveal_match(ctx, production, enable_betting=True)
             
             if winner in team_a:
                 wins['A'] += 1
-                await ctx.send(f"🔵 Point for **{self.team_names['A']}**!")
+                await ctx.send(f"🔵 Point for **{session.team_names['A']}**!")
             else:
                 wins['B'] += 1
-                await ctx.send(f"🔴 Point for **{self.team_names['B']}**!")
+                await ctx.send(f"🔴 Point for **{session.team_names['B']}**!")
                 
-            await asyncio.sleep(5)
+            await asyncio.sleep(settings.MATCH_REVEAL_GAP)
+        
+        await round_scheduler.run_round(productions, reveal)
             
         # Final Score
-        score_msg = f"📊 **Final Score:**\n{self.team_names['A']}: {wins['A']}\n{self.team_names['B']}: {wins['B']}"
+        score_msg = f"📊 **Final Score:**\n{session.team_names['A']}: {wins['A']}\n{session.team_names['B']}: {wins['B']}"
         await ctx.send(score_msg)
         
         if wins['A'] > wins['B']:
-            await ctx.send(f"🏆 **{self.team_names['A']} WINS THE WAR!**")
+            await ctx.send(f"🏆 **{session.team_names['A']} WINS THE WAR!**")
         elif wins['B'] > wins['A']:
-            await ctx.send(f"🏆 **{self.team_names['B']} WINS THE WAR!**")
+            await ctx.send(f"🏆 **{session.team_names['B']} WINS THE WAR!**")
         else:
             await ctx.send("🤝 **IT'S A DRAW!**")
 
     async def run_battle(self, ctx, player_a, player_b, enable_betting=False):
+        """A single match: produced and revealed through the round scheduler like any bracket match."""
+        session = self.sessions.get(ctx)
+        production = MatchProduction(self, session, player_a, player_b, self.get_config())
+        try:
+            results = await round_scheduler.run_round([production], lambda p: self.reveal_match(ctx, p, enable_betting))
+        finally:
+            # A 1v1 in a channel with no tournament doesn't need to keep a session around
+            if session.is_idle():
+                self.sessions.release(session)
+        return results[0]
+
+    async def reveal_match(self, ctx, production, enable_betting=False):
+        """Shows a production in the channel: betting, the three scenes in order, then bet resolution."""
         config = self.get_config()
-        # Use dynamic theme if set, else fallback to config
-        theme = self.arena_theme if self.arena_theme else config.get("theme", "Cyberpunk Alleyway")
+        player_a, player_b = production.player_a, production.player_b
+        winner, theme = production.winner, production.theme
         match_stats = {'winners': []}
         
-        # --- BETTING PHASE ---
-        self.current_match_id = str(uuid.uuid4())
+        session = production.session
+        match_id = str(uuid.uuid4())
         betting_cog = self.bot.get_cog("Betting")
-        
-        if betting_cog and enable_betting and config.get("betting_enabled", False):
-            betting_cog.engine.open_market(self.current_match_id)
-            
-            bet_embed = discord.Embed(title="🎰 Betting Open!", color=discord.Color.gold())
-            bet_embed.add_field(name="Fighter A", value=player_a.display_name, inline=True)
-            bet_embed.add_field(name="Fighter B", value=player_b.display_name, inline=True)
-            bet_embed.set_footer(text="Closing in 15 seconds!")
-            
-            view = BettingView(self, self.current_match_id, player_a, player_b)
-            bet_msg = await ctx.send(embed=bet_embed, view=view)
-            
-            await asyncio.sleep(15)
-            
-            betting_cog.engine.close_market(self.current_match_id)
-            # Disable view
-            view.stop()
-            await bet_msg.edit(view=None)
-            await ctx.send("🔒 **Betting Closed!**")
+        status_msg = None
 
-        # Helper to update status (we'll send a new message since we don't have an interaction object from a button click)
-        status_msg = await ctx.send(f"⚔️ **Initializing Match:** {player_a.display_name} vs {player_b.display_name}...")
-        
         async def update_status(text):
             try:
                 await status_msg.edit(content=f"⚔️ **Battle in Progress**\n📍 Arena: {theme}\n\n{text}")
             except:
                 pass
 
-        # 1. Calculate Winner (Fairness Engine)
-        winner = self.fairness.determine_winner(player_a, player_b)
-        loser = player_b if winner == player_a else player_a
-        winning_team = 'A' if winner == player_a else 'B'
-        
-        # 2. Generate Narrative & Art (Parallel)
-        
+        # Everything from opening the market on runs under the try, so the finally refunds the stakes whatever fails
         try:
-            # Create tasks for parallel execution
-            print("DEBUG: Starting AI Generation Phase...")
-            await update_status("👁️ **Scanning Fighters...** (Analyzing Avatars)")
-            
-            # Step 2a: Analyze Avatars (Vision)
-            print("DEBUG: Calling Vision API...")
-            
-            # DEBUG / PEPE MODE OVERRIDE
-            if self.debug_mode or "Pepe" in player_a.display_name:
-                print("DEBUG: Using Pepe Mode (Skipping Vision)")
-                desc_a = "Pepe the Frog, green skin, big eyes, meme character"
-                desc_b = "Pepe the Frog, green skin, big eyes, meme character"
-            else:
-                desc_a_task = self.vision.describe_avatar(player_a.display_avatar.url)
-                desc_b_task = self.vision.describe_avatar(player_b.display_avatar.url)
-                desc_a, desc_b = await asyncio.gather(desc_a_task, desc_b_task)
-            
-            print(f"DEBUG: Vision Complete. Desc A: {desc_a[:20]}...")
+            # --- BETTING PHASE ---
+            # The production keeps generating while the market is open
+            if betting_cog and enable_betting and config.get("betting_enabled", False):
+                # /bet in this channel goes to this market
+                session.current_match_id = match_id
+                betting_cog.engine.open_market(match_id)
 
-            await update_status("✍️ **Writing the Legend...** (Generating Story)")
+                bet_embed = discord.Embed(title="🎰 Betting Open!", color=discord.Color.gold())
+                bet_embed.add_field(name="Fighter A", value=player_a.display_name, inline=True)
+                bet_embed.add_field(name="Fighter B", value=player_b.display_name, inline=True)
+                bet_embed.set_footer(text="Closing in 15 seconds!")
 
-            # Step 2b: Generate Text (Narrator)
-            # --- PARALLEL GENERATION START ---
-            print("DEBUG: Starting Narrator Tasks...")
-            await update_status("🚀 **Launching Battle...** (Generating All Scenes)")
-            
-            # 1. Define Prompts (Randomized)
-            action_verb = random.choice(ACTION_VERBS)
-            weapon_a = random.choice(WEAPONS)
-            weapon_b = random.choice(WEAPONS)
-            
-            meeting_prompt = (
-                f"A comic book panel of ({desc_a}) holding a {weapon_a} and ({desc_b}) holding a {weapon_b} staring each other down "
-                f"in a {theme}, tense atmosphere, split screen composition. {COLLECTION_STYLE}"
-            )
-            clash_prompt = (
-                f"A dynamic comic book panel of ({desc_a}) using a {weapon_a} to {action_verb} ({desc_b}) "
-                f"in a {theme}, action lines, impact frames, explosion background. {COLLECTION_STYLE}"
-            )
-            # Explicitly state winner standing over loser
-            victory_prompt = (
-                f"A comic book panel of ({desc_a if winner == player_a else desc_b}) holding a {weapon_a if winner == player_a else weapon_b} standing victorious over "
-                f"a defeated ({desc_b if winner == player_a else desc_a}) lying on the ground, triumphant pose, "
-                f"in a {theme}. {COLLECTION_STYLE}"
-            )
+                view = BettingView(self, match_id, player_a, player_b)
+                bet_msg = await ctx.send(embed=bet_embed, view=view)
 
-            # 2. Create Tasks
-            task_text_meeting = asyncio.create_task(self.narrator.generate_meeting(player_a.display_name, player_b.display_name, theme, style=self.narration_style))
-            task_text_clash = asyncio.create_task(self.narrator.generate_clash(player_a.display_name, player_b.display_name, style=self.narration_style))
-            task_text_victory = asyncio.create_task(self.narrator.generate_victory(winner.display_name, loser.display_name, style=self.narration_style))
+                await asyncio.sleep(15)
+
+                await betting_cog.engine.close_market(match_id)
+                # Disable view
+                view.stop()
+                await bet_msg.edit(view=None)
+                await ctx.send("🔒 **Betting Closed!**")
+
+            # update_status edits this (we send a new message since we don't have an interaction object from a button click)
+            status_msg = await ctx.send(f"⚔️ **Initializing Match:** {player_a.display_name} vs {player_b.display_name}...")
+
+            # Follow the production's progress until the scenes start coming out
+            production.on_status = update_status
+            await update_status(production.status)
+
+            embed1 = discord.Embed(title="⚔️ THE BACKROOM PARLOR ⚔️", color=discord.Color.blue())
+            meeting_msg = None
+            if settings.NARRATOR_STREAMING and not production.narrator_started:
+                # Post the stare-down right away and write it in as the narrator streams; the image is edited in later
+                embed1.add_field(name="👀 The Stare Down", value="*...*", inline=False)
+                meeting_msg = await ctx.send(embed=embed1)
+                production.attach_stream(EmbedStreamer(meeting_msg, embed1, "👀 The Stare Down"))
             
             # --- SCENE 1: THE MEETING ---
             print("DEBUG: Processing Scene 1...")
+            meeting_text = await production.text("meeting")
+            production.on_status = None
             await update_status("🎨 **Scene 1/3: The Meeting** (Processing...)")
-            
-            meeting_text = await task_text_meeting
             print(f"DEBUG: Meeting Text: {meeting_text[:20]}...")
             
-            # Use Player A's avatar as control for Scene 1
-            print("DEBUG: Generating Scene 1 Image...")
-            meeting_image_data = await self.generate_image_hybrid(meeting_prompt, prefer_nvidia=False, control_image_url=player_a.display_avatar.url)
+            print("DEBUG: Waiting for Scene 1 Image...")
+            meeting_image_data = await production.image("meeting")
             print(f"DEBUG: Scene 1 Image Data Type: {type(meeting_image_data)}")
             
-            embed1 = discord.Embed(title="⚔️ THE BACKROOM PARLOR ⚔️", color=discord.Color.blue())
+            embed1.clear_fields()
             embed1.add_field(name="👀 The Stare Down", value=f"*{meeting_text}*", inline=False)
             file1 = None
-            if meeting_image_data and isinstance(meeting_image_data, io.BytesIO):
-                meeting_image_data.seek(0)
-                file1 = discord.File(meeting_image_data, filename="meeting.jpg")
-                embed1.set_image(url="attachment://meeting.jpg")
+            if meeting_image_data:
+                file1 = meeting_image_data.to_file("meeting")
+                embed1.set_image(url=f"attachment://{file1.filename}")
             
-            await ctx.send(embed=embed1, file=file1)
+            if meeting_msg:
+                await meeting_msg.edit(embed=embed1, attachments=[file1] if file1 else [])
+            else:
+                await ctx.send(embed=embed1, file=file1)
+            if meeting_image_data:
+                meeting_image_data.close()
             
                         # --- BETTING PHASE (Async Delay) ---
             if config.get("betting_enabled", False):
@@ -819,45 +1094,47 @@ class Battle(commands.Cog):
             print("DEBUG: Processing Scene 2...")
             await update_status("🎨 **Scene 2/3: The Clash** (Processing...)")
             
-            clash_text = await task_text_clash
-            # Use Player A's avatar as control for Scene 2 (or random?)
-            clash_image_data = await self.generate_image_hybrid(clash_prompt, prefer_nvidia=False, control_image_url=player_a.display_avatar.url)
+            clash_text = await production.text("clash")
+            clash_image_data = await production.image("clash")
             
             embed2 = discord.Embed(color=discord.Color.red())
             embed2.add_field(name="💥 The Clash", value=f"*{clash_text}*", inline=False)
             file2 = None
-            if clash_image_data and isinstance(clash_image_data, io.BytesIO):
-                clash_image_data.seek(0)
-                file2 = discord.File(clash_image_data, filename="clash.jpg")
-                embed2.set_image(url="attachment://clash.jpg")
+            if clash_image_data:
+                file2 = clash_image_data.to_file("clash")
+                embed2.set_image(url=f"attachment://{file2.filename}")
             
             await ctx.send(embed=embed2, file=file2)
+            if clash_image_data:
+                clash_image_data.close()
 
             # --- SCENE 3: THE VICTORY ---
             print("DEBUG: Processing Scene 3...")
             await update_status("🎨 **Scene 3/3: The Victory** (Processing...)")
             
-            victory_text = await task_text_victory
-            # Use WINNER's avatar as control for Scene 3
-            victory_image_data = await self.generate_image_hybrid(victory_prompt, prefer_nvidia=False, control_image_url=winner.display_avatar.url)
+            victory_text = await production.text("victory")
+            victory_image_data = await production.image("victory")
             
             embed3 = discord.Embed(color=discord.Color.gold())
             embed3.add_field(name="🏆 The Victor", value=f"**{winner.display_name}**\n\n*{victory_text}*", inline=False)
             file3 = None
-            if victory_image_data and isinstance(victory_image_data, io.BytesIO):
-                victory_image_data.seek(0)
-                file3 = discord.File(victory_image_data, filename="victory.jpg")
-                embed3.set_image(url="attachment://victory.jpg")
+            if victory_image_data:
+                file3 = victory_image_data.to_file("victory")
+                embed3.set_image(url=f"attachment://{file3.filename}")
             
             embed3.set_thumbnail(url=winner.display_avatar.url)
             
             await ctx.send(embed=embed3, file=file3)
+            if victory_image_data:
+                victory_image_data.close()
             
             await update_status("✅ **Battle Complete!**")
+            match_stats['overruns'] = list(production.deadline.overruns) if production.deadline else []
             
             # --- BETTING RESOLUTION ---
             if betting_cog and enable_betting and config.get("betting_enabled", False):
-                winners = betting_cog.engine.resolve(self.current_match_id, winning_team)
+                # Pays every winner in one ledger transaction
+                winners = await betting_cog.engine.resolve(match_id, production.winning_team)
                 if winners:
                     match_stats['winners'] = winners
                     # Sort by profit
@@ -865,7 +1142,6 @@ class Battle(commands.Cog):
                     
                     summary = "💰 **Betting Results**\n"
                     for w in winners:
-                        betting_cog.add_balance(ctx.guild.get_member_named(w['user_name']).id if ctx.guild.get_member_named(w['user_name']) else 0, w['winnings']) # Mock DB update
                         summary += f"• **{w['user_name']}** won {w['winnings']:.2f} (Profit: {w['profit']:.2f})\n"
                     
                     biggest_winner = winners[0]
@@ -882,6 +1158,13 @@ class Battle(commands.Cog):
             traceback.print_exc()
             await update_status(f"❌ **Error:** {str(e)}")
             return None, {}
+        finally:
+            production.on_status = None
+            if betting_cog and match_id in betting_cog.engine.markets:
+                # The match never got to resolution - give the stakes back
+                await betting_cog.engine.cancel(match_id)
+            # Don't leave generations running for a match that failed, and free image buffers that never made it to Discord
+            production.release()
 
 async def setup(bot):
     await bot.add_cog(Battle(bot))
@@ -2,86 +2,106 @@ import discord
 from discord.ext import commands
 import asyncio
 import time
+from database.ledger import ledger
 
 class BettingEngine:
-    def __init__(self):
-        self.active_bets = {} # match_id -> {user_id: {amount, player}}
-        self.pools = {} # match_id -> {player_a: total, player_b: total}
-        self.is_open = {} # match_id -> bool
-        self.odds = {} # match_id -> {player_a: multiplier, player_b: multiplier}
+    """
+    Betting markets that are open or waiting for their match to finish.
+    The bets and every token moved are in the ledger (database/ledger.py),
+    so they survive a restart; the odds are worked out from those bets when
+    the market settles.
+
+    A bet checks that the market is open and writes its stake under the
+    market's lock, and closing, settling or cancelling takes the same lock,
+    so no stake can land in a market after it closed.
+    """
+    def __init__(self, ledger):
+        self.ledger = ledger
+        self.markets = {} # match_id -> {'open', 'names', 'lock'}
 
     def open_market(self, match_id):
-        self.active_bets[match_id] = {}
-        self.pools[match_id] = {'A': 0.0, 'B': 0.0}
-        self.is_open[match_id] = True
-        self.odds[match_id] = {'A': 1.0, 'B': 1.0}
-
-    def close_market(self, match_id):
-        self.is_open[match_id] = False
-        # Calculate final odds
-        pool_a = self.pools[match_id]['A']
-        pool_b = self.pools[match_id]['B']
-        total_pool = pool_a + pool_b
-        
-        if pool_a > 0:
-            self.odds[match_id]['A'] = total_pool / pool_a
-        if pool_b > 0:
-            self.odds[match_id]['B'] = total_pool / pool_b
-
-    def place_bet(self, match_id, user, amount, team):
-        if not self.is_open.get(match_id):
+        self.markets[match_id] = {
+            'open': True,
+            'names': {}, # discord id -> display name, for the results
+            'lock': asyncio.Lock(),
+        }
+
+    async def close_market(self, match_id):
+        market = self.markets.get(match_id)
+        if market:
+            # Waits for bets still being written
+            async with market['lock']:
+                market['open'] = False
+
+    async def place_bet(self, match_id, user, amount, team):
+        market = self.markets.get(match_id)
+        if not market:
             return False, "Betting is closed for this match."
+        if amount <= 0:
+            return False, "Bet amount must be positive."
+
+        async with market['lock']:
+            # Checked under the lock: the market may have closed while we waited for it
+            if not market['open'] or self.markets.get(match_id) is not market:
+                return False, "Betting is closed for this match."
+            placed, balance = await self.ledger.place_bet(match_id, str(user.id), team, amount)
+        if not placed:
+            return False, f"Insufficient funds. Balance: {balance:.2f}"
         
-        # In a real app, check user balance here
-        
-        if match_id not in self.active_bets:
-            self.active_bets[match_id] = {}
-            
-        self.active_bets[match_id][user.id] = {'amount': amount, 'team': team, 'user_name': user.display_name}
-        self.pools[match_id][team] += amount
+        market['names'][str(user.id)] = user.display_name
         return True, f"Bet placed: {amount} on {team}"
 
-    def resolve(self, match_id, winning_team):
-        winners = []
-        if match_id not in self.active_bets:
+    async def _take_market(self, match_id):
+        """Removes a market once no bet is being written to it. None if it is already gone."""
+        market = self.markets.get(match_id)
+        if not market:
+            return None
+        async with market['lock']:
+            market['open'] = False
+            if self.markets.get(match_id) is not market:
+                return None
+            del self.markets[match_id]
+        return market
+
+    async def resolve(self, match_id, winning_team):
+        market = await self._take_market(match_id)
+        if not market:
             return []
 
-        odds = self.odds[match_id].get(winning_team, 1.0)
-        
-        for user_id, bet in self.active_bets[match_id].items():
-            if bet['team'] == winning_team:
-                winnings = bet['amount'] * odds
-                winners.append({
-                    'user_name': bet['user_name'],
-                    'winnings': winnings,
-                    'profit': winnings - bet['amount']
-                })
-                # In a real app, credit user balance here
-        
-        # Cleanup
-        del self.active_bets[match_id]
-        del self.pools[match_id]
-        del self.is_open[match_id]
-        del self.odds[match_id]
-        
+        # Every winner is paid in one transaction, at odds from the bets the ledger actually holds
+        winners = await self.ledger.settle(match_id, winning_team)
+        for winner in winners:
+            winner['user_name'] = market['names'].get(winner['user_id'], winner['user_id'])
         return winners
 
+    async def cancel(self, match_id):
+        """The match failed - refund every stake. Returns the number of bets refunded."""
+        if await self._take_market(match_id) is None:
+            return 0
+        return await self.ledger.refund(match_id)
+
 class Betting(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.engine = BettingEngine()
-        self.user_balances = {} # Mock DB for now: user_id -> float
+        self.ledger = ledger
+        self.engine = BettingEngine(ledger)
+
+    async def cog_load(self):
+        # Bets from markets that never settled (the bot went down mid-match) go back to their owners
+        refunded = await self.ledger.refund_stale()
+        if refunded:
+            print(f"💸 Refunded {refunded} bets from unfinished matches")
 
-    def get_balance(self, user_id):
-        return self.user_balances.get(user_id, 100.0) # Default 100 tokens
+    async def get_balance(self, user_id):
+        return await self.ledger.get_balance(str(user_id))
 
-    def add_balance(self, user_id, amount):
-        self.user_balances[user_id] = self.get_balance(user_id) + amount
+    async def add_balance(self, user_id, amount):
+        await self.ledger.grant(str(user_id), amount)
 
     @commands.hybrid_command(name='balance')
     async def balance(self, ctx):
         """Check your token balance."""
-        bal = self.get_balance(ctx.author.id)
+        bal = await self.get_balance(ctx.author.id)
         await ctx.send(f"💰 **Wallet:** {bal:.2f} Tokens")
 
     @commands.hybrid_command(name='bet')
@@ -94,16 +114,14 @@ class Betting(commands.Cog):
             await ctx.send("❌ Betting is disabled until a Payout Token is configured by admin.")
             return
 
-        # Find active match (simplified: assuming 1 active match per server for now)
-        # In reality, we'd need to know which match context we are in.
-        # For now, we'll let the Battle Cog manage the "Current Match ID"
-        
+        # Find the match open for betting in this channel's session
         battle_cog = self.bot.get_cog("Battle")
-        if not battle_cog or not battle_cog.current_match_id:
+        session = battle_cog.sessions.peek(ctx) if battle_cog else None
+        if not session or not session.current_match_id:
             await ctx.send("⚠️ No active match to bet on.")
             return
 
-        match_id = battle_cog.current_match_id
+        match_id = session.current_match_id
         
         # Validate Team
         team = team.upper()
@@ -111,15 +129,9 @@ class Betting(commands.Cog):
              await ctx.send("⚠️ Invalid selection. Bet on 'A' or 'B'.")
              return
 
-        # Validate Balance
-        bal = self.get_balance(ctx.author.id)
-        if amount > bal:
-            await ctx.send(f"❌ Insufficient funds. Balance: {bal}")
-            return
-
-        success, msg = self.engine.place_bet(match_id, ctx.author, amount, team)
+        # The ledger checks the balance and debits the stake in one step
+        success, msg = await self.engine.place_bet(match_id, ctx.author, amount, team)
         if success:
-            self.add_balance(ctx.author.id, -amount)
             await ctx.send(f"✅ {msg}")
         else:
             await ctx.send(f"❌ {msg}")
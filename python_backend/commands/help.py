@@ -103,7 +103,13 @@ class Help(commands.Cog):
         
         embed.add_field(
             name="🎨 Customization",
-            value="`/admin_set_theme`, `/admin_narrator`",
+            value="`/admin_set_theme`, `/admin_narrator`, `/admin_scene_concurrency`",
+            inline=False
+        )
+        
+        embed.add_field(
+            name="📡 Monitoring",
+            value="`/admin_health`, `/admin_providers` - Live image provider scoreboard.",
             inline=False
         )
         
@@ -10,3 +10,144 @@ SUPERMACHINE_API_KEY = os.getenv("SUPERMACHINE_API_KEY", "sk-9793a1e3-ce7c-47e4-
 SOLANA_RPC_URL = os.getenv("SOLANA_RPC_URL")
 ADMIN_ID = os.getenv("ADMIN_ID")
 DISCORD_GUILD_ID = os.getenv("DISCORD_GUILD_ID")
+
+# Shared HTTP client pool (integrations/http_client.py)
+HTTP_POOL_LIMIT = int(os.getenv("HTTP_POOL_LIMIT", "100"))
+HTTP_POOL_LIMIT_PER_HOST = int(os.getenv("HTTP_POOL_LIMIT_PER_HOST", "10"))
+HTTP_KEEPALIVE_TIMEOUT = float(os.getenv("HTTP_KEEPALIVE_TIMEOUT", "60"))
+HTTP_DNS_CACHE_TTL = int(os.getenv("HTTP_DNS_CACHE_TTL", "300"))
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "300"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "15"))
+
+# Avatar description cache (database/avatar_cache.py)
+AVATAR_CACHE_TTL = int(os.getenv("AVATAR_CACHE_TTL", str(7 * 24 * 3600)))
+AVATAR_CACHE_MEMORY_SIZE = int(os.getenv("AVATAR_CACHE_MEMORY_SIZE", "512"))
+AVATAR_CACHE_MAX_ROWS = int(os.getenv("AVATAR_CACHE_MAX_ROWS", "20000"))
+
+# Supermachine ControlNet reference image cache
+CONTROL_IMAGE_CACHE_SIZE = int(os.getenv("CONTROL_IMAGE_CACHE_SIZE", "64"))
+CONTROL_IMAGE_CACHE_MAX_BYTES = int(os.getenv("CONTROL_IMAGE_CACHE_MAX_MB", "128")) * 1024 * 1024
+CONTROL_IMAGE_FRESH_SECONDS = int(os.getenv("CONTROL_IMAGE_FRESH_SECONDS", "3600"))
+
+# Image provider hedging (integrations/hedging.py)
+PROVIDER_STATS_WINDOW = int(os.getenv("PROVIDER_STATS_WINDOW", "50"))
+HEDGE_ENABLED = os.getenv("HEDGE_ENABLED", "true").lower() == "true"
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "0.9"))
+HEDGE_MIN_SAMPLES = int(os.getenv("HEDGE_MIN_SAMPLES", "5"))
+HEDGE_DEFAULT_DELAY = float(os.getenv("HEDGE_DEFAULT_DELAY", "45"))
+HEDGE_MIN_DELAY = float(os.getenv("HEDGE_MIN_DELAY", "10"))
+HEDGE_MAX_DELAY = float(os.getenv("HEDGE_MAX_DELAY", "120"))
+
+# Provider router & circuit breakers (integrations/provider_router.py)
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "3"))
+BREAKER_RESET_TIMEOUT = float(os.getenv("BREAKER_RESET_TIMEOUT", "120"))
+ROUTER_MIN_SAMPLES = int(os.getenv("ROUTER_MIN_SAMPLES", "3"))
+ROUTER_UNKNOWN_EXPECTED = float(os.getenv("ROUTER_UNKNOWN_EXPECTED", "45"))
+
+# Per-host rate limits (integrations/rate_limiter.py), "host=requests_per_sec/burst,..."
+RATE_LIMITS = os.getenv("RATE_LIMITS", "image.pollinations.ai=0.5/3")
+RATE_LIMIT_DEFAULT_BACKOFF = float(os.getenv("RATE_LIMIT_DEFAULT_BACKOFF", "10"))
+
+# Supermachine completion: "webhook" (default), or opt in to "race" (webhook vs poll) / "poll" (no public
+# webhook). Both poll GET {api_url}/{generation_id}, which is not a documented Supermachine endpoint
+SUPERMACHINE_COMPLETION_MODE = os.getenv("SUPERMACHINE_COMPLETION_MODE", "webhook").lower()
+SUPERMACHINE_TIMEOUT = float(os.getenv("SUPERMACHINE_TIMEOUT", "220"))
+SUPERMACHINE_POLL_INITIAL = float(os.getenv("SUPERMACHINE_POLL_INITIAL", "3"))
+SUPERMACHINE_POLL_MAX = float(os.getenv("SUPERMACHINE_POLL_MAX", "15"))
+SUPERMACHINE_POLL_BACKOFF = float(os.getenv("SUPERMACHINE_POLL_BACKOFF", "1.5"))
+
+# Supermachine request registry: entries older than the TTL are swept. At the cap a generation's first
+# racer waits for a free slot (up to its deadline); the backup racer is skipped
+SUPERMACHINE_PENDING_TTL = float(os.getenv("SUPERMACHINE_PENDING_TTL", "300"))
+SUPERMACHINE_MAX_OUTSTANDING = int(os.getenv("SUPERMACHINE_MAX_OUTSTANDING", "8"))
+
+# Supermachine auth token: lifetime when the token carries no exp claim, and how early to renew it
+SUPERMACHINE_TOKEN_TTL = float(os.getenv("SUPERMACHINE_TOKEN_TTL", "3300"))
+SUPERMACHINE_TOKEN_REFRESH_MARGIN = float(os.getenv("SUPERMACHINE_TOKEN_REFRESH_MARGIN", "120"))
+
+# Generated images: hard size cap, and how much stays in RAM before spilling to a temp file
+IMAGE_MAX_BYTES = int(os.getenv("IMAGE_MAX_MB", "20")) * 1024 * 1024
+IMAGE_SPOOL_THRESHOLD = int(os.getenv("IMAGE_SPOOL_THRESHOLD_KB", "4096")) * 1024
+
+# Re-encode scenes before upload ("webp", "jpeg" or "off"); needs Pillow. 0 max dimension keeps the size
+IMAGE_TRANSCODE_FORMAT = os.getenv("IMAGE_TRANSCODE_FORMAT", "webp").lower()
+IMAGE_TRANSCODE_QUALITY = int(os.getenv("IMAGE_TRANSCODE_QUALITY", "82"))
+IMAGE_MAX_DIMENSION = int(os.getenv("IMAGE_MAX_DIMENSION", "0"))
+IMAGE_TRANSCODE_WORKERS = int(os.getenv("IMAGE_TRANSCODE_WORKERS", "2"))
+
+# Narrator: write meeting/clash/victory in one structured request instead of three
+NARRATOR_BATCH_MODE = os.getenv("NARRATOR_BATCH_MODE", "true").lower() == "true"
+
+# Stream the narrator and render the stare-down as it is written (seconds between embed edits)
+NARRATOR_STREAMING = os.getenv("NARRATOR_STREAMING", "true").lower() == "true"
+NARRATOR_STREAM_EDIT_INTERVAL = float(os.getenv("NARRATOR_STREAM_EDIT_INTERVAL", "1.0"))
+
+# Battle time budget (seconds) and the share of the remaining budget each stage may use
+BATTLE_TIME_BUDGET = float(os.getenv("BATTLE_TIME_BUDGET", "240"))
+VISION_BUDGET_SHARE = float(os.getenv("VISION_BUDGET_SHARE", "0.1"))
+NARRATOR_BUDGET_SHARE = float(os.getenv("NARRATOR_BUDGET_SHARE", "0.2"))
+SCENE_BUDGET_SHARE = float(os.getenv("SCENE_BUDGET_SHARE", "0.9"))
+
+# Idle-time asset pool: backdrops and narration snippets per arena theme in use (counts are per theme)
+ASSET_POOL_ENABLED = os.getenv("ASSET_POOL_ENABLED", "true").lower() == "true"
+ASSET_POOL_IMAGES = int(os.getenv("ASSET_POOL_IMAGES", "3"))
+ASSET_POOL_SNIPPETS = int(os.getenv("ASSET_POOL_SNIPPETS", "5"))
+ASSET_POOL_INTERVAL = float(os.getenv("ASSET_POOL_INTERVAL", "60"))
+
+# Tournament rounds: matches generated at once across all channels, and the pause between reveals
+MATCH_CONCURRENCY = int(os.getenv("MATCH_CONCURRENCY", "4"))
+MATCH_REVEAL_GAP = float(os.getenv("MATCH_REVEAL_GAP", "5"))
+
+# How many upcoming tournament matches to start generating before their round begins
+PREFETCH_MATCHES = int(os.getenv("PREFETCH_MATCHES", "2"))
+
+# Tournament sessions: one per "channel" (default) or one per "guild"
+SESSION_SCOPE = os.getenv("SESSION_SCOPE", "channel").lower()
+
+# Sharding: "off" (plain Bot) or "auto" (AutoShardedBot). SHARD_COUNT 0 = Discord's recommendation.
+# SHARD_IDS / PROCESS_INDEX / COORDINATOR_URL are set per process by launcher.py
+SHARDING = os.getenv("SHARDING", "off").lower()
+SHARD_COUNT = int(os.getenv("SHARD_COUNT", "0"))
+SHARD_IDS = [int(i) for i in os.getenv("SHARD_IDS", "").split(",") if i.strip()]
+SHARD_PROCESSES = int(os.getenv("SHARD_PROCESSES", "1"))
+PROCESS_INDEX = int(os.getenv("PROCESS_INDEX", "0"))
+# "startup" loads every member list at login; "lazy" fetches a guild's members the first time they're needed
+MEMBER_CHUNKING = os.getenv("MEMBER_CHUNKING", "startup").lower()
+
+# Webhook server port (the public one; with launcher.py each shard process gets SHARD_WEBHOOK_BASE_PORT + index)
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "3000"))
+SHARD_WEBHOOK_BASE_PORT = int(os.getenv("SHARD_WEBHOOK_BASE_PORT", "3100"))
+# Local coordinator for multi-process runs: webhook routing, shared rate limits, shard metrics
+COORDINATOR_URL = os.getenv("COORDINATOR_URL", "")
+COORDINATOR_PORT = int(os.getenv("COORDINATOR_PORT", "3001"))
+SHARD_REPORT_INTERVAL = float(os.getenv("SHARD_REPORT_INTERVAL", "30"))
+
+# Durable generation job queue: image and vision work runs in worker.py processes instead of the bot.
+# Off by default - turn on only with worker.py running against the same DATABASE_URL.
+JOB_QUEUE_ENABLED = os.getenv("JOB_QUEUE_ENABLED", "false").lower() == "true"
+WORKER_PROCESSES = int(os.getenv("WORKER_PROCESSES", "2"))
+WORKER_CONCURRENCY = int(os.getenv("WORKER_CONCURRENCY", "4"))
+JOB_TIMEOUT = float(os.getenv("JOB_TIMEOUT", "300"))
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "60"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "2"))
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "1.0"))
+JOB_RETENTION_HOURS = float(os.getenv("JOB_RETENTION_HOURS", "24"))
+# Workers report progress to the bot over this unix socket; images are handed over as files in JOB_OUTPUT_DIR
+JOB_IPC_SOCKET = os.getenv("JOB_IPC_SOCKET", "/tmp/parlor-jobs.sock")
+JOB_OUTPUT_DIR = os.getenv("JOB_OUTPUT_DIR", "job_output")
+
+# Async database pool (database/db_manager.py db_session) used by command handlers
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+
+# SQLite connection tuning (database/db_manager.py); SQLITE_WAL=false keeps the default rollback journal
+SQLITE_WAL = os.getenv("SQLITE_WAL", "true").lower() == "true"
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL").upper()
+SQLITE_CACHE_KB = int(os.getenv("SQLITE_CACHE_MB", "64")) * 1024
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+
+# Betting ledger (database/ledger.py): new players' starting tokens, cached balances, refunds for abandoned markets
+BETTING_STARTING_BALANCE = float(os.getenv("BETTING_STARTING_BALANCE", "100"))
+LEDGER_CACHE_SIZE = int(os.getenv("LEDGER_CACHE_SIZE", "1024"))
+LEDGER_CACHE_TTL = float(os.getenv("LEDGER_CACHE_TTL", "30"))
+BET_REFUND_AFTER = float(os.getenv("BET_REFUND_AFTER", "3600"))
@@ -0,0 +1,202 @@
+import asyncio
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from config import settings
+from .db_manager import SessionLocal
+from .models import AvatarDescription
+
+class AvatarDescriptionCache:
+    """
+    Two-tier cache for vision descriptions of avatars/NFTs.
+    Tier 1 is an in-memory LRU keyed by image URL and content hash,
+    tier 2 is the avatar_descriptions table so entries survive restarts.
+    """
+    def __init__(self, ttl=None, memory_size=None, max_rows=None):
+        self.ttl = ttl if ttl is not None else settings.AVATAR_CACHE_TTL
+        self.memory_size = memory_size if memory_size is not None else settings.AVATAR_CACHE_MEMORY_SIZE
+        self.max_rows = max_rows if max_rows is not None else settings.AVATAR_CACHE_MAX_ROWS
+        self._memory = OrderedDict() # "url:<url>" / "hash:<sha256>" -> (description, stored_at)
+        self.stats = {
+            'memory_hits': 0,
+            'disk_hits': 0,
+            'hash_hits': 0,
+            'misses': 0,
+            'evictions': 0,
+            'expired': 0,
+        }
+
+    # --- Memory Tier ---
+
+    def _memory_get(self, key):
+        entry = self._memory.get(key)
+        if not entry:
+            return None
+        description, stored_at = entry
+        if time.time() - stored_at > self.ttl:
+            del self._memory[key]
+            self.stats['expired'] += 1
+            return None
+        self._memory.move_to_end(key)
+        return description
+
+    def _memory_put(self, key, description, stored_at=None):
+        self._memory[key] = (description, stored_at if stored_at is not None else time.time())
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+            self.stats['evictions'] += 1
+
+    # --- Disk Tier (runs in a worker thread) ---
+
+    def _disk_lookup(self, image_url=None, content_hash=None):
+        db = SessionLocal()
+        try:
+            query = db.query(AvatarDescription)
+            if image_url:
+                row = query.filter_by(image_url=image_url).first()
+            else:
+                row = query.filter_by(content_hash=content_hash).order_by(AvatarDescription.last_used_at.desc()).first()
+            if not row:
+                return None
+            if row.created_at and datetime.utcnow() - row.created_at > timedelta(seconds=self.ttl):
+                db.delete(row)
+                db.commit()
+                return 'EXPIRED'
+            row.last_used_at = datetime.utcnow()
+            row.hits = (row.hits or 0) + 1
+            db.commit()
+            return row.description, row.content_hash, row.created_at.timestamp()
+        finally:
+            db.close()
+
+    def _disk_store(self, image_url, content_hash, description):
+        db = SessionLocal()
+        try:
+            row = db.query(AvatarDescription).filter_by(image_url=image_url).first()
+            now = datetime.utcnow()
+            if row:
+                row.description = description
+                row.content_hash = content_hash
+                row.created_at = now
+                row.last_used_at = now
+            else:
+                db.add(AvatarDescription(image_url=image_url, content_hash=content_hash, description=description, created_at=now, last_used_at=now))
+            db.commit()
+            self._disk_prune(db)
+        finally:
+            db.close()
+
+    def _disk_prune(self, db):
+        # Drop expired rows, then the least recently used rows beyond max_rows
+        cutoff = datetime.utcnow() - timedelta(seconds=self.ttl)
+        removed = db.query(AvatarDescription).filter(AvatarDescription.created_at < cutoff).delete(synchronize_session=False)
+        overflow = db.query(AvatarDescription).count() - self.max_rows
+        if overflow > 0:
+            stale_ids = [r.id for r in db.query(AvatarDescription.id).order_by(AvatarDescription.last_used_at.asc()).limit(overflow)]
+            removed += db.query(AvatarDescription).filter(AvatarDescription.id.in_(stale_ids)).delete(synchronize_session=False)
+        if removed:
+            db.commit()
+            self.stats['evictions'] += removed
+
+    def _disk_recent(self, limit):
+        db = SessionLocal()
+        try:
+            cutoff = datetime.utcnow() - timedelta(seconds=self.ttl)
+            rows = (
+                db.query(AvatarDescription)
+                .filter(AvatarDescription.created_at >= cutoff)
+                .order_by(AvatarDescription.last_used_at.desc())
+                .limit(limit)
+                .all()
+            )
+            return [(r.image_url, r.content_hash, r.description, r.created_at.timestamp()) for r in rows]
+        finally:
+            db.close()
+
+    # --- Public API ---
+
+    async def get(self, image_url):
+        """Looks up a description by image URL. Returns None on a miss."""
+        description = self._memory_get(f"url:{image_url}")
+        if description:
+            self.stats['memory_hits'] += 1
+            return description
+
+        try:
+            row = await asyncio.to_thread(self._disk_lookup, image_url=image_url)
+        except Exception as e:
+            print(f"Avatar Cache DB Error: {e}")
+            row = None
+
+        if row == 'EXPIRED':
+            self.stats['expired'] += 1
+        elif row:
+            description, content_hash, stored_at = row
+            self.stats['disk_hits'] += 1
+            self._memory_put(f"url:{image_url}", description, stored_at)
+            if content_hash:
+                self._memory_put(f"hash:{content_hash}", description, stored_at)
+            return description
+        return None
+
+    async def get_by_hash(self, content_hash):
+        """Looks up a description by image content hash (same NFT, different URL)."""
+        if not content_hash:
+            self.stats['misses'] += 1
+            return None
+
+        description = self._memory_get(f"hash:{content_hash}")
+        if description:
+            self.stats['hash_hits'] += 1
+            return description
+
+        try:
+            row = await asyncio.to_thread(self._disk_lookup, content_hash=content_hash)
+        except Exception as e:
+            print(f"Avatar Cache DB Error: {e}")
+            row = None
+
+        if row and row != 'EXPIRED':
+            description, _, stored_at = row
+            self.stats['hash_hits'] += 1
+            self._memory_put(f"hash:{content_hash}", description, stored_at)
+            return description
+
+        self.stats['misses'] += 1
+        return None
+
+    async def put(self, image_url, content_hash, description):
+        self._memory_put(f"url:{image_url}", description)
+        if content_hash:
+            self._memory_put(f"hash:{content_hash}", description)
+        try:
+            await asyncio.to_thread(self._disk_store, image_url, content_hash, description)
+        except Exception as e:
+            print(f"Avatar Cache DB Error: {e}")
+
+    async def warm_load(self, limit=None):
+        """Pre-loads the most recently used descriptions into memory."""
+        limit = limit if limit is not None else self.memory_size // 2
+        try:
+            rows = await asyncio.to_thread(self._disk_recent, limit)
+        except Exception as e:
+            print(f"Avatar Cache Warm-Load Failed: {e}")
+            return 0
+
+        # Oldest first so the most recent end up at the hot end of the LRU
+        for image_url, content_hash, description, stored_at in reversed(rows):
+            self._memory_put(f"url:{image_url}", description, stored_at)
+            if content_hash:
+                self._memory_put(f"hash:{content_hash}", description, stored_at)
+        print(f"Avatar Cache warmed with {len(rows)} descriptions.")
+        return len(rows)
+
+    def get_stats(self):
+        hits = self.stats['memory_hits'] + self.stats['disk_hits'] + self.stats['hash_hits']
+        total = hits + self.stats['misses']
+        return {
+            **self.stats,
+            'hit_ratio': (hits / total) if total else 0.0,
+            'memory_entries': len(self._memory),
+        }
@@ -1,15 +1,64 @@
 import os
-from sqlalchemy import create_engine
+from contextlib import asynccontextmanager
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from config import settings
 from .models import Base
+from .migrations import run_migrations
 
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///backroom_parlor.db")
 
+def _tune_sqlite(dbapi_connection, connection_record):
+    """
+    Per-connection SQLite settings. WAL lets readers (the bot, worker.py)
+    carry on while one connection writes; synchronous=NORMAL is safe with WAL
+    and skips an fsync per commit; busy_timeout waits out another writer
+    instead of failing with "database is locked".
+    """
+    cursor = dbapi_connection.cursor()
+    if settings.SQLITE_WAL:
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute(f"PRAGMA synchronous={settings.SQLITE_SYNCHRONOUS}")
+    cursor.execute(f"PRAGMA cache_size=-{settings.SQLITE_CACHE_KB}") # negative = KiB, not pages
+    cursor.execute(f"PRAGMA busy_timeout={settings.SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.close()
+
 engine = create_engine(DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+def async_url(url):
+    """Same database through an asyncio driver (aiosqlite / asyncpg)."""
+    if url.startswith("sqlite://"):
+        return "sqlite+aiosqlite://" + url[len("sqlite://"):]
+    if url.startswith("postgresql://") or url.startswith("postgres://"):
+        return "postgresql+asyncpg://" + url.split("://", 1)[1]
+    return url
+
+# Async engine for command handlers, so a commit never blocks the event loop.
+# In-memory SQLite can't be pooled (each connection would get its own database)
+_pool_options = {} if ":memory:" in DATABASE_URL else {
+    'pool_size': settings.DB_POOL_SIZE,
+    'max_overflow': settings.DB_MAX_OVERFLOW,
+    'pool_pre_ping': True,
+}
+async_engine = create_async_engine(async_url(DATABASE_URL), **_pool_options)
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+if engine.dialect.name == "sqlite":
+    event.listen(engine, "connect", _tune_sqlite)
+    event.listen(async_engine.sync_engine, "connect", _tune_sqlite)
+
+def dialect_insert(table):
+    """INSERT that supports on_conflict_do_update/do_nothing (dialect-specific in SQLAlchemy)."""
+    dialect = postgresql if engine.dialect.name == "postgresql" else sqlite
+    return dialect.insert(table)
+
 def init_db():
+    # New tables come from the models, changes to existing ones from migrations
     Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
 
 def get_db():
     db = SessionLocal()
@@ -17,3 +66,14 @@ def get_db():
         yield db
     finally:
         db.close()
+
+@asynccontextmanager
+async def db_session():
+    """
+    async with db_session() as db:
+        ...
+        await db.commit()
+    Uncommitted work is rolled back when the block exits (also on errors).
+    """
+    async with AsyncSessionLocal() as db:
+        yield db
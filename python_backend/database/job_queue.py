@@ -0,0 +1,164 @@
+import asyncio
+import json
+from datetime import datetime, timedelta
+from sqlalchemy import or_, and_, func
+from config import settings
+from .db_manager import SessionLocal
+from .models import Job
+
+FINISHED = ("done", "failed", "cancelled")
+
+class JobQueue:
+    """
+    The jobs table as a work queue shared by the bot and worker.py processes.
+    Workers claim jobs with a lease and keep extending it while they work;
+    a job whose worker died is claimed again once the lease runs out (up to
+    JOB_MAX_ATTEMPTS). Everything is in the database, so queued and finished
+    jobs survive restarts of either side.
+
+    The sync methods hit the database directly; the async ones run them in
+    a worker thread so the event loop never waits on a commit.
+    """
+    def __init__(self, lease_seconds=None, max_attempts=None):
+        self.lease_seconds = lease_seconds if lease_seconds is not None else settings.JOB_LEASE_SECONDS
+        self.max_attempts = max_attempts if max_attempts is not None else settings.JOB_MAX_ATTEMPTS
+
+    # --- Sync (worker thread) ---
+
+    def _enqueue(self, kind, payload):
+        db = SessionLocal()
+        try:
+            job = Job(kind=kind, payload=json.dumps(payload))
+            db.add(job)
+            db.commit()
+            return job.id
+        finally:
+            db.close()
+
+    def _claim(self, worker, kinds=None):
+        """Takes the oldest claimable job. Returns (id, kind, payload) or None."""
+        db = SessionLocal()
+        try:
+            now = datetime.utcnow()
+            claimable = or_(
+                Job.status == "queued",
+                and_(Job.status == "running", Job.lease_until < now),
+            )
+            query = db.query(Job.id).filter(claimable)
+            if kinds:
+                query = query.filter(Job.kind.in_(kinds))
+            for (job_id,) in query.order_by(Job.id).limit(5).all():
+                # Only one worker wins the conditional update; the rest try the next candidate
+                won = db.query(Job).filter(Job.id == job_id, claimable).update({
+                    Job.status: "running",
+                    Job.worker: worker,
+                    Job.attempts: Job.attempts + 1,
+                    Job.lease_until: now + timedelta(seconds=self.lease_seconds),
+                    Job.updated_at: now,
+                }, synchronize_session=False)
+                db.commit()
+                if not won:
+                    continue
+                job = db.get(Job, job_id)
+                if job.attempts > self.max_attempts:
+                    job.status, job.error = "failed", f"Gave up after {job.attempts - 1} attempts"
+                    db.commit()
+                    continue
+                return job.id, job.kind, json.loads(job.payload)
+            return None
+        finally:
+            db.close()
+
+    def _renew(self, job_id, worker):
+        """Extends the lease. False if the job was cancelled or taken over meanwhile."""
+        db = SessionLocal()
+        try:
+            now = datetime.utcnow()
+            renewed = db.query(Job).filter(Job.id == job_id, Job.worker == worker, Job.status == "running").update({
+                Job.lease_until: now + timedelta(seconds=self.lease_seconds),
+                Job.updated_at: now,
+            }, synchronize_session=False)
+            db.commit()
+            return bool(renewed)
+        finally:
+            db.close()
+
+    def _finish(self, job_id, status, result=None, error=None, worker=None):
+        db = SessionLocal()
+        try:
+            query = db.query(Job).filter(Job.id == job_id, Job.status.notin_(FINISHED))
+            if worker:
+                query = query.filter(Job.worker == worker)
+            return bool(query.update({
+                Job.status: status,
+                Job.result: json.dumps(result) if result is not None else None,
+                Job.error: error,
+                Job.updated_at: datetime.utcnow(),
+            }, synchronize_session=False))
+        finally:
+            db.commit()
+            db.close()
+
+    def _get(self, job_id):
+        """(status, result, error) or None."""
+        db = SessionLocal()
+        try:
+            job = db.get(Job, job_id)
+            if not job:
+                return None
+            return job.status, json.loads(job.result) if job.result else None, job.error
+        finally:
+            db.close()
+
+    def _purge(self, older_than_hours=None):
+        """Deletes finished jobs past the retention window. Returns their results for cleanup."""
+        hours = older_than_hours if older_than_hours is not None else settings.JOB_RETENTION_HOURS
+        db = SessionLocal()
+        try:
+            cutoff = datetime.utcnow() - timedelta(hours=hours)
+            query = db.query(Job).filter(Job.status.in_(FINISHED), Job.updated_at < cutoff)
+            results = [json.loads(job.result) for job in query.all() if job.result]
+            query.delete(synchronize_session=False)
+            db.commit()
+            return results
+        finally:
+            db.close()
+
+    def _counts(self):
+        db = SessionLocal()
+        try:
+            counts = {status: 0 for status in ("queued", "running") + FINISHED}
+            for status, count in db.query(Job.status, func.count()).group_by(Job.status):
+                counts[status] = count
+            return counts
+        finally:
+            db.close()
+
+    # --- Async ---
+
+    async def enqueue(self, kind, payload):
+        return await asyncio.to_thread(self._enqueue, kind, payload)
+
+    async def claim(self, worker, kinds=None):
+        return await asyncio.to_thread(self._claim, worker, kinds)
+
+    async def renew(self, job_id, worker):
+        return await asyncio.to_thread(self._renew, job_id, worker)
+
+    async def complete(self, job_id, result, worker=None):
+        return await asyncio.to_thread(self._finish, job_id, "done", result, None, worker)
+
+    async def fail(self, job_id, error, worker=None):
+        return await asyncio.to_thread(self._finish, job_id, "failed", None, str(error), worker)
+
+    async def cancel(self, job_id):
+        return await asyncio.to_thread(self._finish, job_id, "cancelled")
+
+    async def get(self, job_id):
+        return await asyncio.to_thread(self._get, job_id)
+
+    async def purge(self, older_than_hours=None):
+        return await asyncio.to_thread(self._purge, older_than_hours)
+
+    async def counts(self):
+        return await asyncio.to_thread(self._counts)
@@ -0,0 +1,233 @@
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from sqlalchemy import bindparam, insert, select, update
+from config import settings
+from .db_manager import db_session, dialect_insert
+from .models import Player, Bet, LedgerEntry
+
+# Core tables for executemany UPDATEs (one statement, many rows)
+players_table = Player.__table__
+bets_table = Bet.__table__
+
+class Ledger:
+    """
+    Token balances as an append-only ledger. Every change - the starting
+    balance, a bet, a payout, a refund, an admin grant - is a ledger_entries
+    row, written in the same transaction as the player's running total
+    (players.balance), so the two can't disagree.
+
+    A bet is debited with a conditional UPDATE (balance >= amount), so two
+    bets racing for the same tokens can't overdraw. A market is settled in
+    one transaction: every payout entry, balance and bet row at once.
+    Balances are cached in memory for LEDGER_CACHE_TTL seconds, and dropped
+    whenever this process writes to them.
+    """
+    def __init__(self, starting_balance=None, cache_size=None, cache_ttl=None):
+        self.starting_balance = starting_balance if starting_balance is not None else settings.BETTING_STARTING_BALANCE
+        self.cache_size = cache_size if cache_size is not None else settings.LEDGER_CACHE_SIZE
+        self.cache_ttl = cache_ttl if cache_ttl is not None else settings.LEDGER_CACHE_TTL
+        self._balances = OrderedDict() # discord_id -> (balance, cached_at)
+        self.stats = {
+            'cache_hits': 0,
+            'cache_misses': 0,
+            'bets': 0,
+            'rejected_bets': 0,
+            'settled_markets': 0,
+            'settled_bets': 0,
+            'refunded_bets': 0,
+        }
+
+    # --- Balance Cache ---
+
+    def _cached(self, discord_id):
+        entry = self._balances.get(discord_id)
+        if not entry or time.monotonic() - entry[1] > self.cache_ttl:
+            return None
+        self._balances.move_to_end(discord_id)
+        return entry[0]
+
+    def _cache(self, discord_id, balance):
+        self._balances[discord_id] = (balance, time.monotonic())
+        self._balances.move_to_end(discord_id)
+        while len(self._balances) > self.cache_size:
+            self._balances.popitem(last=False)
+
+    def _invalidate(self, discord_ids):
+        for discord_id in discord_ids:
+            self._balances.pop(discord_id, None)
+
+    # --- Writes (inside the caller's transaction) ---
+
+    async def _accounts(self, db, discord_ids):
+        """
+        {discord_id: (player id, balance)}, creating players as needed.
+        A player's first use of the ledger opens their account with the
+        starting balance (plus whatever balance the row already had).
+        """
+        discord_ids = list(set(discord_ids))
+        await db.execute(
+            dialect_insert(Player).values([{'discord_id': d} for d in discord_ids]).on_conflict_do_nothing(index_elements=[Player.discord_id])
+        )
+        now = datetime.utcnow()
+        # Conditional, so two racing first uses can't both grant the starting balance
+        opened = (await db.execute(
+            update(Player)
+            .where(Player.discord_id.in_(discord_ids), Player.ledger_opened_at.is_(None))
+            .values(balance=Player.balance + self.starting_balance, ledger_opened_at=now)
+            .returning(Player.id, Player.balance)
+        )).all()
+        if opened:
+            await db.execute(insert(LedgerEntry), [
+                {'player_id': player_id, 'amount': balance, 'reason': 'opening', 'created_at': now}
+                for player_id, balance in opened
+            ])
+        rows = await db.execute(select(Player.discord_id, Player.id, Player.balance).where(Player.discord_id.in_(discord_ids)))
+        return {discord_id: (player_id, balance) for discord_id, player_id, balance in rows}
+
+    async def _post(self, db, entries):
+        """Appends entries ({player_id, amount, reason, ...}) and moves the running balances to match."""
+        now = datetime.utcnow()
+        await db.execute(insert(LedgerEntry), [dict(entry, created_at=now) for entry in entries])
+        totals = {}
+        for entry in entries:
+            totals[entry['player_id']] = totals.get(entry['player_id'], 0.0) + entry['amount']
+        await db.execute(
+            update(players_table)
+            .where(players_table.c.id == bindparam('player'))
+            .values(balance=players_table.c.balance + bindparam('delta')),
+            [{'player': player_id, 'delta': delta} for player_id, delta in totals.items()],
+        )
+
+    # --- API ---
+
+    async def get_balance(self, discord_id):
+        cached = self._cached(discord_id)
+        if cached is not None:
+            self.stats['cache_hits'] += 1
+            return cached
+        self.stats['cache_misses'] += 1
+        async with db_session() as db:
+            accounts = await self._accounts(db, [discord_id])
+            await db.commit()
+        balance = accounts[discord_id][1]
+        self._cache(discord_id, balance)
+        return balance
+
+    async def grant(self, discord_id, amount, reason="grant"):
+        """Adds (or with a negative amount, removes) tokens outside of betting."""
+        async with db_session() as db:
+            player_id, _ = (await self._accounts(db, [discord_id]))[discord_id]
+            await self._post(db, [{'player_id': player_id, 'amount': amount, 'reason': reason}])
+            await db.commit()
+        self._invalidate([discord_id])
+
+    async def place_bet(self, market_id, discord_id, team, amount):
+        """Debits the stake and records the bet. Returns (placed, balance)."""
+        async with db_session() as db:
+            player_id, balance = (await self._accounts(db, [discord_id]))[discord_id]
+            debited = (await db.execute(
+                update(Player)
+                .where(Player.id == player_id, Player.balance >= amount)
+                .values(balance=Player.balance - amount)
+                .returning(Player.balance)
+            )).first()
+            if not debited:
+                await db.commit() # Keep the account if it was just opened
+                self.stats['rejected_bets'] += 1
+                return False, balance
+
+            now = datetime.utcnow()
+            bet_id = (await db.execute(
+                insert(Bet).values(market_id=market_id, player_id=player_id, team=team, amount=amount, created_at=now).returning(Bet.id)
+            )).scalar_one()
+            await db.execute(insert(LedgerEntry).values(
+                player_id=player_id, amount=-amount, reason='bet', bet_id=bet_id, market_id=market_id, created_at=now
+            ))
+            await db.commit()
+        self._invalidate([discord_id])
+        self.stats['bets'] += 1
+        return True, debited[0]
+
+    async def _close_market(self, market_id, payout_for, reason):
+        """
+        Pays out every open bet of a market in one transaction.
+        payout_for(bet, pools) -> tokens, pools being {team: total staked} over those bets.
+        """
+        async with db_session() as db:
+            bets = (await db.execute(
+                select(Bet.id, Bet.player_id, Bet.amount, Bet.team, Player.discord_id)
+                .join(Player, Player.id == Bet.player_id)
+                .where(Bet.market_id == market_id, Bet.settled_at.is_(None))
+            )).all()
+            if not bets:
+                return []
+
+            pools = {}
+            for bet in bets:
+                pools[bet.team] = pools.get(bet.team, 0.0) + bet.amount
+            payouts = [(bet, payout_for(bet, pools)) for bet in bets]
+            entries = [
+                {'player_id': bet.player_id, 'amount': payout, 'reason': reason, 'bet_id': bet.id, 'market_id': market_id}
+                for bet, payout in payouts if payout > 0
+            ]
+            if entries:
+                await self._post(db, entries)
+            now = datetime.utcnow()
+            await db.execute(
+                update(bets_table).where(bets_table.c.id == bindparam('bet')).values(payout=bindparam('payout'), settled_at=now),
+                [{'bet': bet.id, 'payout': payout} for bet, payout in payouts],
+            )
+            await db.commit()
+
+        self._invalidate({bet.discord_id for bet in bets})
+        return payouts
+
+    async def settle(self, market_id, winning_team):
+        """
+        Pays winners stake * odds, the odds being the whole pot over the winning
+        side's pot - both summed from the bets recorded for the market, in the
+        same transaction. Returns one dict per winning player:
+        {'user_id' (discord id), 'winnings', 'profit'}.
+        """
+        def payout_for(bet, pools):
+            if bet.team != winning_team:
+                return 0.0
+            return bet.amount * sum(pools.values()) / pools[winning_team]
+
+        payouts = await self._close_market(market_id, payout_for, "payout")
+        winners = {}
+        for bet, payout in payouts:
+            if payout <= 0:
+                continue
+            winner = winners.setdefault(bet.discord_id, {'user_id': bet.discord_id, 'winnings': 0.0, 'profit': 0.0})
+            winner['winnings'] += payout
+            winner['profit'] += payout - bet.amount
+        if payouts:
+            self.stats['settled_markets'] += 1
+            self.stats['settled_bets'] += len(payouts)
+        return list(winners.values())
+
+    async def refund(self, market_id):
+        """Returns every open stake of a market (the match never finished). Number of bets refunded."""
+        payouts = await self._close_market(market_id, lambda bet, pools: bet.amount, "refund")
+        self.stats['refunded_bets'] += len(payouts)
+        return len(payouts)
+
+    async def refund_stale(self, max_age=None):
+        """Refunds markets with bets left open longer than max_age seconds (a restart mid-match)."""
+        max_age = max_age if max_age is not None else settings.BET_REFUND_AFTER
+        cutoff = datetime.utcnow() - timedelta(seconds=max_age)
+        async with db_session() as db:
+            markets = (await db.execute(
+                select(Bet.market_id).where(Bet.settled_at.is_(None), Bet.market_id.is_not(None), Bet.created_at < cutoff).distinct()
+            )).scalars().all()
+        refunded = 0
+        for market_id in markets:
+            refunded += await self.refund(market_id)
+        return refunded
+
+    def get_stats(self):
+        return dict(self.stats, cached=len(self._balances))
+
+ledger = Ledger()
@@ -0,0 +1,82 @@
+from datetime import datetime
+from sqlalchemy import inspect, text
+
+def add_columns(table, columns):
+    """Migration step adding the (name, DDL) columns that aren't there yet."""
+    def step(conn):
+        existing = {column['name'] for column in inspect(conn).get_columns(table)}
+        for name, ddl in columns:
+            if name not in existing:
+                conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} {ddl}"))
+    return step
+
+# Schema changes create_all can't make on an existing database (it only adds
+# missing tables). Each runs once, in order, in its own transaction, and is
+# recorded in schema_migrations. Steps are SQL strings or callables taking
+# the connection, and must also be safe on a fresh database where create_all
+# already built the latest models.
+# Append new migrations at the end; never edit or renumber applied ones.
+MIGRATIONS = [
+    (1, "game indexes", [
+        "CREATE INDEX IF NOT EXISTS ix_bets_match_id ON bets (match_id)",
+        "CREATE INDEX IF NOT EXISTS ix_matches_tournament_round ON matches (tournament_id, round_number)",
+        "CREATE INDEX IF NOT EXISTS ix_players_wins ON players (wins)",
+    ]),
+    (2, "betting ledger", [
+        add_columns("players", [("ledger_opened_at", "TIMESTAMP")]),
+        add_columns("bets", [
+            ("market_id", "VARCHAR"),
+            ("team", "VARCHAR"),
+            ("payout", "FLOAT"),
+            ("settled_at", "TIMESTAMP"),
+            ("created_at", "TIMESTAMP"),
+        ]),
+        "CREATE INDEX IF NOT EXISTS ix_bets_market_id ON bets (market_id)",
+    ]),
+]
+
+def applied_versions(conn):
+    conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_migrations ("
+        "version INTEGER PRIMARY KEY, name VARCHAR NOT NULL, applied_at TIMESTAMP NOT NULL)"
+    ))
+    return {row[0] for row in conn.execute(text("SELECT version FROM schema_migrations"))}
+
+def lock_migrations(conn):
+    """
+    Takes the database write lock for the rest of the transaction, so a bot
+    and a worker starting together can't both apply the same migration.
+    """
+    if conn.dialect.name == "postgresql":
+        conn.execute(text("LOCK TABLE schema_migrations IN EXCLUSIVE MODE"))
+    else:
+        # SQLite takes its write lock on a transaction's first write (this one changes nothing)
+        conn.execute(text("DELETE FROM schema_migrations WHERE version IS NULL"))
+
+def run_migrations(engine, migrations=None):
+    """Applies pending migrations. Returns the versions applied this time."""
+    migrations = migrations if migrations is not None else MIGRATIONS
+    with engine.begin() as conn:
+        done = applied_versions(conn)
+
+    applied = []
+    for version, name, statements in sorted(migrations, key=lambda m: m[0]):
+        if version in done:
+            continue
+        with engine.begin() as conn:
+            # Check again under the lock: another process may have applied it since the read above
+            lock_migrations(conn)
+            if version in applied_versions(conn):
+                continue
+            for statement in statements:
+                if callable(statement):
+                    statement(conn)
+                else:
+                    conn.execute(text(statement))
+            conn.execute(
+                text("INSERT INTO schema_migrations (version, name, applied_at) VALUES (:version, :name, :applied_at)"),
+                {'version': version, 'name': name, 'applied_at': datetime.utcnow()},
+            )
+        print(f"🗄️ Applied migration {version}: {name}")
+        applied.append(version)
+    return applied
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime
+from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime, Index
 from sqlalchemy.orm import declarative_base, relationship
 from datetime import datetime
 
@@ -9,10 +9,11 @@ class Player(Base):
     id = Column(Integer, primary_key=True)
     discord_id = Column(String, unique=True, nullable=False)
     wallet_address = Column(String, nullable=True)
-    balance = Column(Float, default=0.0)
-    wins = Column(Integer, default=0)
+    balance = Column(Float, default=0.0) # running total of the player's ledger entries
+    wins = Column(Integer, default=0, index=True) # leaderboard
     losses = Column(Integer, default=0)
     last_1v1_battle_at = Column(DateTime, nullable=True)
+    ledger_opened_at = Column(DateTime, nullable=True) # set when the starting balance is granted
     # Add other stats as needed
 
 class Tournament(Base):
@@ -34,6 +35,9 @@ class Match(Base):
     winner_id = Column(Integer, ForeignKey('players.id'), nullable=True)
     round_number = Column(Integer)
     
+    # A tournament's bracket is read round by round
+    __table_args__ = (Index('ix_matches_tournament_round', 'tournament_id', 'round_number'),)
+    
     tournament = relationship("Tournament", back_populates="matches")
     player1 = relationship("Player", foreign_keys=[player1_id])
     player2 = relationship("Player", foreign_keys=[player2_id])
@@ -42,17 +46,59 @@ class Match(Base):
 class Bet(Base):
     __tablename__ = 'bets'
     id = Column(Integer, primary_key=True)
-    match_id = Column(Integer, ForeignKey('matches.id'))
+    match_id = Column(Integer, ForeignKey('matches.id'), index=True) # settlement reads a whole market
     player_id = Column(Integer, ForeignKey('players.id')) # The user placing the bet
     amount = Column(Float, nullable=False)
     predicted_winner_id = Column(Integer, ForeignKey('players.id'))
+    # Battle bets are on a side ('A'/'B') of a betting market, not on a stored match
+    market_id = Column(String, index=True, nullable=True)
+    team = Column(String, nullable=True)
+    payout = Column(Float, nullable=True) # set at settlement (0 for a lost bet)
+    settled_at = Column(DateTime, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
     
     match = relationship("Match")
     player = relationship("Player", foreign_keys=[player_id])
 
+class LedgerEntry(Base):
+    """Append-only record of every balance change. Rows are never updated or deleted."""
+    __tablename__ = 'ledger_entries'
+    id = Column(Integer, primary_key=True)
+    player_id = Column(Integer, ForeignKey('players.id'), index=True, nullable=False)
+    amount = Column(Float, nullable=False) # signed
+    reason = Column(String, nullable=False) # opening, bet, payout, refund, grant
+    bet_id = Column(Integer, ForeignKey('bets.id'), nullable=True)
+    market_id = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
 class Tenant(Base):
     __tablename__ = 'tenants'
     id = Column(Integer, primary_key=True)
     guild_id = Column(String, unique=True, nullable=False)
     theme = Column(String, default="default")
     token_symbol = Column(String, default="SOL")
+
+class AvatarDescription(Base):
+    __tablename__ = 'avatar_descriptions'
+    id = Column(Integer, primary_key=True)
+    image_url = Column(String, unique=True, nullable=False)
+    content_hash = Column(String, index=True, nullable=True) # sha256 of the image bytes
+    description = Column(String, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    last_used_at = Column(DateTime, default=datetime.utcnow, index=True)
+    hits = Column(Integer, default=0)
+
+class Job(Base):
+    """Generation work handed to worker.py. Payload/result are JSON."""
+    __tablename__ = 'jobs'
+    id = Column(Integer, primary_key=True)
+    kind = Column(String, nullable=False) # image, vision
+    payload = Column(String, nullable=False)
+    status = Column(String, default="queued", index=True) # queued, running, done, failed, cancelled
+    result = Column(String, nullable=True)
+    error = Column(String, nullable=True)
+    attempts = Column(Integer, default=0)
+    worker = Column(String, nullable=True)
+    lease_until = Column(DateTime, nullable=True) # a running job whose lease ran out is picked up again
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+    updated_at = Column(DateTime, default=datetime.utcnow)
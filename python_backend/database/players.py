@@ -0,0 +1,66 @@
+from datetime import datetime, time
+from sqlalchemy import or_, update
+from .db_manager import db_session, dialect_insert
+from .models import Player
+
+class DailyBattleLimiter:
+    """
+    One 1v1 battle per player per UTC day (admins are exempted by the caller).
+
+    A claim is a single conditional upsert: insert the player, or stamp
+    last_1v1_battle_at only if it is NULL or before today. A row comes back
+    only when the stamp was written, so two racing claims can't both win.
+    Players who have had their battle today are remembered in memory until
+    midnight, so repeat attempts never reach the database. That memory is per
+    process: after an admin reset, every shard process has to forget() too.
+    """
+    def __init__(self):
+        self.day = None
+        self.used = set() # discord ids that have had today's battle
+        self.stats = {'allowed': 0, 'rejected_db': 0, 'rejected_cached': 0}
+
+    def _roll_day(self):
+        today = datetime.utcnow().date()
+        if today != self.day:
+            self.day = today
+            self.used.clear()
+        return today
+
+    async def claim(self, discord_id):
+        """Uses up today's battle for `discord_id`. False if it was already used."""
+        today = self._roll_day()
+        if discord_id in self.used:
+            self.stats['rejected_cached'] += 1
+            return False
+
+        now = datetime.utcnow()
+        stmt = dialect_insert(Player).values(discord_id=discord_id, last_1v1_battle_at=now)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[Player.discord_id],
+            set_={'last_1v1_battle_at': stmt.excluded.last_1v1_battle_at},
+            where=or_(Player.last_1v1_battle_at.is_(None), Player.last_1v1_battle_at < datetime.combine(today, time.min)),
+        ).returning(Player.id)
+        async with db_session() as db:
+            allowed = (await db.execute(stmt)).first() is not None
+            await db.commit()
+
+        # Either way they are done for today
+        self.used.add(discord_id)
+        self.stats['allowed' if allowed else 'rejected_db'] += 1
+        return allowed
+
+    async def reset(self):
+        """Clears every player's 1v1 timer (admin reset)."""
+        async with db_session() as db:
+            await db.execute(update(Player).values(last_1v1_battle_at=None))
+            await db.commit()
+        self.forget()
+
+    def forget(self):
+        """Drops the cached "already fought today" players (the database was reset elsewhere)."""
+        self.used.clear()
+
+    def get_stats(self):
+        return dict(self.stats, cached=len(self.used))
+
+daily_limiter = DailyBattleLimiter()
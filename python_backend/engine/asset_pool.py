@@ -0,0 +1,155 @@
+import asyncio
+import time
+from collections import deque
+from config import settings
+from integrations.image_payload import ImagePayload
+
+BEATS = ("meeting", "clash", "victory")
+
+class AssetPool:
+    """
+    Arena assets made ahead of time, while no battle is running:
+    establishing/backdrop images for the arena themes in use and generic
+    narration snippets with {a}/{b} placeholders. Battles take from the pool
+    (for their own theme) only when a live generation would blow its budget.
+    Each asset is used once; the worker tops the pool back up on the next
+    idle tick.
+
+    themes_getter() -> arena themes worth pooling for, most wanted first
+    is_idle() -> True when nothing else needs the providers
+    generate_backdrop(theme) -> ImagePayload or None
+    generate_script(theme) -> {beat: template} (possibly partial)
+    """
+    def __init__(self, themes_getter, is_idle, generate_backdrop, generate_script):
+        self.themes_getter = themes_getter
+        self.is_idle = is_idle
+        self.generate_backdrop = generate_backdrop
+        self.generate_script = generate_script
+        self.backdrops = {} # theme -> deque of image bytes
+        self.snippets = {} # theme -> {beat: deque of templates}
+        self._worker = None
+        self._filling = None # the fill currently running, cancelled when a battle starts
+        self._interrupted = False
+        self._turn = 0
+        self.stats = {'backdrops_made': 0, 'snippets_made': 0, 'backdrops_used': 0, 'snippets_used': 0, 'interrupted': 0}
+
+    def start(self):
+        if self._worker is None:
+            self._worker = asyncio.create_task(self._run())
+            print(f"🧺 Asset pool worker started (every {settings.ASSET_POOL_INTERVAL}s when idle).")
+
+    def stop(self):
+        if self._filling and not self._filling.done():
+            self._filling.cancel()
+        if self._worker:
+            self._worker.cancel()
+            self._worker = None
+
+    def yield_to_battle(self):
+        """A battle is starting - give the providers back right away."""
+        if self._filling and not self._filling.done():
+            self._interrupted = True
+            self._filling.cancel()
+            self.stats['interrupted'] += 1
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(settings.ASSET_POOL_INTERVAL)
+            if not self.is_idle():
+                continue
+            self._filling = asyncio.create_task(self.fill_once())
+            try:
+                await self._filling
+            except asyncio.CancelledError:
+                if not self._interrupted:
+                    raise # The worker itself is being stopped
+                self._interrupted = False
+                print("🧺 Asset pool fill interrupted by a battle.")
+            except Exception as e:
+                print(f"Asset pool fill failed: {e}")
+
+    def _prune(self, themes):
+        # Only themes still in use are worth keeping around
+        for pool in (self.backdrops, self.snippets):
+            for old_theme in [t for t in pool if t not in themes]:
+                del pool[old_theme]
+
+    def _snippet_count(self, theme):
+        beats = self.snippets.get(theme, {})
+        return min((len(beats.get(beat, ())) for beat in BEATS), default=0)
+
+    async def fill_once(self):
+        """
+        Makes one batch for the first theme that is short of something,
+        taking turns between snippets and backdrops.
+        """
+        themes = self.themes_getter()
+        self._prune(themes)
+
+        for theme in themes:
+            needs = []
+            if self._snippet_count(theme) < settings.ASSET_POOL_SNIPPETS:
+                needs.append(self._fill_snippets)
+            if len(self.backdrops.get(theme, ())) < settings.ASSET_POOL_IMAGES:
+                needs.append(self._fill_backdrop)
+            if needs:
+                self._turn += 1
+                await needs[self._turn % len(needs)](theme)
+                return
+
+    async def _fill_snippets(self, theme):
+        script = await self.generate_script(theme) or {}
+        beats = self.snippets.setdefault(theme, {beat: deque(maxlen=settings.ASSET_POOL_SNIPPETS) for beat in BEATS})
+        for beat, template in script.items():
+            if beat in beats and _valid_template(template):
+                beats[beat].append(template)
+                self.stats['snippets_made'] += 1
+
+    async def _fill_backdrop(self, theme):
+        backdrops = self.backdrops.setdefault(theme, deque(maxlen=settings.ASSET_POOL_IMAGES))
+        if len(backdrops) < settings.ASSET_POOL_IMAGES:
+            started = time.monotonic()
+            payload = await self.generate_backdrop(theme)
+            if payload:
+                backdrops.append(payload.getvalue())
+                payload.close()
+                self.stats['backdrops_made'] += 1
+                print(f"🧺 Pooled a '{theme}' backdrop in {time.monotonic() - started:.1f}s ({len(backdrops)}/{settings.ASSET_POOL_IMAGES}).")
+
+    def has_backdrop(self, theme):
+        return bool(self.backdrops.get(theme))
+
+    def take_backdrop(self, theme):
+        """A pooled backdrop for `theme` as a fresh ImagePayload, or None if there is none."""
+        backdrops = self.backdrops.get(theme)
+        if not backdrops:
+            return None
+        self.stats['backdrops_used'] += 1
+        print("🧺 Using a pooled backdrop.")
+        return ImagePayload.from_bytes(backdrops.popleft())
+
+    def take_snippet(self, beat, a, b, theme):
+        """A pooled narration line for `beat` in `theme` with the fighter names filled in, or None."""
+        templates = self.snippets.get(theme, {}).get(beat)
+        if not templates:
+            return None
+        self.stats['snippets_used'] += 1
+        return templates.popleft().format(a=a, b=b)
+
+    def get_stats(self):
+        return {
+            **self.stats,
+            'themes': len(self.backdrops.keys() | self.snippets.keys()),
+            'backdrops': sum(len(backdrops) for backdrops in self.backdrops.values()),
+            'snippets': sum(self._snippet_count(theme) for theme in self.snippets),
+        }
+
+def _valid_template(template):
+    """Needs the {a} placeholder and must format cleanly (no stray braces)."""
+    if not isinstance(template, str) or "{a}" not in template:
+        return False
+    try:
+        template.format(a="", b="")
+    except (KeyError, IndexError, ValueError):
+        return False
+    return True
@@ -0,0 +1,70 @@
+import asyncio
+import inspect
+import time
+from collections import Counter
+
+# Overruns per stage since startup, for /admin_health
+stage_overruns = Counter()
+
+class Deadline:
+    """
+    Time budget for one battle.
+    Each stage takes a slice of whatever is left (slice/run), and anything
+    that runs past its slice is recorded as an overrun so we can see which
+    stage keeps eating the budget.
+    """
+    def __init__(self, budget, label=""):
+        self.budget = budget
+        self.label = label
+        self.started_at = time.monotonic()
+        self.expires_at = self.started_at + budget
+        self.stages = {} # stage -> (allotted, elapsed)
+        self.overruns = [] # (stage, allotted, elapsed)
+
+    def elapsed(self):
+        return time.monotonic() - self.started_at
+
+    def remaining(self):
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self):
+        return self.remaining() <= 0
+
+    def slice(self, fraction=1.0, cap=None):
+        """Seconds a stage may spend: `fraction` of the remaining budget, at most `cap`."""
+        allotted = self.remaining() * fraction
+        return min(allotted, cap) if cap is not None else allotted
+
+    def record(self, stage, allotted, elapsed):
+        self.stages[stage] = (allotted, elapsed)
+        if allotted is not None and elapsed > allotted:
+            self.overruns.append((stage, allotted, elapsed))
+            stage_overruns[stage] += 1
+            print(f"⏱️ {stage} overran its budget: {elapsed:.1f}s of {allotted:.1f}s")
+
+    async def run(self, stage, awaitable, fraction=1.0, cap=None, fallback=None):
+        """
+        Awaits `awaitable` within its slice. On timeout it is cancelled and the
+        fallback is returned instead (a value, or a callable returning one).
+        """
+        allotted = self.slice(fraction, cap)
+        started = time.monotonic()
+        try:
+            if allotted <= 0:
+                raise asyncio.TimeoutError()
+            return await asyncio.wait_for(awaitable, timeout=allotted)
+        except asyncio.TimeoutError:
+            if inspect.iscoroutine(awaitable):
+                awaitable.close() # Never started - avoid the "never awaited" warning
+            elif isinstance(awaitable, asyncio.Future):
+                awaitable.cancel()
+            print(f"⏱️ {stage} hit the battle deadline, degrading.")
+            result = fallback() if callable(fallback) else fallback
+            return await result if inspect.isawaitable(result) else result
+        finally:
+            # A timed-out stage always lands a hair past its slice
+            self.record(stage, allotted, time.monotonic() - started)
+
+    def summary(self):
+        stages = ", ".join(f"{stage} {elapsed:.1f}s" for stage, (_, elapsed) in self.stages.items())
+        return f"{self.label or 'battle'}: {self.elapsed():.1f}s of {self.budget:.0f}s budget ({stages}), {len(self.overruns)} overruns"
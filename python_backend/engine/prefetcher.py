@@ -0,0 +1,55 @@
+from collections import Counter
+from config import settings
+
+# Totals across every session's prefetcher, for /admin_health
+prefetch_stats = Counter()
+
+class MatchPrefetcher:
+    """
+    Starts generating upcoming pairings before their round begins.
+    Winners are settled when a production is created, so the next round's
+    pairings are known as soon as the current round is. The first
+    PREFETCH_MATCHES of them are queued behind the current round; when that
+    round starts, claim() hands over every prefetch that still fits its
+    pairing and cancels the rest (a match failed and a different fighter
+    advanced, the arena changed, ...).
+
+    make(player_a, player_b) -> production
+    start(production) -> queues it for a match slot
+    """
+    def __init__(self, make, start, depth=None):
+        self.make = make
+        self.start = start
+        self.depth = depth if depth is not None else settings.PREFETCH_MATCHES
+        self.pending = []
+
+    def prefetch(self, pairings):
+        for player_a, player_b in pairings[:self.depth]:
+            if any(p.matches(player_a, player_b) for p in self.pending):
+                continue
+            production = self.make(player_a, player_b)
+            self.start(production)
+            self.pending.append(production)
+            prefetch_stats['prefetched'] += 1
+
+    def claim(self, pairings):
+        """Productions for `pairings` in order: prefetched where still valid, new otherwise."""
+        productions = []
+        for player_a, player_b in pairings:
+            production = next((p for p in self.pending if p.matches(player_a, player_b)), None)
+            if production:
+                self.pending.remove(production)
+                prefetch_stats['used'] += 1
+            else:
+                production = self.make(player_a, player_b)
+            productions.append(production)
+        self.cancel_all()
+        return productions
+
+    def cancel_all(self):
+        """Drops every prefetch nobody claimed."""
+        for production in self.pending:
+            print(f"🔮 Dropping prefetched match {production.label}.")
+            production.release()
+            prefetch_stats['dropped'] += 1
+        self.pending = []
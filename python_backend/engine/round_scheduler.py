@@ -0,0 +1,70 @@
+import asyncio
+from config import settings
+
+class RoundScheduler:
+    """
+    Generates every match of a round at once and reveals them one at a time
+    in bracket order. While match 1 is on screen, the rest of the round is
+    already being made, so a round costs about one generation plus the
+    reveals instead of one generation per match.
+
+    Productions from every tournament (and single /battle matches) share
+    MATCH_CONCURRENCY slots so several busy channels can't flood the
+    providers. A production needs:
+      run()     - coroutine that generates everything, awaited under a slot
+      release() - cancels what is still generating and frees its images
+    """
+    def __init__(self, concurrency):
+        self.concurrency = max(1, concurrency)
+        self.slots = asyncio.Semaphore(self.concurrency)
+        self.active = 0
+        self.waiting = 0
+        self.stats = {'rounds': 0, 'matches': 0, 'failed': 0}
+
+    async def _produce(self, production):
+        self.waiting += 1
+        try:
+            await self.slots.acquire()
+        finally:
+            self.waiting -= 1
+        self.active += 1
+        try:
+            await production.run()
+        except Exception:
+            # The reveal gets the error from the production itself
+            self.stats['failed'] += 1
+        finally:
+            self.active -= 1
+            self.slots.release()
+
+    def start(self, production):
+        """Queues a production for a match slot (once) and returns its task."""
+        if production.task is None:
+            production.task = asyncio.create_task(self._produce(production))
+        return production.task
+
+    async def run_round(self, productions, reveal):
+        """
+        Starts all productions (prefetched ones are already running), then awaits
+        reveal(production) for each in order. Returns the reveal results in order.
+        """
+        self.stats['rounds'] += 1
+        tasks = [self.start(p) for p in productions]
+        results = []
+        try:
+            for production in productions:
+                results.append(await reveal(production))
+                self.stats['matches'] += 1
+        finally:
+            # Anything not revealed yet (the round was cancelled or a reveal blew up)
+            for production, task in zip(productions, tasks):
+                if not task.done():
+                    task.cancel()
+                production.release()
+        return results
+
+    def get_stats(self):
+        return {**self.stats, 'active': self.active, 'waiting': self.waiting, 'slots': self.concurrency}
+
+# Shared across all channels and tournaments
+round_scheduler = RoundScheduler(settings.MATCH_CONCURRENCY)
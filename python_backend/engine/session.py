@@ -0,0 +1,94 @@
+import time
+from config import settings
+
+class BattleSession:
+    """
+    Tournament state for one channel (or one guild, with SESSION_SCOPE=guild):
+    the registration queue, mode/arena/style picked by the host, team rosters,
+    the match currently open for betting and the look-ahead prefetcher.
+    """
+    def __init__(self, key):
+        self.key = key
+        self.prefetcher = None # Attached by the Battle cog
+        self.last_active = time.monotonic()
+        self.reset()
+
+    def reset(self):
+        if self.prefetcher:
+            self.prefetcher.cancel_all()
+        self.queue = []
+        self.tournament_active = False
+        self.current_match_id = None
+        self.tournament_mode = None # 'ROYALE' or 'GANG'
+        self.arena_theme = None
+        self.narration_style = None
+        self.team_names = {'A': 'Team A', 'B': 'Team B'}
+        self.team_rosters = {'A': [], 'B': []}
+        self.debug_mode = False # Flag for debug tournament
+
+    def touch(self):
+        self.last_active = time.monotonic()
+
+    def is_idle(self):
+        return not self.queue and not self.tournament_active
+
+class SessionManager:
+    """
+    One BattleSession per guild/channel, so tournaments in different places
+    don't share a queue or a betting market. Sessions are made on first use
+    and dropped once they are idle again.
+
+    on_create(session) is called for every new session (the cog uses it to
+    give each one its own prefetcher).
+    """
+    def __init__(self, on_create=None, scope=None):
+        self.on_create = on_create
+        self.scope = scope or settings.SESSION_SCOPE
+        self.sessions = {}
+        self.latest = None
+
+    def key_for(self, source):
+        """Session key for a Context, Interaction or channel."""
+        channel = getattr(source, 'channel', source)
+        guild = getattr(channel, 'guild', None)
+        guild_id = guild.id if guild else None
+        if self.scope == "guild" and guild_id is not None:
+            return (guild_id, None)
+        return (guild_id, getattr(channel, 'id', None))
+
+    def get(self, source):
+        key = self.key_for(source)
+        session = self.sessions.get(key)
+        if session is None:
+            session = self.sessions[key] = BattleSession(key)
+            if self.on_create:
+                self.on_create(session)
+        session.touch()
+        self.latest = session
+        return session
+
+    def peek(self, source):
+        """The existing session for `source`, or None (never creates one)."""
+        return self.sessions.get(self.key_for(source))
+
+    def release(self, session):
+        """Resets a session and forgets it."""
+        session.reset()
+        if self.sessions.get(session.key) is session:
+            del self.sessions[session.key]
+        if self.latest is session:
+            self.latest = None
+
+    def for_guild(self, guild_id):
+        return [s for key, s in self.sessions.items() if key[0] == guild_id]
+
+    def active(self):
+        return [s for s in self.sessions.values() if s.tournament_active]
+
+    def get_stats(self):
+        return {
+            'sessions': len(self.sessions),
+            'tournaments': len(self.active()),
+            'registering': len([s for s in self.sessions.values() if s.queue and not s.tournament_active]),
+            'prefetching': sum(len(s.prefetcher.pending) for s in self.sessions.values() if s.prefetcher),
+        }
@@ -0,0 +1,246 @@
+import asyncio
+import os
+import re
+import time
+from collections import deque
+import aiohttp
+from aiohttp import web
+from config import settings
+from integrations.http_client import http_client
+from integrations.rate_limiter import RateLimiterRegistry
+
+# Correlation ids minted by shard process N look like "p<N>-<uuid>", so the
+# coordinator can route a Supermachine webhook without keeping a registry
+CORRELATION_PREFIX = re.compile(r"^p(\d+)-")
+
+# How long an event poll waits at the coordinator before coming back empty
+EVENT_WAIT = 25
+
+def correlation_prefix():
+    """Prefix for Supermachine correlation ids in this process ("" when not under the launcher)."""
+    return f"p{settings.PROCESS_INDEX}-" if settings.COORDINATOR_URL else ""
+
+def shard_metrics(bot):
+    """Latency and guild count per shard run by this process."""
+    guilds = {}
+    for guild in bot.guilds:
+        guilds[guild.shard_id] = guilds.get(guild.shard_id, 0) + 1
+
+    shards = getattr(bot, 'shards', None)
+    if shards:
+        rows = [
+            {'id': shard_id, 'latency': info.latency, 'guilds': guilds.get(shard_id, 0), 'closed': info.is_closed()}
+            for shard_id, info in sorted(shards.items())
+        ]
+    else:
+        rows = [{'id': bot.shard_id or 0, 'latency': bot.latency, 'guilds': len(bot.guilds), 'closed': bot.is_closed()}]
+
+    # Latency is inf/nan until the first heartbeat ack
+    for row in rows:
+        if row['latency'] != row['latency'] or row['latency'] == float('inf'):
+            row['latency'] = None
+    return {'process': settings.PROCESS_INDEX, 'pid': os.getpid(), 'shard_count': bot.shard_count or 1, 'shards': rows}
+
+class ClusterClient:
+    """
+    A shard process's line to the coordinator: periodic metric reports, the
+    cluster view, and events every process has to act on (publish() here,
+    handlers registered with subscribe() run in every process).
+    """
+    def __init__(self, url=None):
+        self.url = (url if url is not None else settings.COORDINATOR_URL).rstrip("/")
+        self.handlers = {} # event kind -> [handler(event)]
+        self._tasks = []
+
+    def enabled(self):
+        return bool(self.url)
+
+    def subscribe(self, kind, handler):
+        self.handlers.setdefault(kind, []).append(handler)
+
+    def start(self, bot):
+        if self.enabled() and not self._tasks:
+            self._tasks = [asyncio.create_task(self._report_loop(bot)), asyncio.create_task(self._event_loop())]
+
+    def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+
+    async def publish(self, kind, **data):
+        """Sends an event to every shard process (this one included). False if the coordinator can't be reached."""
+        try:
+            timeout = aiohttp.ClientTimeout(total=5)
+            async with http_client.get_session().post(f"{self.url}/events", json=dict(data, kind=kind), timeout=timeout) as response:
+                response.raise_for_status()
+                return True
+        except Exception as e:
+            print(f"Couldn't publish {kind} to the coordinator: {e}")
+            return False
+
+    async def _event_loop(self):
+        after = None # Only events published from now on
+        while True:
+            try:
+                timeout = aiohttp.ClientTimeout(total=EVENT_WAIT + 10)
+                params = {} if after is None else {'after': after}
+                async with http_client.get_session().get(f"{self.url}/events", params=params, timeout=timeout) as response:
+                    response.raise_for_status()
+                    data = await response.json()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Coordinator event poll failed: {e}")
+                await asyncio.sleep(5)
+                continue
+            for event in data['events']:
+                for handler in self.handlers.get(event.get('kind'), ()):
+                    try:
+                        handler(event)
+                    except Exception as e:
+                        print(f"Cluster event handler for {event.get('kind')} failed: {e}")
+            # A restarted coordinator counts from 0 again
+            after = data['seq']
+
+    async def _report_loop(self, bot):
+        while True:
+            await asyncio.sleep(settings.SHARD_REPORT_INTERVAL)
+            if not bot.is_ready():
+                continue
+            try:
+                async with http_client.get_session().post(f"{self.url}/shards", json=shard_metrics(bot)) as response:
+                    response.raise_for_status()
+            except Exception as e:
+                print(f"Shard report to coordinator failed: {e}")
+
+    async def cluster_view(self):
+        """Latest report from every process, or None if the coordinator can't be reached."""
+        try:
+            timeout = aiohttp.ClientTimeout(total=5)
+            async with http_client.get_session().get(f"{self.url}/shards", timeout=timeout) as response:
+                response.raise_for_status()
+                return await response.json()
+        except Exception as e:
+            print(f"Coordinator unreachable: {e}")
+            return None
+
+class Coordinator:
+    """
+    Runs in launcher.py next to the shard processes. Two servers:
+      public  (WEBHOOK_PORT)      - Supermachine webhooks, forwarded to the process
+                                    that owns the correlation id
+      private (COORDINATOR_PORT)  - provider rate limits shared by every process,
+                                    the shard metric reports behind /admin_shards,
+                                    and events for every process (long-polled)
+    """
+    def __init__(self, processes):
+        self.processes = processes
+        self.rate_limits = RateLimiterRegistry()
+        self.reports = {} # process index -> last report
+        self.events = deque(maxlen=100) # recent events, each with its 'seq'
+        self.event_seq = 0
+        self._new_event = asyncio.Condition()
+        self.stats = {'webhooks_routed': 0, 'webhooks_unroutable': 0, 'rate_limit_requests': 0, 'events': 0}
+        self._runners = []
+
+    def _process_url(self, index):
+        return f"http://127.0.0.1:{settings.SHARD_WEBHOOK_BASE_PORT + index}"
+
+    async def handle_webhook(self, request):
+        correlation_id = request.match_info.get('id')
+        match = CORRELATION_PREFIX.match(correlation_id)
+        if not match or int(match.group(1)) >= self.processes:
+            print(f"❌ Webhook for unknown process: {correlation_id}")
+            self.stats['webhooks_unroutable'] += 1
+            return web.Response(status=404)
+
+        target = f"{self._process_url(int(match.group(1)))}/webhook/supermachine/{correlation_id}"
+        try:
+            body = await request.read()
+            async with http_client.get_session().post(target, data=body, headers={"Content-Type": "application/json"}) as response:
+                self.stats['webhooks_routed'] += 1
+                return web.Response(status=response.status, text=await response.text())
+        except Exception as e:
+            print(f"❌ Webhook forward to {target} failed: {e}")
+            return web.Response(status=502)
+
+    async def handle_ping(self, request):
+        return web.Response(text="Pong! Coordinator is active.")
+
+    async def handle_acquire(self, request):
+        self.stats['rate_limit_requests'] += 1
+        waited = await self.rate_limits.acquire(request.match_info['host'])
+        return web.json_response({'waited': waited})
+
+    async def handle_penalize(self, request):
+        data = await request.json()
+        self.rate_limits.penalize(request.match_info['host'], data.get('retry_after'))
+        return web.json_response({'ok': True})
+
+    async def handle_report(self, request):
+        report = await request.json()
+        report['received_at'] = time.time()
+        self.reports[report.get('process', 0)] = report
+        return web.json_response({'ok': True})
+
+    async def handle_publish(self, request):
+        event = await request.json()
+        self.event_seq += 1
+        event['seq'] = self.event_seq
+        self.events.append(event)
+        self.stats['events'] += 1
+        async with self._new_event:
+            self._new_event.notify_all()
+        return web.json_response({'seq': self.event_seq})
+
+    async def handle_events(self, request):
+        """Events after ?after=<seq>, waiting up to EVENT_WAIT seconds for one. No ?after: just the current seq."""
+        after = request.query.get('after')
+        if after is not None:
+            after = int(after)
+            if after > self.event_seq:
+                after = 0 # The process was talking to an earlier coordinator
+            try:
+                async with self._new_event:
+                    await asyncio.wait_for(self._new_event.wait_for(lambda: self.event_seq > after), EVENT_WAIT)
+            except asyncio.TimeoutError:
+                pass
+        events = [e for e in self.events if after is not None and e['seq'] > after]
+        return web.json_response({'events': events, 'seq': self.event_seq})
+
+    async def handle_view(self, request):
+        return web.json_response({
+            'processes': self.processes,
+            'reports': [self.reports[i] for i in sorted(self.reports)],
+            'rate_limits': self.rate_limits.get_stats(),
+            'stats': self.stats,
+            'now': time.time(),
+        })
+
+    async def _serve(self, app, host, port):
+        runner = web.AppRunner(app)
+        await runner.setup()
+        await web.TCPSite(runner, host, port).start()
+        self._runners.append(runner)
+
+    async def start(self):
+        public = web.Application()
+        public.router.add_post('/webhook/supermachine/{id}', self.handle_webhook)
+        public.router.add_get('/ping', self.handle_ping)
+        public.router.add_get('/', self.handle_ping)
+        await self._serve(public, '0.0.0.0', settings.WEBHOOK_PORT)
+
+        private = web.Application()
+        private.router.add_post('/ratelimit/{host}/acquire', self.handle_acquire)
+        private.router.add_post('/ratelimit/{host}/penalize', self.handle_penalize)
+        private.router.add_post('/shards', self.handle_report)
+        private.router.add_get('/shards', self.handle_view)
+        private.router.add_post('/events', self.handle_publish)
+        private.router.add_get('/events', self.handle_events)
+        await self._serve(private, '127.0.0.1', settings.COORDINATOR_PORT)
+        print(f"🛰️ Coordinator up: webhooks on {settings.WEBHOOK_PORT}, internal API on 127.0.0.1:{settings.COORDINATOR_PORT}")
+
+    async def stop(self):
+        for runner in self._runners:
+            await runner.cleanup()
+        self._runners = []
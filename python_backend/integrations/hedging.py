@@ -0,0 +1,95 @@
+import asyncio
+import time
+from config import settings
+from integrations.provider_router import provider_router
+
+def hedge_delay(provider, router=None):
+    """
+    How long to give a provider before firing a backup request.
+    Uses the provider's observed latency percentile so the hedge only fires
+    on its slow tail, not on every call.
+    """
+    router = router or provider_router
+    observed = router.percentile(provider, settings.HEDGE_PERCENTILE, min_samples=settings.HEDGE_MIN_SAMPLES)
+    delay = observed if observed is not None else settings.HEDGE_DEFAULT_DELAY
+    return min(settings.HEDGE_MAX_DELAY, max(settings.HEDGE_MIN_DELAY, delay))
+
+async def hedged_race(attempts, hedge=True, router=None, is_usable=None, gate=True):
+    """
+    Runs provider attempts in order and returns the first usable result.
+
+    attempts: list of (provider_name, coroutine_factory).
+    With hedge=True, if the newest attempt is still running after its
+    hedge_delay() the next provider is fired alongside it. With hedge=False
+    the next provider only starts once the previous one failed.
+    Any attempts still running when a winner arrives are cancelled.
+    With gate=True an attempt claims its provider's breaker as it starts
+    (router.acquire) and is skipped if the breaker refuses.
+    Every finished attempt is reported to the router (latency + breaker);
+    cancelled ones as censored samples (they ran at least that long).
+    """
+    router = router or provider_router
+    is_usable = is_usable or (lambda result: result is not None)
+    pending = {} # task -> (provider_name, started_at)
+    next_index = 0
+
+    def launch():
+        """Starts the next attempt whose breaker lets it through. Its provider name, or None if none did."""
+        nonlocal next_index
+        while next_index < len(attempts):
+            name, factory = attempts[next_index]
+            next_index += 1
+            if gate and not router.acquire(name):
+                print(f"Provider {name} circuit is open. Skipping.")
+                continue
+            task = asyncio.create_task(factory())
+            pending[task] = (name, time.monotonic())
+            return name
+        return None
+
+    if not attempts:
+        return None
+
+    launch()
+    try:
+        while pending:
+            timeout = None
+            if hedge and next_index < len(attempts):
+                newest_name, newest_started = max(pending.values(), key=lambda v: v[1])
+                timeout = max(0.0, hedge_delay(newest_name, router) - (time.monotonic() - newest_started))
+
+            done, _ = await asyncio.wait(pending.keys(), timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+
+            if not done:
+                backup = launch()
+                if backup:
+                    print(f"⏳ Hedge: {newest_name} is slower than usual, firing backup request at {backup}")
+                continue
+
+            failed = False
+            for task in done:
+                name, started = pending.pop(task)
+                latency = time.monotonic() - started
+                try:
+                    result = task.result()
+                except Exception as e:
+                    print(f"Provider {name} raised: {e}")
+                    result = None
+
+                ok = is_usable(result)
+                router.record(name, latency, ok)
+                if ok:
+                    print(f"🏁 {name} delivered in {latency:.1f}s")
+                    return result
+                print(f"Provider {name} failed after {latency:.1f}s")
+                failed = True
+
+            # A failure frees the slot - go straight to the next provider
+            if failed and next_index < len(attempts):
+                launch()
+
+        return None
+    finally:
+        for task, (name, started) in pending.items():
+            task.cancel()
+            router.record_censored(name, time.monotonic() - started)
@@ -0,0 +1,94 @@
+import aiohttp
+from config import settings
+
+class HttpClientManager:
+    """
+    Bot-lifetime HTTP client shared by every provider integration.
+    A single connector keeps a keep-alive pool per host, so repeat calls to
+    NVIDIA / Pollinations / Supermachine skip the DNS lookup and TLS handshake.
+    """
+    def __init__(self):
+        self._session = None
+        self.counters = {
+            'requests': 0,
+            'connections_created': 0,
+            'connections_reused': 0,
+            'dns_lookups': 0,
+            'dns_cache_hits': 0,
+        }
+        self.per_host = {} # host -> {requests, created, reused}
+
+    def _host_stats(self, host):
+        if host not in self.per_host:
+            self.per_host[host] = {'requests': 0, 'created': 0, 'reused': 0}
+        return self.per_host[host]
+
+    def _build_trace_config(self):
+        trace = aiohttp.TraceConfig()
+
+        async def on_request_start(session, ctx, params):
+            # ctx is shared by every callback of the same request
+            ctx.host = params.url.host
+            self.counters['requests'] += 1
+            self._host_stats(ctx.host)['requests'] += 1
+
+        async def on_connection_create_end(session, ctx, params):
+            self.counters['connections_created'] += 1
+            self._host_stats(getattr(ctx, 'host', None))['created'] += 1
+
+        async def on_connection_reuseconn(session, ctx, params):
+            self.counters['connections_reused'] += 1
+            self._host_stats(getattr(ctx, 'host', None))['reused'] += 1
+
+        async def on_dns_resolvehost_end(session, ctx, params):
+            self.counters['dns_lookups'] += 1
+
+        async def on_dns_cache_hit(session, ctx, params):
+            self.counters['dns_cache_hits'] += 1
+
+        trace.on_request_start.append(on_request_start)
+        trace.on_connection_create_end.append(on_connection_create_end)
+        trace.on_connection_reuseconn.append(on_connection_reuseconn)
+        trace.on_dns_resolvehost_end.append(on_dns_resolvehost_end)
+        trace.on_dns_cache_hit.append(on_dns_cache_hit)
+        return trace
+
+    def get_session(self):
+        """Returns the shared session, creating it lazily on the running loop."""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=settings.HTTP_POOL_LIMIT,
+                limit_per_host=settings.HTTP_POOL_LIMIT_PER_HOST,
+                keepalive_timeout=settings.HTTP_KEEPALIVE_TIMEOUT,
+                ttl_dns_cache=settings.HTTP_DNS_CACHE_TTL,
+            )
+            timeout = aiohttp.ClientTimeout(
+                total=settings.HTTP_TIMEOUT,
+                connect=settings.HTTP_CONNECT_TIMEOUT,
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=timeout,
+                trace_configs=[self._build_trace_config()],
+            )
+            print(f"HTTP Client Pool started (limit={settings.HTTP_POOL_LIMIT}, per_host={settings.HTTP_POOL_LIMIT_PER_HOST})")
+        return self._session
+
+    def stats(self):
+        created = self.counters['connections_created']
+        reused = self.counters['connections_reused']
+        total = created + reused
+        return {
+            **self.counters,
+            'reuse_ratio': (reused / total) if total else 0.0,
+            'per_host': {host: dict(s) for host, s in self.per_host.items()},
+        }
+
+    async def close(self):
+        if self._session and not self._session.closed:
+            await self._session.close()
+            print("HTTP Client Pool closed.")
+        self._session = None
+
+# Shared instance used by all integrations
+http_client = HttpClientManager()
@@ -0,0 +1,41 @@
+from config import settings
+from integrations.hedging import hedged_race
+from integrations.provider_router import provider_router
+
+async def generate_hybrid_image(supermachine, artist, prompt, prefer_nvidia=False, control_image_url=None, deadline=None):
+    """
+    Hybrid Generator (shared by the Battle cog and worker.py):
+    1. If prefer_nvidia=True, try NVIDIA Flux (Sanitized) first.
+    2. Supermachine (if the Webhook URL is set) and Pollinations (which itself
+       falls back to NVIDIA Flux), ordered by the router's expected time-to-image.
+    Providers with an open circuit breaker are skipped. With HEDGE_ENABLED, a
+    provider that runs past its usual latency gets a backup request at the
+    next one; the first image wins, the rest are cancelled.
+    A battle deadline, if given, caps how long each provider waits.
+    """
+    print(f"DEBUG: Hybrid Gen Called. Prompt: {prompt[:50]}...")
+    candidates = {}
+
+    # Supermachine (The "Big Gun")
+    if supermachine and supermachine.is_available():
+        candidates["supermachine"] = lambda: supermachine.generate_image(prompt, control_image_url=control_image_url, deadline=deadline)
+    else:
+        print("DEBUG: Supermachine skipped (Not configured, or webhook mode without a Webhook URL)")
+
+    # Pollinations (Standard Fallback)
+    # Force Pollinations by not passing prefer_nvidia=True
+    candidates["pollinations"] = lambda: artist.generate_image(prompt, prefer_nvidia=False, deadline=deadline)
+
+    order = provider_router.route(list(candidates.keys()))
+    # Every breaker is open - still try the last resort rather than shipping no art
+    gate = bool(order)
+    if not order:
+        order = ["pollinations"]
+    attempts = [(name, candidates[name]) for name in order]
+
+    # NVIDIA Preference is pinned to the front
+    if prefer_nvidia:
+        attempts.insert(0, ("nvidia", lambda: artist.generate_image(prompt, prefer_nvidia=True, deadline=deadline)))
+
+    print(f"DEBUG: Hybrid Gen - Providers: {[name for name, _ in attempts]} (hedging {'on' if settings.HEDGE_ENABLED else 'off'})")
+    return await hedged_race(attempts, hedge=settings.HEDGE_ENABLED, gate=gate)
@@ -0,0 +1,160 @@
+import base64
+import binascii
+import contextvars
+import io
+import tempfile
+from collections import deque
+import discord
+from config import settings
+
+# 4 base64 chars -> 3 bytes, so decode in multiples of 4
+B64_CHUNK_CHARS = 256 * 1024
+STREAM_CHUNK_BYTES = 64 * 1024
+
+MAGIC_EXTENSIONS = [
+    (b"\x89PNG", "png"),
+    (b"\xff\xd8\xff", "jpg"),
+    (b"GIF8", "gif"),
+    (b"RIFF", "webp"), # RIFF....WEBP
+]
+
+class MemoryMeter:
+    """
+    Counts image bytes held in RAM by payloads created while it is active.
+    Bytes spilled to a temp file don't count. One meter per battle.
+    """
+    def __init__(self, label=""):
+        self.label = label
+        self.current = 0
+        self.peak = 0
+        self.spilled = 0
+        self.payloads = 0
+
+    def allocate(self, size):
+        self.current += size
+        self.peak = max(self.peak, self.current)
+
+    def release(self, size):
+        self.current = max(0, self.current - size)
+
+# Set by run_battle; asyncio tasks copy the context, so provider calls inherit it
+current_meter = contextvars.ContextVar("image_memory_meter", default=None)
+
+# Peak image memory of the last few battles, for /admin_health
+recent_peaks = deque(maxlen=20)
+
+def start_meter(label=""):
+    meter = MemoryMeter(label)
+    current_meter.set(meter)
+    return meter
+
+def finish_meter(meter):
+    recent_peaks.append(meter.peak)
+    print(f"📊 Image memory for {meter.label or 'battle'}: peak {meter.peak / 1024:.0f} KB in RAM, "
+          f"{meter.spilled / 1024:.0f} KB spilled to disk across {meter.payloads} images")
+
+class ImagePayload:
+    """
+    Image bytes from a provider, written once and handed to Discord as-is.
+    Stays in a BytesIO until IMAGE_SPOOL_THRESHOLD, then moves to a temp file.
+    Writes past IMAGE_MAX_BYTES are refused (write() returns False).
+    """
+    def __init__(self, max_size=None, spool_threshold=None):
+        self.max_size = max_size if max_size is not None else settings.IMAGE_MAX_BYTES
+        self.spool_threshold = spool_threshold if spool_threshold is not None else settings.IMAGE_SPOOL_THRESHOLD
+        self.fp = io.BytesIO()
+        self.size = 0
+        self.spooled = False
+        self.closed = False
+        self._head = b""
+        self.meter = current_meter.get()
+        if self.meter:
+            self.meter.payloads += 1
+
+    def write(self, chunk):
+        if self.size + len(chunk) > self.max_size:
+            print(f"Image exceeds {self.max_size / 1024 / 1024:.0f} MB cap. Dropping it.")
+            return False
+        if len(self._head) < 16:
+            self._head = (self._head + chunk[:16])[:16]
+        if not self.spooled and self.size + len(chunk) > self.spool_threshold:
+            self._spill()
+        self.fp.write(chunk)
+        self.size += len(chunk)
+        if self.meter:
+            if self.spooled:
+                self.meter.spilled += len(chunk)
+            else:
+                self.meter.allocate(len(chunk))
+        return True
+
+    def _spill(self):
+        spool = tempfile.TemporaryFile()
+        spool.write(self.fp.getbuffer())
+        self.fp.close()
+        self.fp = spool
+        self.spooled = True
+        if self.meter:
+            self.meter.release(self.size)
+            self.meter.spilled += self.size
+
+    @property
+    def extension(self):
+        for magic, extension in MAGIC_EXTENSIONS:
+            if self._head.startswith(magic):
+                return extension
+        return "jpg"
+
+    def getvalue(self):
+        self.fp.seek(0)
+        return self.fp.read()
+
+    def to_file(self, name):
+        """discord.File over our own buffer - nothing is copied."""
+        self.fp.seek(0)
+        return discord.File(self.fp, filename=f"{name}.{self.extension}")
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        if self.meter and not self.spooled:
+            self.meter.release(self.size)
+        self.fp.close()
+
+    @classmethod
+    def from_bytes(cls, data):
+        payload = cls()
+        if not payload.write(data):
+            payload.close()
+            return None
+        return payload
+
+    @classmethod
+    async def from_response(cls, response):
+        """Streams an aiohttp response body in. None if it is over the cap."""
+        payload = cls()
+        if response.content_length and response.content_length > payload.max_size:
+            print(f"Image is {response.content_length} bytes, over the cap. Not downloading.")
+            payload.close()
+            return None
+        async for chunk in response.content.iter_chunked(STREAM_CHUNK_BYTES):
+            if not payload.write(chunk):
+                payload.close()
+                return None
+        return payload
+
+    @classmethod
+    def from_base64(cls, b64_string):
+        """Decodes base64 chunk by chunk instead of materialising the whole image twice."""
+        payload = cls()
+        try:
+            for start in range(0, len(b64_string), B64_CHUNK_CHARS):
+                if not payload.write(base64.b64decode(b64_string[start:start + B64_CHUNK_CHARS])):
+                    payload.close()
+                    return None
+        except (binascii.Error, ValueError) as e:
+            print(f"Base64 decode error: {e}")
+            payload.close()
+            return None
+        return payload
@@ -0,0 +1,184 @@
+import asyncio
+import json
+import os
+from collections import Counter
+from config import settings
+from database.job_queue import JobQueue
+from integrations.image_payload import ImagePayload
+
+def ipc_socket_path():
+    """Unix socket this bot process listens on (one per process under launcher.py)."""
+    if settings.COORDINATOR_URL:
+        return f"{settings.JOB_IPC_SOCKET}.{settings.PROCESS_INDEX}"
+    return settings.JOB_IPC_SOCKET
+
+def _read_output(path):
+    """Loads a worker's image file into a payload and deletes the file."""
+    try:
+        with open(path, "rb") as f:
+            return ImagePayload.from_bytes(f.read())
+    finally:
+        _remove(path)
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+class JobBroker:
+    """
+    Bot side of the job queue. Image and vision requests are written to the
+    jobs table and picked up by worker.py; the worker reports progress and
+    completion over a unix socket (JSON lines: {"job", "event", ...}).
+    The socket only wakes the waiter early - the outcome is always read from
+    the database, which is also polled every JOB_POLL_INTERVAL in case the
+    socket is down. A waiter that gives up cancels its job.
+    """
+    def __init__(self, socket_path=None):
+        self.queue = JobQueue()
+        self.socket_path = socket_path or ipc_socket_path()
+        self.waiters = {} # job id -> asyncio.Event
+        self.progress = {} # job id -> last progress message
+        self.stats = Counter()
+        self._server = None
+        self._purge_task = None
+
+    async def start(self):
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path) # Left behind by a previous run
+        self._server = await asyncio.start_unix_server(self._handle_client, path=self.socket_path)
+        self._purge_task = asyncio.create_task(self._purge_loop())
+        print(f"🧵 Job queue on: workers report to {self.socket_path}")
+
+    async def stop(self):
+        if self._purge_task:
+            self._purge_task.cancel()
+            self._purge_task = None
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+            _remove(self.socket_path)
+
+    async def _handle_client(self, reader, writer):
+        self.stats['ipc_connections'] += 1
+        try:
+            while line := await reader.readline():
+                try:
+                    message = json.loads(line)
+                except ValueError:
+                    continue
+                job_id = message.get('job')
+                event = message.get('event')
+                self.stats[f"ipc_{event}"] += 1
+                if event == "progress":
+                    self.progress[job_id] = message.get('message')
+                elif event in ("done", "failed") and job_id in self.waiters:
+                    self.waiters[job_id].set()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _purge_loop(self):
+        while True:
+            try:
+                # Images nobody collected (the bot restarted mid-job) go with their rows
+                for result in await self.queue.purge():
+                    if result.get('path'):
+                        _remove(result['path'])
+            except Exception as e:
+                print(f"Job purge failed: {e}")
+            await asyncio.sleep(3600)
+
+    async def submit(self, kind, payload, timeout):
+        """Queues a job and waits for it. Returns its result dict, or None if it failed or timed out."""
+        payload = dict(payload, reply_to=self.socket_path)
+        job_id = await self.queue.enqueue(kind, payload)
+        self.stats['submitted'] += 1
+        event = self.waiters[job_id] = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        expires_at = loop.time() + timeout
+        finished = False
+        try:
+            while loop.time() < expires_at:
+                try:
+                    await asyncio.wait_for(event.wait(), timeout=min(settings.JOB_POLL_INTERVAL, max(0.0, expires_at - loop.time())))
+                except asyncio.TimeoutError:
+                    pass
+                event.clear()
+                status, result, error = await self.queue.get(job_id)
+                if status == "done":
+                    finished = True
+                    self.stats['done'] += 1
+                    return result
+                if status in ("failed", "cancelled"):
+                    finished = True
+                    self.stats['failed'] += 1
+                    print(f"❌ Job {job_id} ({kind}) {status}: {error}")
+                    return None
+            self.stats['timed_out'] += 1
+            print(f"⏱️ Job {job_id} ({kind}) timed out after {timeout:.0f}s")
+            return None
+        finally:
+            del self.waiters[job_id]
+            self.progress.pop(job_id, None)
+            if not finished:
+                # Timed out or the battle was cancelled - the worker drops it at its next heartbeat
+                await asyncio.shield(self.queue.cancel(job_id))
+
+    async def image(self, prompt, prefer_nvidia=False, control_image_url=None, deadline=None):
+        """Same contract as generate_hybrid_image: an ImagePayload or None."""
+        budget = deadline.remaining() if deadline else settings.JOB_TIMEOUT
+        result = await self.submit("image", {
+            'prompt': prompt,
+            'prefer_nvidia': prefer_nvidia,
+            'control_image_url': control_image_url,
+            'budget': budget,
+        }, timeout=budget)
+        if not result or not result.get('path'):
+            return None
+        return await asyncio.to_thread(_read_output, result['path'])
+
+    async def vision(self, image_url):
+        result = await self.submit("vision", {'url': image_url}, timeout=settings.JOB_TIMEOUT)
+        return result.get('description') if result else "a mysterious fighter"
+
+    async def get_stats(self):
+        stats = dict(self.stats)
+        stats['waiting'] = len(self.waiters)
+        stats['jobs'] = await self.queue.counts()
+        return stats
+
+class ProgressReporter:
+    """
+    Worker side of the IPC socket. Messages to a bot that isn't listening
+    (restarting, or never started) are dropped - the bot reads the outcome
+    from the database anyway.
+    """
+    def __init__(self):
+        self.writers = {} # socket path -> StreamWriter
+
+    async def send(self, socket_path, job_id, event, **data):
+        if not socket_path:
+            return
+        line = (json.dumps(dict(data, job=job_id, event=event)) + "\n").encode()
+        for _ in range(2): # Once more on a fresh connection if the old one went stale
+            writer = self.writers.get(socket_path)
+            try:
+                if writer is None:
+                    _, writer = await asyncio.open_unix_connection(socket_path)
+                    self.writers[socket_path] = writer
+                writer.write(line)
+                await writer.drain()
+                return
+            except (OSError, ConnectionError):
+                self.writers.pop(socket_path, None)
+                if writer:
+                    writer.close()
+
+    def close(self):
+        for writer in self.writers.values():
+            writer.close()
+        self.writers = {}
@@ -45,10 +45,10 @@ class LocalNarrator:
         template = random.choice(self.meeting_templates)
         return template.format(a=fighter_a, b=fighter_b, theme=theme, species_a=species_a, species_b=species_b)
 
-    async def generate_clash(self, fighter_a, fighter_b, species_a, species_b):
+    async def generate_clash(self, fighter_a, fighter_b, species_a, species_b, theme="arena"):
         template = random.choice(self.clash_templates)
-        return template.format(a=fighter_a, b=fighter_b)
+        return template.format(a=fighter_a, b=fighter_b, theme=theme)
 
-    async def generate_victory(self, winner, loser, winner_species, loser_species):
+    async def generate_victory(self, winner, loser, winner_species, loser_species, theme="arena"):
         template = random.choice(self.victory_templates)
-        return template.format(winner=winner, loser=loser, winner_species=winner_species)
+        return template.format(winner=winner, loser=loser, winner_species=winner_species, theme=theme)
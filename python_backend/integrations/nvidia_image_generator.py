@@ -1,8 +1,13 @@
 import aiohttp
-import base64
-import io
+import time
 import urllib.parse
 from config import settings
+from integrations.http_client import http_client
+from integrations.image_payload import ImagePayload
+from integrations.provider_router import provider_router
+from integrations.rate_limiter import rate_limiter
+
+POLLINATIONS_HOST = "image.pollinations.ai"
 
 class NvidiaImageGenerator:
     def __init__(self):
@@ -21,9 +26,9 @@ class NvidiaImageGenerator:
             sanitized = sanitized.replace(word.capitalize(), "Action")
         return sanitized
 
-    async def generate_image(self, prompt, negative_prompt="", prefer_nvidia=False):
+    async def generate_image(self, prompt, negative_prompt="", prefer_nvidia=False, deadline=None):
         # 1. If prefer_nvidia is True, try NVIDIA Flux (Sanitized) first
-        if prefer_nvidia and self.api_key:
+        if prefer_nvidia and self.api_key and provider_router.acquire("nvidia:flux"):
             print(f"DEBUG: Prefer NVIDIA requested. Using Flux (Sanitized)...")
             safe_prompt = self._sanitize_prompt(prompt)
             image = await self._generate_nvidia(safe_prompt, model_url=self.nvidia_api_url)
@@ -32,60 +37,98 @@ class NvidiaImageGenerator:
 
         # 2. Try Pollinations.ai (Flux/Turbo) - Best for "Edgy" content
         print(f"DEBUG: Attempting Pollinations for: {prompt[:30]}...")
-        image = await self._generate_pollinations(prompt)
+        image = await self._generate_pollinations(prompt, deadline=deadline)
         if image:
             return image
 
         # 3. Fallback to NVIDIA Flux (Sanitized) if Pollinations failed
+        if deadline and deadline.expired():
+            print("DEBUG: Battle deadline reached. Skipping NVIDIA fallback.")
+            return None
         if self.api_key:
+            if not provider_router.acquire("nvidia:flux"):
+                print("DEBUG: NVIDIA Flux circuit is open. Skipping fallback.")
+                return None
             safe_prompt = self._sanitize_prompt(prompt)
             print(f"DEBUG: Pollinations failed. Falling back to NVIDIA Flux (Sanitized)...")
             return await self._generate_nvidia(safe_prompt, model_url=self.nvidia_api_url)
             
         return None
 
-    async def _generate_pollinations(self, prompt):
-        import random
-        import asyncio
-        
-        # Try Flux first (better quality), then Turbo (faster/fallback)
-        models = ["flux", "turbo"]
+    async def _generate_pollinations(self, prompt, deadline=None):
+        # Flux (better quality) and Turbo (faster), tried in order of observed time-to-image
+        models = [p.split(":")[1] for p in provider_router.order(["pollinations:flux", "pollinations:turbo"])]
         
         for model in models:
+            provider = f"pollinations:{model}"
             # Retry logic (2 attempts per model)
             for attempt in range(2):
-                try:
-                    # Add random delay to prevent rate limiting
-                    delay = random.uniform(3.0, 6.0) # Increased delay
-                    await asyncio.sleep(delay)
-                    
-                    print(f"Generating image via Pollinations.ai ({model}) [Attempt {attempt+1}]...")
-                    
-                    # Truncate prompt if too long (URL limit safety)
-                    safe_prompt = prompt[:1500] 
-                    encoded_prompt = urllib.parse.quote(safe_prompt)
-                    
-                    seed = random.randint(0, 100000)
-                    url = f"https://image.pollinations.ai/prompt/{encoded_prompt}?width=1024&height=1024&model={model}&nologo=true&seed={seed}"
-                    
-                    async with aiohttp.ClientSession() as session:
-                        async with session.get(url, timeout=60) as response: # Increased timeout
-                            if response.status == 200:
-                                image_bytes = await response.read()
-                                if len(image_bytes) > 1000: # Ensure we got a real image
-                                    print(f"Pollinations ({model}) Success! Received {len(image_bytes)} bytes.")
-                                    return io.BytesIO(image_bytes)
-                            
-                            print(f"Pollinations ({model}) API Error (Attempt {attempt+1}): {response.status}")
-                            
-                except Exception as e:
-                    print(f"Pollinations ({model}) Exception (Attempt {attempt+1}): {e}")
-                    import traceback
-                    traceback.print_exc()
+                if deadline and deadline.expired():
+                    print("Pollinations: battle deadline reached, no more attempts.")
+                    return None
+
+                # Don't burn the retry budget on a model that keeps failing
+                if not provider_router.acquire(provider):
+                    print(f"Pollinations ({model}) circuit is open. Skipping.")
+                    break
+
+                # Only waits when we are actually near Pollinations' rate limit
+                waited = await rate_limiter.acquire(POLLINATIONS_HOST)
+                if waited:
+                    print(f"Pollinations rate limiter held request for {waited:.1f}s")
+
+                # Never wait on Pollinations past the battle deadline
+                timeout = min(60, deadline.remaining()) if deadline else 60
+                started = time.monotonic()
+                image = await self._request_pollinations(prompt, model, attempt, timeout=timeout)
+                # A request we cut short ourselves says nothing about Pollinations' health
+                if image or not (deadline and deadline.expired()):
+                    provider_router.record(provider, time.monotonic() - started, image is not None)
+                if image:
+                    return image
                 
         return None
 
+    async def _request_pollinations(self, prompt, model, attempt, timeout=60):
+        import random
+        try:
+            print(f"Generating image via Pollinations.ai ({model}) [Attempt {attempt+1}]...")
+            
+            # Truncate prompt if too long (URL limit safety)
+            safe_prompt = prompt[:1500] 
+            encoded_prompt = urllib.parse.quote(safe_prompt)
+            
+            seed = random.randint(0, 100000)
+            url = f"https://{POLLINATIONS_HOST}/prompt/{encoded_prompt}?width=1024&height=1024&model={model}&nologo=true&seed={seed}"
+            
+            session = http_client.get_session()
+            async with session.get(url, timeout=aiohttp.ClientTimeout(total=timeout)) as response: # Increased timeout
+                if response.status == 200:
+                    image = await ImagePayload.from_response(response)
+                    if image and image.size > 1000: # Ensure we got a real image
+                        print(f"Pollinations ({model}) Success! Received {image.size} bytes.")
+                        return image
+                    if image:
+                        image.close()
+                
+                if response.status == 429:
+                    rate_limiter.penalize(POLLINATIONS_HOST, response.headers.get("Retry-After"))
+                print(f"Pollinations ({model}) API Error (Attempt {attempt+1}): {response.status}")
+                    
+        except Exception as e:
+            print(f"Pollinations ({model}) Exception (Attempt {attempt+1}): {e}")
+            import traceback
+            traceback.print_exc()
+        return None
+
     async def _generate_nvidia(self, prompt, model_url=None, high_quality=False):
+        started = time.monotonic()
+        image = await self._request_nvidia(prompt, model_url=model_url, high_quality=high_quality)
+        # A safety-filter placeholder counts as a failure - it is not a usable image
+        provider_router.record("nvidia:flux", time.monotonic() - started, image is not None)
+        return image
+
+    async def _request_nvidia(self, prompt, model_url=None, high_quality=False):
         url = model_url if model_url else self.nvidia_api_url
         
         headers = {
@@ -123,34 +166,36 @@ class NvidiaImageGenerator:
 
         print(f"Generating image via NVIDIA ({url.split('/')[-1]})...")
         
-        async with aiohttp.ClientSession() as session:
-            try:
-                async with session.post(url, headers=headers, json=payload) as response:
-                    if response.status != 200:
-                        error_text = await response.text()
-                        print(f"NVIDIA API Error: {response.status} - {error_text}")
-                        return None
-                    
-                    data = await response.json()
-                    
-                    if 'artifacts' in data and len(data['artifacts']) > 0:
-                        b64_json = data['artifacts'][0].get('base64')
-                        if b64_json:
-                            print(f"Received base64 data length: {len(b64_json)}")
-                            try:
-                                image_bytes = base64.b64decode(b64_json)
-                                print(f"Decoded image bytes length: {len(image_bytes)}")
-                                if len(image_bytes) < 10000: # < 10KB is likely a safety filter placeholder
-                                    print(f"Warning: Generated image is too small ({len(image_bytes)} bytes). Likely safety filter.")
-                                    return None
-                                return io.BytesIO(image_bytes)
-                            except Exception as e:
-                                print(f"Base64 decode error: {e}")
-                                return None
-                    
-                    print(f"Unexpected response format: {data.keys()}")
+        await rate_limiter.acquire(urllib.parse.urlsplit(url).hostname)
+        session = http_client.get_session()
+        try:
+            async with session.post(url, headers=headers, json=payload) as response:
+                if response.status != 200:
+                    error_text = await response.text()
+                    if response.status == 429:
+                        rate_limiter.penalize(response.url.host, response.headers.get("Retry-After"))
+                    print(f"NVIDIA API Error: {response.status} - {error_text}")
                     return None
-
-            except Exception as e:
-                print(f"Exception during image generation: {e}")
+                
+                data = await response.json()
+                
+                if 'artifacts' in data and len(data['artifacts']) > 0:
+                    b64_json = data['artifacts'][0].get('base64')
+                    if b64_json:
+                        print(f"Received base64 data length: {len(b64_json)}")
+                        image = ImagePayload.from_base64(b64_json)
+                        if not image:
+                            return None
+                        print(f"Decoded image bytes length: {image.size}")
+                        if image.size < 10000: # < 10KB is likely a safety filter placeholder
+                            print(f"Warning: Generated image is too small ({image.size} bytes). Likely safety filter.")
+                            image.close()
+                            return None
+                        return image
+                
+                print(f"Unexpected response format: {data.keys()}")
                 return None
+
+        except Exception as e:
+            print(f"Exception during image generation: {e}")
+            return None
@@ -1,6 +1,11 @@
-import aiohttp
 from config import settings
+from integrations.http_client import http_client
+from integrations.local_narrator import LocalNarrator
+import aiohttp
+import json
 import random
+import re
+import time
 
 STYLES = [
     "a gritty noir detective",
@@ -13,20 +18,111 @@ STYLES = [
     "a nature documentary narrator"
 ]
 
+BEATS = ("meeting", "clash", "victory")
+MAX_BEAT_CHARS = 600 # 2 sentences, with room to spare
+
+def _partial_string(text, start):
+    """Decodes a JSON string value that may still be missing its closing quote."""
+    end = start
+    escaped = False
+    while end < len(text):
+        char = text[end]
+        if escaped:
+            escaped = False
+        elif char == "\\":
+            escaped = True
+        elif char == '"':
+            break
+        end += 1
+    raw = text[start:end]
+    # Trim a dangling escape (e.g. half of \n or \u00e9) until it decodes
+    while raw:
+        try:
+            return json.loads(f'"{raw}"')
+        except ValueError:
+            cut = raw.rfind("\\")
+            raw = raw[:cut] if cut != -1 else ""
+    return ""
+
+def _timeout_kwargs(timeout):
+    return {"timeout": aiohttp.ClientTimeout(total=timeout)} if timeout else {}
+
+def _complete_beats(text):
+    """Beats whose closing quote already arrived in a truncated script."""
+    beats = {}
+    for beat in BEATS:
+        match = re.search(rf'"{beat}"\s*:\s*("(?:[^"\\]|\\.)*")', text)
+        if match:
+            try:
+                value = json.loads(match.group(1)).strip()
+            except ValueError:
+                continue
+            if 0 < len(value) <= MAX_BEAT_CHARS:
+                beats[beat] = value
+    return beats
+
+def _partial_beats(text):
+    """Beats found so far in a JSON script that is still streaming in."""
+    beats = {}
+    for beat in BEATS:
+        match = re.search(rf'"{beat}"\s*:\s*"', text)
+        if match:
+            value = _partial_string(text, match.end())
+            if value.strip():
+                beats[beat] = value
+    return beats
+
 class NvidiaNarrator:
     def __init__(self):
         self.api_key = settings.NVIDIA_API_KEY
         # Using Llama 3.1 405B Instruct via NVIDIA NIM
         self.api_url = "https://integrate.api.nvidia.com/v1/chat/completions"
+        self.local = LocalNarrator() # Per-beat fallback for the batched script
+        self.snippets = None # Optional AssetPool with pre-generated lines, tried before the local templates
+        self.stats = {'requests': 0, 'prompt_tokens': 0, 'completion_tokens': 0, 'fallback_beats': 0}
 
-    async def _generate_text(self, system_prompt, user_prompt):
-        if not self.api_key:
-            print("Warning: NVIDIA_API_KEY not set.")
-            return "Narrator is speechless."
+    async def _request_completion(self, system_prompt, user_prompt, max_tokens=150, temperature=0.7, timeout=None):
+        """One chat completion. Returns the text, or None if anything went wrong (or it ran past `timeout`)."""
+        headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json",
+        }
+        
+        payload = {
+            "model": "meta/llama-3.1-405b-instruct",
+            "messages": [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt}
+            ],
+            "temperature": temperature,
+            "top_p": 1,
+            "max_tokens": max_tokens
+        }
+
+        session = http_client.get_session()
+        try:
+            async with session.post(self.api_url, headers=headers, json=payload, **_timeout_kwargs(timeout)) as response:
+                if response.status != 200:
+                    error_text = await response.text()
+                    print(f"NVIDIA Text API Error: {response.status} - {error_text}")
+                    return None
+                
+                data = await response.json()
+                self.stats['requests'] += 1
+                usage = data.get('usage') or {}
+                self.stats['prompt_tokens'] += usage.get('prompt_tokens', 0)
+                self.stats['completion_tokens'] += usage.get('completion_tokens', 0)
+                return data['choices'][0]['message']['content']
+        except Exception as e:
+            print(f"NVIDIA Text Gen Exception: {e}")
+            return None
 
+    async def _stream_completion(self, system_prompt, user_prompt, max_tokens=150, temperature=0.7, timeout=None):
+        """Yields text deltas as the model writes them (SSE). Stops early on failure or after `timeout`."""
         headers = {
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json",
+            "Accept": "text/event-stream",
         }
         
         payload = {
@@ -35,50 +131,223 @@ class NvidiaNarrator:
                 {"role": "system", "content": system_prompt},
                 {"role": "user", "content": user_prompt}
             ],
-            "temperature": 0.7,
+            "temperature": temperature,
             "top_p": 1,
-            "max_tokens": 150
+            "max_tokens": max_tokens,
+            "stream": True,
+            "stream_options": {"include_usage": True}
         }
 
-        async with aiohttp.ClientSession() as session:
-            try:
-                async with session.post(self.api_url, headers=headers, json=payload) as response:
-                    if response.status != 200:
-                        error_text = await response.text()
-                        print(f"NVIDIA Text API Error: {response.status} - {error_text}")
-                        return "The narrator microphone is broken."
-                    
-                    data = await response.json()
-                    return data['choices'][0]['message']['content']
-            except Exception as e:
-                print(f"NVIDIA Text Gen Exception: {e}")
-                return "The narrator is having technical difficulties."
-
-    async def generate_meeting(self, fighter_a, fighter_b, theme, gender_a=None, gender_b=None, style=None):
+        session = http_client.get_session()
+        try:
+            async with session.post(self.api_url, headers=headers, json=payload, **_timeout_kwargs(timeout)) as response:
+                if response.status != 200:
+                    error_text = await response.text()
+                    print(f"NVIDIA Text Stream Error: {response.status} - {error_text}")
+                    return
+                
+                self.stats['requests'] += 1
+                async for raw_line in response.content:
+                    line = raw_line.decode('utf-8', errors='ignore').strip()
+                    if not line.startswith("data:"):
+                        continue
+                    data = line[5:].strip()
+                    if data == "[DONE]":
+                        break
+                    try:
+                        chunk = json.loads(data)
+                    except ValueError:
+                        continue
+                    usage = chunk.get('usage') or {}
+                    self.stats['prompt_tokens'] += usage.get('prompt_tokens', 0)
+                    self.stats['completion_tokens'] += usage.get('completion_tokens', 0)
+                    choices = chunk.get('choices') or []
+                    delta = choices[0].get('delta', {}).get('content') if choices else None
+                    if delta:
+                        yield delta
+        except Exception as e:
+            print(f"NVIDIA Text Stream Exception: {e}")
+
+    def _allot(self, deadline):
+        """The narrator's slice of the battle deadline, or None without one."""
+        if deadline is None:
+            return None
+        return deadline.slice(settings.NARRATOR_BUDGET_SHARE)
+
+    async def _generate_text(self, system_prompt, user_prompt, deadline=None, stage="narrator", fallback=None):
+        if not self.api_key:
+            print("Warning: NVIDIA_API_KEY not set.")
+            return "Narrator is speechless."
+
+        allotted = self._allot(deadline)
+        started = time.monotonic()
+        text = None
+        if allotted is None or allotted > 0:
+            text = await self._request_completion(system_prompt, user_prompt, timeout=allotted)
+        if deadline:
+            deadline.record(stage, allotted, time.monotonic() - started)
+        if text is None and fallback:
+            # Out of time (or the API failed) - the local templates are instant
+            return await fallback()
+        return text if text is not None else "The narrator is having technical difficulties."
+
+    def _script_prompts(self, fighter_a, fighter_b, winner, loser, theme, style=None):
+        if not style:
+            style = random.choice(STYLES)
+        system = (
+            f"You are {style}, narrating a fight in a {theme} in three beats. "
+            "Reply with ONLY a JSON object with the string keys \"meeting\", \"clash\" and \"victory\". "
+            "meeting: the moment the two fighters spot each other, suspenseful and visual. "
+            "clash: the heat of the battle, high energy. "
+            "victory: declare the winner, epic conclusion. "
+            "Each beat is max 2 sentences."
+        )
+        user = f"{fighter_a} faces {fighter_b}. {winner} defeats {loser}."
+        return system, user
+
+    async def generate_battle_script(self, fighter_a, fighter_b, winner, loser, theme, style=None, deadline=None):
+        """
+        All three beats (meeting, clash, victory) from a single request.
+        Returns {'meeting': ..., 'clash': ..., 'victory': ...}; any beat the
+        model didn't deliver properly comes from the LocalNarrator instead.
+        """
+        system, user = self._script_prompts(fighter_a, fighter_b, winner, loser, theme, style)
+        beats = {}
+        allotted = self._allot(deadline)
+        started = time.monotonic()
+        if not self.api_key:
+            print("Warning: NVIDIA_API_KEY not set.")
+        elif allotted is None or allotted > 0:
+            text = await self._request_completion(system, user, max_tokens=400, timeout=allotted)
+            beats = self._parse_script(text)
+        if deadline:
+            deadline.record("narrator", allotted, time.monotonic() - started)
+        return await self._fill_script(beats, fighter_a, fighter_b, winner, loser, theme)
+
+    async def stream_battle_script(self, fighter_a, fighter_b, winner, loser, theme, style=None, deadline=None):
+        """
+        Streaming generate_battle_script: yields the beats written so far while
+        the JSON is still arriving. The last item is the finished, validated script.
+        """
+        system, user = self._script_prompts(fighter_a, fighter_b, winner, loser, theme, style)
+        text = ""
+        allotted = self._allot(deadline)
+        started = time.monotonic()
+        if not self.api_key:
+            print("Warning: NVIDIA_API_KEY not set.")
+        elif allotted is None or allotted > 0:
+            async for delta in self._stream_completion(system, user, max_tokens=400, timeout=allotted):
+                text += delta
+                partial = _partial_beats(text)
+                if partial:
+                    yield partial
+        if deadline:
+            deadline.record("narrator", allotted, time.monotonic() - started)
+        # A stream cut off by the deadline still keeps every beat that finished
+        beats = self._parse_script(text) or _complete_beats(text)
+        yield await self._fill_script(beats, fighter_a, fighter_b, winner, loser, theme)
+
+    async def _fill_script(self, beats, fighter_a, fighter_b, winner, loser, theme):
+        missing = [beat for beat in BEATS if beat not in beats]
+        if missing:
+            print(f"Narrator script missing {missing}, using pooled snippets / local narrator for those beats.")
+            self.stats['fallback_beats'] += len(missing)
+        for beat in missing:
+            a, b = (winner, loser) if beat == "victory" else (fighter_a, fighter_b)
+            beats[beat] = await self._fallback_beat(beat, a, b, theme)
+        return beats
+
+    async def _fallback_beat(self, beat, a, b, theme=None):
+        """A pooled, theme-specific snippet if there is one, otherwise the local templates."""
+        pooled = self.snippets.take_snippet(beat, a, b, theme) if self.snippets and theme else None
+        if pooled:
+            return pooled
+        if beat == "meeting":
+            return await self.local.generate_meeting(a, b, theme, "fighter", "fighter")
+        if beat == "clash":
+            return await self.local.generate_clash(a, b, "fighter", "fighter", theme=theme or "arena")
+        return await self.local.generate_victory(a, b, "fighter", "fighter", theme=theme or "arena")
+
+    async def generate_generic_script(self, theme, style=None):
+        """Beats for the asset pool, with {a} (the winner) and {b} as name placeholders."""
+        if not self.api_key:
+            return {}
+        system, user = self._script_prompts("{a}", "{b}", "{a}", "{b}", theme, style)
+        system += " Refer to the fighters only as {a} and {b}, written exactly like that."
+        text = await self._request_completion(system, user, max_tokens=400, temperature=0.9)
+        return self._parse_script(text)
+
+    def _parse_script(self, text):
+        """Pulls the JSON object out of the reply and keeps only well-formed beats."""
+        if not text:
+            return {}
+        start, end = text.find("{"), text.rfind("}")
+        if start == -1 or end <= start:
+            print(f"Narrator script is not JSON: {text[:80]}...")
+            return {}
+        try:
+            data = json.loads(text[start:end + 1])
+        except ValueError as e:
+            print(f"Narrator script JSON error: {e}")
+            return {}
+        if not isinstance(data, dict):
+            return {}
+
+        beats = {}
+        for beat in BEATS:
+            value = data.get(beat)
+            if isinstance(value, str) and 0 < len(value.strip()) <= MAX_BEAT_CHARS:
+                beats[beat] = value.strip()
+        return beats
+
+    def _meeting_prompts(self, fighter_a, fighter_b, theme, gender_a=None, gender_b=None, style=None):
         if not style:
             style = random.choice(STYLES)
         g_a = f" ({gender_a})" if gender_a else ""
         g_b = f" ({gender_b})" if gender_b else ""
         system = f"You are {style}. Describe the moment two fighters spot each other in a {theme}. Max 2 sentences. Suspenseful and visual. Note: {fighter_a} is{g_a}, {fighter_b} is{g_b}."
         user = f"{fighter_a} sees their opponent {fighter_b} across the arena."
-        return await self._generate_text(system, user)
+        return system, user
+
+    async def generate_meeting(self, fighter_a, fighter_b, theme, gender_a=None, gender_b=None, style=None, deadline=None):
+        system, user = self._meeting_prompts(fighter_a, fighter_b, theme, gender_a, gender_b, style)
+        return await self._generate_text(system, user, deadline=deadline, stage="narrator:meeting",
+                                         fallback=lambda: self._fallback_beat("meeting", fighter_a, fighter_b, theme))
+
+    async def stream_meeting(self, fighter_a, fighter_b, theme, gender_a=None, gender_b=None, style=None, deadline=None):
+        """Yields {'meeting': text so far} as it streams; the last item is the full text."""
+        system, user = self._meeting_prompts(fighter_a, fighter_b, theme, gender_a, gender_b, style)
+        text = ""
+        allotted = self._allot(deadline)
+        started = time.monotonic()
+        if self.api_key and (allotted is None or allotted > 0):
+            async for delta in self._stream_completion(system, user, timeout=allotted):
+                text += delta
+                yield {"meeting": text}
+        if deadline:
+            deadline.record("narrator:meeting", allotted, time.monotonic() - started)
+        if not text.strip():
+            text = await self._fallback_beat("meeting", fighter_a, fighter_b, theme)
+        yield {"meeting": text.strip()}
 
-    async def generate_clash(self, fighter_a, fighter_b, gender_a=None, gender_b=None, style=None):
+    async def generate_clash(self, fighter_a, fighter_b, gender_a=None, gender_b=None, style=None, deadline=None, theme=None):
         if not style:
             style = random.choice(STYLES)
         g_a = f" ({gender_a})" if gender_a else ""
         g_b = f" ({gender_b})" if gender_b else ""
         system = f"You are {style}. Describe the heat of the battle. A story of the clash. Max 2 sentences. High energy. Note: {fighter_a} is{g_a}, {fighter_b} is{g_b}."
         user = f"Describe the intense fight between {fighter_a} and {fighter_b}."
-        return await self._generate_text(system, user)
+        return await self._generate_text(system, user, deadline=deadline, stage="narrator:clash",
+                                         fallback=lambda: self._fallback_beat("clash", fighter_a, fighter_b, theme))
 
-    async def generate_victory(self, winner, loser, gender_winner=None, gender_loser=None, style=None):
+    async def generate_victory(self, winner, loser, gender_winner=None, gender_loser=None, style=None, deadline=None, theme=None):
         if not style:
             style = random.choice(STYLES)
         g_w = f" ({gender_winner})" if gender_winner else ""
         g_l = f" ({gender_loser})" if gender_loser else ""
         system = f"You are {style}. Declare the winner of the fight. Max 2 sentences. Epic conclusion. Note: {winner} is{g_w}, {loser} is{g_l}."
         user = f"{winner} has defeated {loser}."
-        return await self._generate_text(system, user)
+        return await self._generate_text(system, user, deadline=deadline, stage="narrator:victory",
+                                         fallback=lambda: self._fallback_beat("victory", winner, loser, theme))
 
 
@@ -1,16 +1,64 @@
-import aiohttp
+import asyncio
+import hashlib
 from config import settings
+from integrations.http_client import http_client
+from database.avatar_cache import AvatarDescriptionCache
 
 class NvidiaVision:
     def __init__(self):
         self.api_key = settings.NVIDIA_API_KEY
         # Using Llama 3.2 11B Vision Instruct
         self.api_url = "https://ai.api.nvidia.com/v1/gr/meta/llama-3.2-11b-vision-instruct/chat/completions"
+        self.cache = AvatarDescriptionCache()
+        self.remote = None # JobBroker: cache misses are described by a worker.py process
 
-    async def describe_avatar(self, image_url):
+    async def _hash_image(self, image_url):
+        # Same NFT art is often served from different URLs (CDN sizes, re-uploads)
+        try:
+            session = http_client.get_session()
+            async with session.get(image_url) as response:
+                if response.status != 200:
+                    return None
+                return hashlib.sha256(await response.read()).hexdigest()
+        except Exception as e:
+            print(f"Avatar Hash Error: {e}")
+            return None
+
+    async def describe_avatar(self, image_url, deadline=None):
+        if deadline is None:
+            return await self._describe(image_url)
+        # Both avatars are described in parallel; each gets the vision share of what's left
+        return await deadline.run("vision", self._describe(image_url), fraction=settings.VISION_BUDGET_SHARE, fallback="a mysterious fighter")
+
+    async def _describe(self, image_url):
         if not self.api_key:
             return "a mysterious fighter"
 
+        cached = await self.cache.get(image_url)
+        if cached:
+            return cached
+
+        # Hash the image while vision is already working on it, so a new URL costs no extra round-trip
+        hashing = asyncio.create_task(self._hash_image(image_url))
+        describing = asyncio.create_task(self.remote.vision(image_url) if self.remote else self._describe_uncached(image_url))
+        try:
+            content_hash = await hashing
+            cached = await self.cache.get_by_hash(content_hash)
+            if cached:
+                # Same art we have seen under another URL - drop the vision call and remember this URL too
+                describing.cancel()
+                await self.cache.put(image_url, content_hash, cached)
+                return cached
+
+            description = await describing
+        finally:
+            hashing.cancel()
+            describing.cancel()
+        if description and description != "a mysterious fighter":
+            await self.cache.put(image_url, content_hash, description)
+        return description
+
+    async def _describe_uncached(self, image_url):
         headers = {
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json",
@@ -41,18 +89,18 @@ class NvidiaVision:
             "stream": False
         }
 
-        async with aiohttp.ClientSession() as session:
-            try:
-                async with session.post(self.api_url, headers=headers, json=payload) as response:
-                    if response.status != 200:
-                        print(f"NVIDIA Vision API Error: {response.status}")
-                        # Fallback for 500 errors or other API issues
-                        return "a mysterious fighter"
-                    
-                    data = await response.json()
-                    description = data['choices'][0]['message']['content']
-                    # Clean up the description
-                    return description.replace("The character is ", "").replace("The image shows ", "").strip()
-            except Exception as e:
-                print(f"NVIDIA Vision Exception: {e}")
-                return "a mysterious fighter"
+        session = http_client.get_session()
+        try:
+            async with session.post(self.api_url, headers=headers, json=payload) as response:
+                if response.status != 200:
+                    print(f"NVIDIA Vision API Error: {response.status}")
+                    # Fallback for 500 errors or other API issues
+                    return "a mysterious fighter"
+                
+                data = await response.json()
+                description = data['choices'][0]['message']['content']
+                # Clean up the description
+                return description.replace("The character is ", "").replace("The image shows ", "").strip()
+        except Exception as e:
+            print(f"NVIDIA Vision Exception: {e}")
+            return "a mysterious fighter"
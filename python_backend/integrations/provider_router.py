@@ -0,0 +1,145 @@
+import time
+from config import settings
+from integrations.provider_stats import provider_stats
+
+class CircuitBreaker:
+    """
+    Classic closed -> open -> half-open breaker.
+    Opens after `failure_threshold` consecutive failures, rejects calls for
+    `reset_timeout` seconds, then lets a single probe through.
+    """
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+
+    def __init__(self, failure_threshold=None, reset_timeout=None):
+        self.failure_threshold = failure_threshold if failure_threshold is not None else settings.BREAKER_FAILURE_THRESHOLD
+        self.reset_timeout = reset_timeout if reset_timeout is not None else settings.BREAKER_RESET_TIMEOUT
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.probe_started_at = None
+        self.times_opened = 0
+
+    def peek(self):
+        """Whether a call would be let through right now, without claiming the half-open probe."""
+        now = time.monotonic()
+        if self.state == self.OPEN:
+            return now - self.opened_at >= self.reset_timeout
+        if self.state == self.HALF_OPEN:
+            return not (self.probe_started_at and now - self.probe_started_at < self.reset_timeout)
+        return True
+
+    def allow(self):
+        """Lets a call through, claiming the half-open probe. Only call this when the call really starts."""
+        now = time.monotonic()
+        if self.state == self.OPEN:
+            if now - self.opened_at < self.reset_timeout:
+                return False
+            self.state = self.HALF_OPEN
+            self.probe_started_at = None
+
+        if self.state == self.HALF_OPEN:
+            # One probe at a time; a probe that never reports back (e.g. cancelled) expires
+            if self.probe_started_at and now - self.probe_started_at < self.reset_timeout:
+                return False
+            self.probe_started_at = now
+        return True
+
+    def record_success(self):
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.probe_started_at = None
+
+    def record_cancelled(self):
+        # A probe cut short proved nothing either way - let the next call probe
+        if self.state == self.HALF_OPEN:
+            self.probe_started_at = None
+
+    def record_failure(self):
+        self.consecutive_failures += 1
+        if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                self.times_opened += 1
+                print(f"⚡ Circuit opened after {self.consecutive_failures} consecutive failures")
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+            self.probe_started_at = None
+
+class ProviderRouter:
+    """
+    Orders image providers by expected time-to-image and skips providers
+    whose circuit breaker is open. Fed by every provider call (battle-level
+    providers and individual Pollinations / NVIDIA models alike).
+    """
+    def __init__(self, stats=None):
+        self.stats = stats or provider_stats
+        self.breakers = {} # provider -> CircuitBreaker
+
+    def breaker(self, provider):
+        if provider not in self.breakers:
+            self.breakers[provider] = CircuitBreaker()
+        return self.breakers[provider]
+
+    def record(self, provider, latency, ok):
+        self.stats.record(provider, latency, ok)
+        if ok:
+            self.breaker(provider).record_success()
+        else:
+            self.breaker(provider).record_failure()
+
+    def record_censored(self, provider, elapsed):
+        """An attempt cancelled after `elapsed` seconds: a latency lower bound, not a success or failure."""
+        self.stats.record_censored(provider, elapsed)
+        self.breaker(provider).record_cancelled()
+
+    def percentile(self, provider, pct, min_samples=1):
+        return self.stats.percentile(provider, pct, min_samples=min_samples)
+
+    def available(self, provider):
+        """Side-effect free: safe for ordering and display."""
+        return self.breaker(provider).peek()
+
+    def acquire(self, provider):
+        """Claims a slot on the provider's breaker (the probe, when half-open) for an attempt that starts now."""
+        return self.breaker(provider).allow()
+
+    def expected_time(self, provider):
+        """Median latency divided by success rate (retries until an image arrives)."""
+        p50 = self.stats.percentile(provider, 0.5, min_samples=settings.ROUTER_MIN_SAMPLES)
+        success_rate = self.stats.success_rate(provider)
+        if p50 is None or success_rate is None:
+            return None
+        return p50 / max(success_rate, 0.05)
+
+    def order(self, providers):
+        """
+        Sorts providers fastest-expected first. Providers without enough data
+        are treated as ROUTER_UNKNOWN_EXPECTED and keep their given order on ties.
+        """
+        def key(provider):
+            expected = self.expected_time(provider)
+            return expected if expected is not None else settings.ROUTER_UNKNOWN_EXPECTED
+        return sorted(providers, key=key)
+
+    def route(self, providers):
+        """Ordered providers whose breaker currently lets traffic through."""
+        return [p for p in self.order(providers) if self.available(p)]
+
+    def scoreboard(self):
+        rows = []
+        for provider in sorted(set(self.stats.providers()) | set(self.breakers.keys())):
+            summary = self.stats.summary(provider)
+            breaker = self.breaker(provider)
+            rows.append({
+                'provider': provider,
+                'state': breaker.state,
+                'times_opened': breaker.times_opened,
+                'expected': self.expected_time(provider),
+                **summary,
+            })
+        rows.sort(key=lambda r: r['expected'] if r['expected'] is not None else float('inf'))
+        return rows
+
+# Shared instance used by the battle flow and the image generators
+provider_router = ProviderRouter()
@@ -0,0 +1,68 @@
+import time
+from collections import deque
+from config import settings
+
+class ProviderStats:
+    """
+    Rolling window of recent calls per image provider.
+    Each sample is (latency_seconds, ok, finished_at). A call cancelled
+    before it finished (it lost a hedged race) is kept as a censored sample,
+    ok=None: it says the latency was at least that long.
+    """
+    def __init__(self, window=None):
+        self.window = window if window is not None else settings.PROVIDER_STATS_WINDOW
+        self._samples = {} # provider -> deque of samples
+
+    def record(self, provider, latency, ok):
+        if provider not in self._samples:
+            self._samples[provider] = deque(maxlen=self.window)
+        self._samples[provider].append((latency, ok, time.time()))
+
+    def record_censored(self, provider, elapsed):
+        self.record(provider, elapsed, None)
+
+    def samples(self, provider):
+        return list(self._samples.get(provider, ()))
+
+    def providers(self):
+        return list(self._samples.keys())
+
+    def percentile(self, provider, pct, min_samples=1):
+        """
+        Latency percentile (0-1) over successful calls, or None without enough data.
+        Censored samples count as "slower than this" (Kaplan-Meier), so cancelling
+        the slow calls of hedged races doesn't drag the percentile down.
+        """
+        samples = [(lat, ok) for lat, ok, _ in self._samples.get(provider, ()) if ok is not False]
+        if sum(1 for _, ok in samples if ok) < max(1, min_samples):
+            return None
+        # Completions before censorings at the same time: a call cancelled at t was still running at t
+        samples.sort(key=lambda s: (s[0], s[1] is None))
+        at_risk = len(samples)
+        survival = 1.0
+        for latency, ok in samples:
+            if ok:
+                survival *= (at_risk - 1) / at_risk
+                if 1.0 - survival >= pct - 1e-9:
+                    return latency
+            at_risk -= 1
+        # The percentile lies past the longest call we waited for - that is the best lower bound we have
+        return samples[-1][0]
+
+    def success_rate(self, provider):
+        """Share of finished calls that succeeded (censored samples never finished)."""
+        finished = [ok for _, ok, _ in self._samples.get(provider, ()) if ok is not None]
+        if not finished:
+            return None
+        return sum(1 for ok in finished if ok) / len(finished)
+
+    def summary(self, provider):
+        return {
+            'calls': len(self._samples.get(provider, ())),
+            'success_rate': self.success_rate(provider),
+            'p50': self.percentile(provider, 0.5),
+            'p90': self.percentile(provider, 0.9),
+        }
+
+# Shared instance so every battle feeds the same latency picture
+provider_stats = ProviderStats()
@@ -0,0 +1,169 @@
+import asyncio
+import time
+from email.utils import parsedate_to_datetime
+from config import settings
+from integrations.http_client import http_client
+
+def parse_retry_after(value, default=None):
+    """Retry-After is either delta-seconds or an HTTP date."""
+    if not value:
+        return default
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return default
+
+class TokenBucket:
+    """
+    Token bucket for one provider host: `rate` tokens/sec refill up to `burst`.
+    Callers only wait when the bucket is empty (or a 429 told us to back off),
+    so an idle bot pays no delay at all. rate=None means no request budget,
+    only Retry-After back-off.
+    """
+    def __init__(self, rate=None, burst=1):
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated_at = time.monotonic()
+        self.blocked_until = 0.0
+        self._lock = asyncio.Lock() # FIFO: first caller in line gets the next token
+        self.stats = {'acquired': 0, 'delayed': 0, 'wait_seconds': 0.0, 'throttled': 0}
+
+    def _refill(self, now):
+        if self.rate:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    async def acquire(self):
+        """Takes one token, sleeping only if needed. Returns seconds spent waiting."""
+        waited = 0.0
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                if now < self.blocked_until:
+                    wait = self.blocked_until - now
+                elif not self.rate or self.tokens >= 1:
+                    if self.rate:
+                        self.tokens -= 1
+                    break
+                else:
+                    wait = (1 - self.tokens) / self.rate
+                await asyncio.sleep(wait)
+                waited += wait
+
+        self.stats['acquired'] += 1
+        if waited > 0:
+            self.stats['delayed'] += 1
+            self.stats['wait_seconds'] += waited
+        return waited
+
+    def penalize(self, retry_after):
+        """Called on a 429: nobody talks to this host until Retry-After passes."""
+        now = time.monotonic()
+        self.blocked_until = max(self.blocked_until, now + retry_after)
+        self.tokens = 0.0
+        self.updated_at = now
+        self.stats['throttled'] += 1
+
+class RateLimiterRegistry:
+    """Shared per-host buckets, configured via RATE_LIMITS ("host=rate/burst,...")."""
+    def __init__(self, config=None):
+        self.limits = self._parse(config if config is not None else settings.RATE_LIMITS)
+        self.buckets = {}
+
+    def _parse(self, config):
+        limits = {}
+        for item in filter(None, (part.strip() for part in config.split(","))):
+            try:
+                host, spec = item.split("=")
+                rate, _, burst = spec.partition("/")
+                limits[host.strip()] = (float(rate), int(burst or 1))
+            except ValueError:
+                print(f"Ignoring malformed RATE_LIMITS entry: {item}")
+        return limits
+
+    def bucket(self, host):
+        if host not in self.buckets:
+            rate, burst = self.limits.get(host, (None, 1))
+            self.buckets[host] = TokenBucket(rate, burst)
+        return self.buckets[host]
+
+    async def acquire(self, host):
+        return await self.bucket(host).acquire()
+
+    def penalize(self, host, retry_after=None):
+        delay = parse_retry_after(retry_after, default=settings.RATE_LIMIT_DEFAULT_BACKOFF)
+        print(f"🚦 {host} returned 429. Backing off {delay:.1f}s.")
+        self.bucket(host).penalize(delay)
+
+    def get_stats(self):
+        return {host: dict(bucket.stats) for host, bucket in self.buckets.items()}
+
+class SharedRateLimiter:
+    """
+    Per-host budget shared by every shard process: tokens come from the
+    coordinator's buckets (launcher.py) and a 429 seen here backs off all
+    processes. If the coordinator can't be reached we fall back to a local
+    bucket with this process's share of the rate.
+    """
+    def __init__(self, url, processes, config=None):
+        self.url = url.rstrip("/")
+        self.local = RateLimiterRegistry(config)
+        # Our share of the budget while the coordinator is down
+        self.local.limits = {host: (rate / max(1, processes), burst) for host, (rate, burst) in self.local.limits.items()}
+        self.stats = {}
+        self._background = set()
+
+    def _host_stats(self, host):
+        if host not in self.stats:
+            self.stats[host] = {'acquired': 0, 'delayed': 0, 'wait_seconds': 0.0, 'throttled': 0, 'fallbacks': 0}
+        return self.stats[host]
+
+    async def acquire(self, host):
+        stats = self._host_stats(host)
+        started = time.monotonic()
+        try:
+            async with http_client.get_session().post(f"{self.url}/ratelimit/{host}/acquire") as response:
+                response.raise_for_status()
+                await response.read()
+        except Exception as e:
+            print(f"Shared rate limit for {host} unavailable ({e}), using the local share.")
+            stats['fallbacks'] += 1
+            await self.local.acquire(host)
+        # Includes the round-trip to the coordinator, which is what the caller actually waited
+        waited = time.monotonic() - started
+        stats['acquired'] += 1
+        if waited > 0.05:
+            stats['delayed'] += 1
+            stats['wait_seconds'] += waited
+        return waited
+
+    def penalize(self, host, retry_after=None):
+        self._host_stats(host)['throttled'] += 1
+        # The coordinator makes every process back off; the local share does too in case we fall back to it
+        self.local.penalize(host, retry_after)
+        task = asyncio.create_task(self._report_penalty(host, retry_after))
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    async def _report_penalty(self, host, retry_after):
+        try:
+            async with http_client.get_session().post(f"{self.url}/ratelimit/{host}/penalize", json={'retry_after': retry_after}) as response:
+                await response.read()
+        except Exception as e:
+            print(f"Couldn't share the {host} back-off with the coordinator: {e}")
+
+    def get_stats(self):
+        return {host: dict(stats) for host, stats in self.stats.items()}
+
+# Shared instance so every caller draws from the same per-host budget
+# (across processes too, when running under launcher.py)
+if settings.COORDINATOR_URL:
+    rate_limiter = SharedRateLimiter(settings.COORDINATOR_URL, settings.SHARD_PROCESSES)
+else:
+    rate_limiter = RateLimiterRegistry()
@@ -1,10 +1,329 @@
-import aiohttp
 import asyncio
 import json
+import time
 import uuid
 import base64
 import io
+from collections import OrderedDict
 from config import settings
+from integrations.http_client import http_client
+from integrations.cluster import correlation_prefix
+from integrations.image_payload import ImagePayload
+from integrations.provider_router import provider_router
+
+def _encode_image(image_data):
+    return base64.b64encode(image_data).decode('utf-8')
+
+class ControlImageCache:
+    """
+    Bounded cache of downloaded + base64-encoded ControlNet reference images.
+    Entries are reused without a network call while fresh, then revalidated
+    with ETag / Last-Modified so unchanged avatars come back as a cheap 304.
+    """
+    def __init__(self, max_entries=None, max_bytes=None, fresh_seconds=None):
+        self.max_entries = max_entries if max_entries is not None else settings.CONTROL_IMAGE_CACHE_SIZE
+        self.max_bytes = max_bytes if max_bytes is not None else settings.CONTROL_IMAGE_CACHE_MAX_BYTES
+        self.fresh_seconds = fresh_seconds if fresh_seconds is not None else settings.CONTROL_IMAGE_FRESH_SECONDS
+        self._entries = OrderedDict() # url -> {encoded, etag, last_modified, validated_at}
+        self._inflight = {} # url -> asyncio.Future (one download per URL at a time)
+        self.total_bytes = 0
+        self.stats = {'hits': 0, 'revalidated': 0, 'downloads': 0, 'errors': 0, 'evictions': 0}
+
+    def _store(self, url, entry):
+        old = self._entries.pop(url, None)
+        if old:
+            self.total_bytes -= len(old['encoded'])
+        self._entries[url] = entry
+        self.total_bytes += len(entry['encoded'])
+        while self._entries and (len(self._entries) > self.max_entries or self.total_bytes > self.max_bytes):
+            _, evicted = self._entries.popitem(last=False)
+            self.total_bytes -= len(evicted['encoded'])
+            self.stats['evictions'] += 1
+
+    async def get(self, url):
+        entry = self._entries.get(url)
+        if entry and time.monotonic() - entry['validated_at'] < self.fresh_seconds:
+            self._entries.move_to_end(url)
+            self.stats['hits'] += 1
+            return entry['encoded']
+
+        # Concurrent scenes often want the same avatar - share one download
+        if url in self._inflight:
+            return await asyncio.shield(self._inflight[url])
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[url] = future
+        encoded = None
+        try:
+            encoded = await self._fetch(url, entry)
+            return encoded
+        finally:
+            # Always release waiters, even if this download was cancelled
+            del self._inflight[url]
+            future.set_result(encoded)
+
+    async def _fetch(self, url, entry):
+        headers = {}
+        if entry:
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+
+        try:
+            session = http_client.get_session()
+            async with session.get(url, headers=headers) as response:
+                if response.status == 304 and entry:
+                    entry['validated_at'] = time.monotonic()
+                    self._entries.move_to_end(url)
+                    self.stats['revalidated'] += 1
+                    return entry['encoded']
+
+                if response.status != 200:
+                    print(f"Failed to download control image: {response.status}")
+                    self.stats['errors'] += 1
+                    # A stale copy beats no ControlNet at all
+                    return entry['encoded'] if entry else None
+
+                image_data = await response.read()
+                etag = response.headers.get('ETag')
+                last_modified = response.headers.get('Last-Modified')
+        except Exception as e:
+            print(f"Error downloading control image: {e}")
+            self.stats['errors'] += 1
+            return entry['encoded'] if entry else None
+
+        # base64 of a ~1MB avatar is CPU work - keep it off the event loop
+        encoded = await asyncio.to_thread(_encode_image, image_data)
+        self.stats['downloads'] += 1
+        self._store(url, {
+            'encoded': encoded,
+            'etag': etag,
+            'last_modified': last_modified,
+            'validated_at': time.monotonic(),
+        })
+        return encoded
+
+    def get_stats(self):
+        return {**self.stats, 'entries': len(self._entries), 'bytes': self.total_bytes}
+
+class PendingRequestRegistry:
+    """
+    Outstanding Supermachine generations, keyed by correlation id.
+    Entries leave on completion, cancellation or TTL expiry, so losing racers,
+    timeouts and webhooks that never come can't pile up futures forever.
+    Recently closed ids are remembered to tell late webhooks from unknown ones.
+    on_expire(generation_id) is called for expired generations still running upstream.
+    """
+    def __init__(self, ttl=None, max_outstanding=None, remember_closed=256, on_expire=None):
+        self.on_expire = on_expire
+        self.ttl = ttl if ttl is not None else settings.SUPERMACHINE_PENDING_TTL
+        self.max_outstanding = max_outstanding if max_outstanding is not None else settings.SUPERMACHINE_MAX_OUTSTANDING
+        self.remember_closed = remember_closed
+        self._entries = {} # correlation_id -> {'future', 'generation_id', 'created_at'}
+        self._closed = OrderedDict() # correlation_id -> reason
+        self._slot_waiters = [] # futures of racers waiting for a free slot
+        self.stats = {'registered': 0, 'completed': 0, 'cancelled': 0, 'expired': 0, 'rejected': 0, 'waited': 0, 'late_arrivals': 0, 'unknown_arrivals': 0}
+
+    def __contains__(self, correlation_id):
+        return correlation_id in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    async def register(self, correlation_id, timeout=0):
+        """
+        Reserves a slot for a new generation and returns its future. At the cap,
+        waits up to `timeout` seconds for a slot to free up; None if none did.
+        """
+        loop = asyncio.get_running_loop()
+        give_up_at = loop.time() + timeout
+        waited = False
+        while True:
+            self.sweep()
+            if len(self._entries) < self.max_outstanding:
+                break
+            remaining = give_up_at - loop.time()
+            if remaining <= 0:
+                self.stats['rejected'] += 1
+                return None
+            if not waited:
+                waited = True
+                self.stats['waited'] += 1
+            waiter = loop.create_future()
+            self._slot_waiters.append(waiter)
+            try:
+                # Wake up now and then anyway: slots held by stale entries only free up on a sweep
+                await asyncio.wait_for(waiter, timeout=min(remaining, 5))
+            except asyncio.TimeoutError:
+                pass
+            finally:
+                if waiter in self._slot_waiters:
+                    self._slot_waiters.remove(waiter)
+        future = loop.create_future()
+        self._entries[correlation_id] = {'future': future, 'generation_id': None, 'created_at': time.monotonic()}
+        self.stats['registered'] += 1
+        return future
+
+    def set_generation_id(self, correlation_id, generation_id):
+        if correlation_id in self._entries:
+            self._entries[correlation_id]['generation_id'] = generation_id
+
+    def resolve(self, correlation_id, image_url=None, error=None):
+        """Delivers a webhook result. Returns False for late or unknown ids."""
+        self.sweep()
+        entry = self._entries.get(correlation_id)
+        if entry is None:
+            if correlation_id in self._closed:
+                self.stats['late_arrivals'] += 1
+                print(f"Late webhook for {correlation_id} (already {self._closed[correlation_id]}), ignoring.")
+            else:
+                self.stats['unknown_arrivals'] += 1
+                print(f"Received webhook for unknown ID: {correlation_id}")
+            return False
+
+        future = entry['future']
+        if not future.done():
+            if image_url:
+                future.set_result(image_url)
+            else:
+                future.set_exception(error or Exception("No image URL found in webhook"))
+        return True
+
+    def close(self, correlation_id, reason):
+        """Removes an entry for good. reason is 'completed' or 'cancelled'."""
+        entry = self._entries.pop(correlation_id, None)
+        if entry is None:
+            return
+        if not entry['future'].done():
+            entry['future'].cancel()
+        self.stats[reason] += 1
+        self._remember(correlation_id, reason)
+        self._wake()
+
+    def sweep(self):
+        """Expires entries older than the TTL."""
+        now = time.monotonic()
+        expired = [cid for cid, entry in self._entries.items() if now - entry['created_at'] > self.ttl]
+        for correlation_id in expired:
+            entry = self._entries.pop(correlation_id)
+            if not entry['future'].done():
+                entry['future'].cancel()
+            if entry['generation_id'] and self.on_expire:
+                self.on_expire(entry['generation_id'])
+            self.stats['expired'] += 1
+            self._remember(correlation_id, 'expired')
+        if expired:
+            print(f"🧹 Expired {len(expired)} stale Supermachine requests.")
+            self._wake()
+
+    def _wake(self):
+        """Lets waiting racers re-check for a free slot."""
+        for waiter in self._slot_waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+        self._slot_waiters = []
+
+    def _remember(self, correlation_id, reason):
+        self._closed[correlation_id] = reason
+        while len(self._closed) > self.remember_closed:
+            self._closed.popitem(last=False)
+
+    def get_stats(self):
+        self.sweep()
+        return {**self.stats, 'outstanding': len(self._entries)}
+
+def _jwt_expiry(token):
+    """Reads the `exp` claim from a JWT without verifying it. None if it isn't a JWT."""
+    try:
+        payload = token.split('.')[1]
+        payload += '=' * (-len(payload) % 4)
+        exp = json.loads(base64.urlsafe_b64decode(payload)).get('exp')
+        return float(exp) if exp else None
+    except Exception:
+        return None
+
+class TokenManager:
+    """
+    Supermachine auth token with a known lifetime.
+    Concurrent callers share one in-flight refresh, the token is renewed in
+    the background once it gets within SUPERMACHINE_TOKEN_REFRESH_MARGIN of
+    expiring, and a 401 only drops the token if nobody refreshed it already.
+    """
+    def __init__(self, api_key, auth_url):
+        self.api_key = api_key
+        self.auth_url = auth_url
+        self.token = None
+        self.expires_at = 0.0 # wall clock
+        self._lock = asyncio.Lock()
+        self._background = None
+        self.stats = {'refreshes': 0, 'failures': 0, 'invalidations': 0}
+
+    def _is_valid(self):
+        return bool(self.token) and time.time() < self.expires_at
+
+    def _needs_refresh(self):
+        return time.time() >= self.expires_at - settings.SUPERMACHINE_TOKEN_REFRESH_MARGIN
+
+    async def get(self):
+        if self._is_valid():
+            if self._needs_refresh() and not self._lock.locked() and (self._background is None or self._background.done()):
+                # Still usable - renew ahead of expiry without making this caller wait
+                self._background = asyncio.create_task(self.refresh(self.token))
+            return self.token
+        return await self.refresh(self.token)
+
+    async def refresh(self, stale_token=None):
+        """Single-flight: whoever holds the lock fetches, everyone else reuses the result."""
+        async with self._lock:
+            if self.token != stale_token and self._is_valid():
+                return self.token
+            token = await self._fetch()
+            if token:
+                self.token = token
+                self.expires_at = _jwt_expiry(token) or time.time() + settings.SUPERMACHINE_TOKEN_TTL
+                self.stats['refreshes'] += 1
+            else:
+                self.stats['failures'] += 1
+            # An expired token is no use; a near-expiry one still is
+            return self.token if self._is_valid() else None
+
+    def invalidate(self, token):
+        """Called on a 401. Ignored if the token was already replaced."""
+        if token and token == self.token:
+            self.token = None
+            self.expires_at = 0.0
+            self.stats['invalidations'] += 1
+
+    async def prewarm(self):
+        if self.api_key and await self.get():
+            print("Supermachine token pre-warmed.")
+
+    async def _fetch(self):
+        print("Authenticating with Supermachine...")
+        try:
+            session = http_client.get_session()
+            payload = {"apiKey": self.api_key}
+            headers = {"Content-Type": "application/json"}
+            
+            async with session.post(self.auth_url, json=payload, headers=headers) as response:
+                if response.status != 200:
+                    text = await response.text()
+                    print(f"Supermachine Auth Error: {response.status} - {text}")
+                    return None
+                
+                data = await response.json()
+                # The API returns 'authToken'
+                token = data.get('authToken')
+                if not token:
+                    print(f"Supermachine Auth Failed. Response keys: {data.keys()}")
+                    return None
+                    
+                print("Supermachine Authentication Successful.")
+                return token
+        except Exception as e:
+            print(f"Supermachine Auth Exception: {e}")
+            return None
 
 class SupermachineImageGenerator:
     def __init__(self):
@@ -12,58 +331,48 @@ class SupermachineImageGenerator:
         self.auth_url = "https://api.supermachine.art/v1/auth/token"
         self.api_url = "https://api.supermachine.art/v1/generate"
         self.webhook_base_url = None # Will be set when tunnel starts
-        self.pending_requests = {} # correlation_id -> asyncio.Future
-        self.access_token = None
+        # Expired generations are still running upstream - stop them
+        self.pending_requests = PendingRequestRegistry(on_expire=lambda generation_id: self._spawn(self._cancel_generation(generation_id)))
+        self.tokens = TokenManager(self.api_key, self.auth_url)
+        self.control_images = ControlImageCache()
+        # "webhook" = webhook only (default). "race" = webhook vs status poll and "poll" = no public
+        # webhook are opt-in: they rely on GET/DELETE {api_url}/{generation_id}, which Supermachine doesn't document
+        self.completion_mode = settings.SUPERMACHINE_COMPLETION_MODE
+        self._background_tasks = set()
 
     def set_webhook_url(self, url):
         self.webhook_base_url = url
         print(f"Supermachine Webhook URL set to: {url}")
 
     async def get_access_token(self):
-        if self.access_token:
-            return self.access_token
-
-        print("Authenticating with Supermachine...")
-        try:
-            async with aiohttp.ClientSession() as session:
-                payload = {"apiKey": self.api_key}
-                headers = {"Content-Type": "application/json"}
-                
-                async with session.post(self.auth_url, json=payload, headers=headers) as response:
-                    if response.status != 200:
-                        text = await response.text()
-                        print(f"Supermachine Auth Error: {response.status} - {text}")
-                        return None
-                    
-                    data = await response.json()
-                    # The API returns 'authToken'
-                    self.access_token = data.get('authToken')
-                    if not self.access_token:
-                        print(f"Supermachine Auth Failed. Response keys: {data.keys()}")
-                        return None
-                        
-                    print("Supermachine Authentication Successful.")
-                    return self.access_token
-        except Exception as e:
-            print(f"Supermachine Auth Exception: {e}")
-            return None
+        return await self.tokens.get()
 
     async def _download_and_encode_image(self, url):
-        try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url) as response:
-                    if response.status == 200:
-                        image_data = await response.read()
-                        return base64.b64encode(image_data).decode('utf-8')
-                    else:
-                        print(f"Failed to download control image: {response.status}")
-                        return None
-        except Exception as e:
-            print(f"Error downloading control image: {e}")
+        return await self.control_images.get(url)
+
+    def is_available(self):
+        """Webhook mode needs a public URL; poll and race modes only need the API."""
+        if not self.api_key:
+            return False
+        if self.completion_mode == "webhook":
+            return bool(self.webhook_base_url)
+        return True
+
+    def _uses_webhook(self):
+        return bool(self.webhook_base_url) and self.completion_mode != "poll"
+
+    def _extract_image_url(self, data):
+        if not isinstance(data, dict):
             return None
+        image_url = data.get('imageUrl') or data.get('url') or data.get('output_url')
+        if not image_url:
+            # Check for 'images' array
+            if 'images' in data and isinstance(data['images'], list) and len(data['images']) > 0:
+                image_url = data['images'][0].get('url')
+        return image_url
 
-    async def generate_image(self, prompt, control_image_url=None):
-        if not self.webhook_base_url:
+    async def generate_image(self, prompt, control_image_url=None, deadline=None):
+        if not self.is_available():
             print("Error: Webhook URL not set. Cannot use Supermachine.")
             return None
 
@@ -75,18 +384,24 @@ class SupermachineImageGenerator:
         # Pre-process ControlNet image if needed (do this once)
         encoded_control_image = None
         if control_image_url:
-            print(f"Downloading control image from: {control_image_url}")
+            print(f"Loading control image from: {control_image_url}")
             encoded_control_image = await self._download_and_encode_image(control_image_url)
             if not encoded_control_image:
                 print("Skipping ControlNet due to download failure.")
 
-        # Define the race
-        RACER_COUNT = 1
-        correlation_ids = []
+        use_webhook = self._uses_webhook()
+        # How long the first racer may queue for a slot during a burst
+        slot_wait = min(settings.SUPERMACHINE_TIMEOUT, deadline.remaining()) if deadline else settings.SUPERMACHINE_TIMEOUT
 
         async def launch_racer(racer_idx):
-            correlation_id = str(uuid.uuid4())
-            webhook_url = f"{self.webhook_base_url}/webhook/supermachine/{correlation_id}"
+            # Prefixed with our process index under launcher.py so the coordinator can route the webhook back
+            correlation_id = f"{correlation_prefix()}{uuid.uuid4()}"
+            # Reserve a slot first so a backlog of slow generations can't grow without bound.
+            # The first racer waits for one; the backup racer is only sent if a slot is free right now
+            future = await self.pending_requests.register(correlation_id, timeout=slot_wait if racer_idx == 1 else 0)
+            if future is None:
+                print(f"Racer #{racer_idx} held back: {self.pending_requests.max_outstanding} generations already outstanding.")
+                return None
             
             payload = {
                 "prompt": prompt,
@@ -96,8 +411,9 @@ class SupermachineImageGenerator:
                 "height": 1024,
                 "imageNumber": 1,
                 "generationMode": "GENERATE",
-                "webhookUrl": webhook_url,
             }
+            if use_webhook:
+                payload["webhookUrl"] = f"{self.webhook_base_url}/webhook/supermachine/{correlation_id}"
 
             if encoded_control_image:
                 payload["refImage"] = encoded_control_image
@@ -113,103 +429,191 @@ class SupermachineImageGenerator:
             print(f"🏎️ Racer #{racer_idx} starting... (ID: {correlation_id})")
             
             try:
-                async with aiohttp.ClientSession() as session:
-                    async with session.post(self.api_url, json=payload, headers=headers) as response:
-                        if response.status != 200:
-                            text = await response.text()
-                            print(f"Racer #{racer_idx} Crashed: {response.status} - {text}")
-                            if response.status == 401:
-                                self.access_token = None
-                            return None
-                        
-                        data = await response.json()
-                        generation_id = data.get('id') # Capture the ID
-                        print(f"🏎️ Racer #{racer_idx} started! Gen ID: {generation_id}")
-
-                        # Register the future
-                        loop = asyncio.get_running_loop()
-                        future = loop.create_future()
-                        
-                        # Store both the future AND the generation ID for polling
-                        self.pending_requests[correlation_id] = {
-                            'future': future,
-                            'generation_id': generation_id
-                        }
-                        correlation_ids.append(correlation_id)
-                        return future
+                session = http_client.get_session()
+                async with session.post(self.api_url, json=payload, headers=headers) as response:
+                    if response.status != 200:
+                        text = await response.text()
+                        print(f"Racer #{racer_idx} Crashed: {response.status} - {text}")
+                        if response.status == 401:
+                            self.tokens.invalidate(token)
+                        self.pending_requests.close(correlation_id, 'cancelled')
+                        return None
+                    
+                    data = await response.json()
+                    generation_id = data.get('id') # Capture the ID
+                    print(f"🏎️ Racer #{racer_idx} started! Gen ID: {generation_id}")
+
+                    # Store the generation ID for polling and cancellation
+                    self.pending_requests.set_generation_id(correlation_id, generation_id)
+                    return correlation_id, generation_id, future if use_webhook else None
             except Exception as e:
                 print(f"Racer #{racer_idx} Exception: {e}")
+                self.pending_requests.close(correlation_id, 'cancelled')
                 return None
 
         # Launch all racers concurrently
         # RACER_COUNT increased for redundancy
         RACER_COUNT = 2
         print(f"🏁 Starting Race with {RACER_COUNT} requests...")
-        launch_tasks = [launch_racer(i+1) for i in range(RACER_COUNT)]
-        futures = await asyncio.gather(*launch_tasks)
+        launched = await asyncio.gather(*[launch_racer(i+1) for i in range(RACER_COUNT)])
         
         # Filter out any that failed to launch
-        valid_futures = [f for f in futures if f is not None]
+        launched = [r for r in launched if r is not None]
         
-        if not valid_futures:
+        if not launched:
             print("❌ All racers failed to leave the starting line.")
             return None
 
-        # Wait for the first one to cross the finish line (Webhook ONLY)
+        # Each racer finishes on its webhook or its status poll, whichever lands first
+        racers = {
+            asyncio.create_task(self._await_completion(correlation_id, generation_id, future)): (correlation_id, generation_id)
+            for correlation_id, generation_id, future in launched
+        }
+        print(f"⏱️ Waiting for the winner ({self.completion_mode} mode, webhook {'on' if use_webhook else 'off'})...")
+
         try:
-            print(f"⏱️ Waiting for the winner (Webhook Only Mode)...")
-            
-            # Wait for the webhook to resolve the future
-            done, pending = await asyncio.wait(valid_futures, return_when=asyncio.FIRST_COMPLETED, timeout=220)
-            
-            if done:
-                winner_future = done.pop()
-                image_url = winner_future.result()
-                print(f"🏆 We have a winner! URL: {image_url}")
-                return await self._download_image(image_url)
-            else:
-                print("❌ Webhook timed out. No finishers.")
-                return None
+            loop = asyncio.get_running_loop()
+            # Stop waiting at the battle deadline even if Supermachine would allow longer
+            timeout = min(settings.SUPERMACHINE_TIMEOUT, deadline.remaining()) if deadline else settings.SUPERMACHINE_TIMEOUT
+            give_up_at = loop.time() + timeout
+            while racers:
+                remaining = give_up_at - loop.time()
+                if remaining <= 0:
+                    break
+                done, _ = await asyncio.wait(racers.keys(), timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    break
+                for task in done:
+                    correlation_id, _ = racers.pop(task)
+                    try:
+                        image_url = task.result()
+                    except Exception as e:
+                        print(f"Racer failed: {e}")
+                        image_url = None
+                    if image_url:
+                        self.pending_requests.close(correlation_id, 'completed')
+                        print(f"🏆 We have a winner! URL: {image_url}")
+                        return await self._download_image(image_url)
+                    self.pending_requests.close(correlation_id, 'cancelled')
+
+            print("❌ Supermachine timed out. No finishers.")
+            return None
 
         except Exception as e:
             print(f"Race Critical Error: {e}")
             return None
+        finally:
+            # Stop the losers, both locally and on Supermachine's side
+            for task, (correlation_id, generation_id) in racers.items():
+                task.cancel()
+                self.pending_requests.close(correlation_id, 'cancelled')
+                if generation_id:
+                    self._spawn(self._cancel_generation(generation_id))
+
+    async def _await_completion(self, correlation_id, generation_id, future):
+        """Resolves with the image URL from whichever comes first: the webhook or a status poll."""
+        waiters = {}
+        if future is not None:
+            waiters[future] = "webhook"
+        if generation_id and self.completion_mode != "webhook":
+            waiters[asyncio.create_task(self._poll_generation(generation_id))] = "poll"
+        if not waiters:
+            return None
+
+        try:
+            while waiters:
+                done, _ = await asyncio.wait(waiters.keys(), return_when=asyncio.FIRST_COMPLETED)
+                for waiter in done:
+                    source = waiters.pop(waiter)
+                    try:
+                        image_url = waiter.result()
+                    except Exception as e:
+                        print(f"Supermachine {source} failed for {correlation_id}: {e}")
+                        continue
+                    if image_url:
+                        print(f"📬 Generation {generation_id} completed via {source}")
+                        return image_url
+            return None
+        finally:
+            for waiter in waiters:
+                waiter.cancel()
+
+    async def _poll_generation(self, generation_id):
+        """Polls the generation status with exponential backoff until it has an image."""
+        delay = settings.SUPERMACHINE_POLL_INITIAL
+        # No point asking much earlier than generations usually take
+        typical = provider_router.percentile("supermachine", 0.5, min_samples=3)
+        if typical:
+            delay = max(delay, typical * 0.5)
+
+        while True:
+            await asyncio.sleep(delay)
+            data = await self._fetch_generation(generation_id)
+            if data:
+                image_url = self._extract_image_url(data)
+                if image_url:
+                    return image_url
+                status = str(data.get('status', '')).upper()
+                if status in ("FAILED", "ERROR", "CANCELLED", "CANCELED"):
+                    raise Exception(f"Generation {generation_id} ended with status {status}")
+            delay = min(settings.SUPERMACHINE_POLL_MAX, delay * settings.SUPERMACHINE_POLL_BACKOFF)
+
+    async def _fetch_generation(self, generation_id):
+        token = await self.get_access_token()
+        if not token:
+            return None
+        headers = {"Authorization": f"Bearer {token}"}
+        try:
+            session = http_client.get_session()
+            async with session.get(f"{self.api_url}/{generation_id}", headers=headers) as response:
+                if response.status == 401:
+                    self.tokens.invalidate(token)
+                    return None
+                if response.status == 404:
+                    # Not "not ready yet": the status endpoint is a guess, so a 404 most likely means it doesn't exist
+                    print(f"⚠️ Supermachine status poll got 404 for {generation_id} (GET {self.api_url}/{generation_id}). "
+                          f"Is SUPERMACHINE_COMPLETION_MODE={self.completion_mode} supported? Use 'webhook' if not.")
+                    raise Exception(f"Status endpoint returned 404 for {generation_id}")
+                if response.status != 200:
+                    return None
+                return await response.json()
+        except Exception as e:
+            print(f"Supermachine Poll Error ({generation_id}): {e}")
+            return None
+
+    async def _cancel_generation(self, generation_id):
+        """Best-effort cancel of a generation nobody is waiting for any more."""
+        if self.completion_mode == "webhook":
+            # Same undocumented endpoint family as the status poll - only used when poll/race is opted into
+            return
+        token = await self.get_access_token()
+        if not token:
+            return
+        try:
+            session = http_client.get_session()
+            async with session.delete(f"{self.api_url}/{generation_id}", headers={"Authorization": f"Bearer {token}"}) as response:
+                if response.status not in (200, 202, 204):
+                    print(f"Supermachine cancel for {generation_id} returned {response.status}")
+        except Exception as e:
+            print(f"Supermachine Cancel Error ({generation_id}): {e}")
+
+    def _spawn(self, coro):
+        # Keep a reference so fire-and-forget tasks aren't garbage collected mid-flight
+        task = asyncio.create_task(coro)
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
 
     async def handle_webhook(self, correlation_id, data):
         print(f"DEBUG: Webhook Payload Received: {data}") 
-        if correlation_id in self.pending_requests:
+        image_url = self._extract_image_url(data)
+        if not image_url:
+            print(f"Webhook data missing 'imageUrl': {data}")
+        if self.pending_requests.resolve(correlation_id, image_url=image_url):
             print(f"Webhook received for ID: {correlation_id}")
-            
-            # Resolve the future
-            future_info = self.pending_requests[correlation_id]
-            # Handle both new dict format and legacy future format (just in case)
-            future = future_info['future'] if isinstance(future_info, dict) else future_info
-
-            if not future.done():
-                # Extract URL from webhook data
-                image_url = data.get('imageUrl') or data.get('url') or data.get('output_url')
-                
-                if not image_url:
-                    # Check for 'images' array
-                    if 'images' in data and isinstance(data['images'], list) and len(data['images']) > 0:
-                        image_url = data['images'][0].get('url')
-
-                if image_url:
-                    future.set_result(image_url)
-                else:
-                    print(f"Webhook data missing 'imageUrl': {data}")
-                    future.set_exception(Exception("No image URL found in webhook"))
-            
-            # Cleanup
-            if correlation_id in self.pending_requests:
-                del self.pending_requests[correlation_id]
-        else:
-            print(f"Received webhook for unknown ID: {correlation_id}")
 
     async def _download_image(self, url):
-        import io
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url) as response:
-                if response.status == 200:
-                    return io.BytesIO(await response.read())
+        session = http_client.get_session()
+        async with session.get(url) as response:
+            if response.status == 200:
+                return await ImagePayload.from_response(response)
         return None
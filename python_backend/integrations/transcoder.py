@@ -0,0 +1,100 @@
+import asyncio
+import io
+import time
+from concurrent.futures import ProcessPoolExecutor
+from config import settings
+from integrations.image_payload import ImagePayload
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None # Transcoding is skipped, images are uploaded as generated
+
+def _transcode(data, fmt, quality, max_dimension):
+    """Runs in a worker process. Returns the re-encoded bytes."""
+    image = Image.open(io.BytesIO(data))
+    image.load()
+    if max_dimension and max(image.size) > max_dimension:
+        image.thumbnail((max_dimension, max_dimension), Image.LANCZOS)
+
+    out = io.BytesIO()
+    if fmt == "jpeg":
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+        image.save(out, format="JPEG", quality=quality, optimize=True, progressive=True)
+    else:
+        image.save(out, format="WEBP", quality=quality, method=4)
+    return out.getvalue()
+
+class ImageTranscoder:
+    """
+    Re-encodes scene images (WebP or optimized JPEG, optionally downsized)
+    in a process pool so uploads to Discord are smaller and the event loop
+    never runs the encoder. The original is kept if transcoding fails or
+    doesn't make the file smaller.
+    """
+    def __init__(self):
+        self.format = settings.IMAGE_TRANSCODE_FORMAT
+        self.quality = settings.IMAGE_TRANSCODE_QUALITY
+        self.max_dimension = settings.IMAGE_MAX_DIMENSION
+        self.workers = settings.IMAGE_TRANSCODE_WORKERS
+        self._pool = None
+        self.stats = {'images': 0, 'skipped': 0, 'failures': 0, 'bytes_in': 0, 'bytes_out': 0, 'seconds': 0.0}
+
+        if Image is None and self.format != "off":
+            print("Pillow not installed - scene images will be uploaded without transcoding.")
+
+    def enabled(self):
+        return Image is not None and self.format in ("webp", "jpeg")
+
+    def _get_pool(self):
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        return self._pool
+
+    async def transcode(self, payload):
+        """Returns a new, smaller payload (closing the original) or the original untouched."""
+        if not payload or not self.enabled():
+            return payload
+
+        started = time.monotonic()
+        try:
+            loop = asyncio.get_running_loop()
+            # A spooled payload is read back from disk - keep that off the event loop too
+            raw = await asyncio.to_thread(payload.getvalue)
+            data = await loop.run_in_executor(
+                self._get_pool(), _transcode, raw, self.format, self.quality, self.max_dimension
+            )
+        except Exception as e:
+            print(f"Transcode failed, uploading original: {e}")
+            self.stats['failures'] += 1
+            return payload
+
+        if len(data) >= payload.size and not self.max_dimension:
+            self.stats['skipped'] += 1
+            return payload
+
+        transcoded = ImagePayload.from_bytes(data)
+        if not transcoded:
+            return payload
+
+        elapsed = time.monotonic() - started
+        self.stats['images'] += 1
+        self.stats['bytes_in'] += payload.size
+        self.stats['bytes_out'] += transcoded.size
+        self.stats['seconds'] += elapsed
+        print(f"🗜️ Transcoded scene to {self.format}: {payload.size / 1024:.0f} KB -> {transcoded.size / 1024:.0f} KB in {elapsed:.2f}s")
+        payload.close()
+        return transcoded
+
+    def get_stats(self):
+        saved = self.stats['bytes_in'] - self.stats['bytes_out']
+        return {**self.stats, 'saved_bytes': saved, 'enabled': self.enabled()}
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+# Shared instance (one process pool for the whole bot)
+transcoder = ImageTranscoder()
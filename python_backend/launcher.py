@@ -0,0 +1,92 @@
+"""
+Multi-process launcher for large deployments.
+
+Splits the bot's shards over SHARD_PROCESSES processes on this host (each one
+runs main.py with SHARDING=auto and its own SHARD_IDS) and runs the
+coordinator that ties them together: the public webhook port, provider rate
+limits shared by every process, and shard metrics for /admin_shards.
+Crashed processes are restarted.
+
+    SHARD_PROCESSES=4 python python_backend/launcher.py
+"""
+import asyncio
+import os
+import sys
+import aiohttp
+from config import settings
+from integrations.cluster import Coordinator
+from integrations.http_client import http_client
+
+MAIN = os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py")
+RESTART_DELAY = 10
+
+async def recommended_shard_count():
+    """Discord's recommended shard count for this bot token."""
+    headers = {"Authorization": f"Bot {settings.DISCORD_TOKEN}"}
+    async with http_client.get_session().get("https://discord.com/api/v10/gateway/bot", headers=headers) as response:
+        response.raise_for_status()
+        data = await response.json()
+    return int(data["shards"])
+
+def split_shards(shard_count, processes):
+    """Shard ids per process, as even as possible: 10 over 3 -> [0,1,2,3], [4,5,6], [7,8,9]."""
+    processes = max(1, min(processes, shard_count))
+    base, extra = divmod(shard_count, processes)
+    groups, start = [], 0
+    for index in range(processes):
+        size = base + (1 if index < extra else 0)
+        groups.append(list(range(start, start + size)))
+        start += size
+    return groups
+
+async def run_process(index, shard_ids, shard_count, processes):
+    env = dict(
+        os.environ,
+        SHARDING="auto",
+        SHARD_COUNT=str(shard_count),
+        SHARD_IDS=",".join(str(i) for i in shard_ids),
+        SHARD_PROCESSES=str(processes),
+        PROCESS_INDEX=str(index),
+        WEBHOOK_PORT=str(settings.SHARD_WEBHOOK_BASE_PORT + index),
+        COORDINATOR_URL=f"http://127.0.0.1:{settings.COORDINATOR_PORT}",
+    )
+    while True:
+        print(f"🚀 Starting process {index} (shards {shard_ids[0]}-{shard_ids[-1]} of {shard_count})")
+        proc = await asyncio.create_subprocess_exec(sys.executable, MAIN, env=env)
+        try:
+            code = await proc.wait()
+        except asyncio.CancelledError:
+            proc.terminate()
+            await proc.wait()
+            raise
+        print(f"💥 Process {index} exited with code {code}. Restarting in {RESTART_DELAY}s...")
+        await asyncio.sleep(RESTART_DELAY)
+
+async def main():
+    if not settings.DISCORD_TOKEN:
+        print("Error: DISCORD_TOKEN not found in environment variables.")
+        return
+
+    shard_count = settings.SHARD_COUNT
+    if not shard_count:
+        try:
+            shard_count = await recommended_shard_count()
+        except aiohttp.ClientError as e:
+            print(f"Couldn't ask Discord for a shard count ({e}). Set SHARD_COUNT.")
+            return
+    groups = split_shards(shard_count, settings.SHARD_PROCESSES)
+    print(f"🧩 {shard_count} shards over {len(groups)} processes")
+
+    coordinator = Coordinator(len(groups))
+    await coordinator.start()
+    try:
+        await asyncio.gather(*(run_process(i, ids, shard_count, len(groups)) for i, ids in enumerate(groups)))
+    finally:
+        await coordinator.stop()
+        await http_client.close()
+
+if __name__ == '__main__':
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
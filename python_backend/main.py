@@ -5,19 +5,46 @@ import asyncio
 import os
 from aiohttp import web
 from integrations.supermachine import SupermachineImageGenerator
+from integrations.http_client import http_client
+from integrations.transcoder import transcoder
+from integrations.cluster import ClusterClient
+from database.db_manager import init_db, async_engine
+from database.players import daily_limiter
 
 # Initialize Supermachine Generator (Global)
 supermachine_gen = SupermachineImageGenerator()
 # Set the Webhook URL from environment variable or default to localtunnel
-webhook_url = os.getenv("WEBHOOK_URL", "https://rare-pots-leave.loca.lt")
-supermachine_gen.set_webhook_url(webhook_url)
+# In poll mode Supermachine results are fetched by status polling, no public webhook needed
+if settings.SUPERMACHINE_COMPLETION_MODE != "poll":
+    webhook_url = os.getenv("WEBHOOK_URL", "https://rare-pots-leave.loca.lt")
+    supermachine_gen.set_webhook_url(webhook_url)
+else:
+    print("Supermachine running in poll-only mode (no webhook).")
 
 # Intent setup
 intents = discord.Intents.default()
 intents.message_content = True
 intents.members = True
 
-bot = commands.Bot(command_prefix='/', intents=intents, help_command=None)
+def build_bot():
+    """Plain Bot, or an AutoShardedBot with SHARDING=auto (optionally only SHARD_IDS, as set by launcher.py)."""
+    options = dict(command_prefix='/', intents=intents, help_command=None)
+    # Lazy chunking: member lists are fetched per guild when a command needs them
+    options['chunk_guilds_at_startup'] = settings.MEMBER_CHUNKING != "lazy"
+    if settings.SHARDING != "auto":
+        return commands.Bot(**options)
+
+    if settings.SHARD_COUNT:
+        options['shard_count'] = settings.SHARD_COUNT
+        if settings.SHARD_IDS:
+            options['shard_ids'] = settings.SHARD_IDS
+    print(f"Sharding on: {settings.SHARD_COUNT or 'recommended'} shards, running {settings.SHARD_IDS or 'all'} in this process")
+    return commands.AutoShardedBot(**options)
+
+bot = build_bot()
+cluster = ClusterClient()
+# /admin_reset in any shard process clears the daily-limit cache in all of them
+cluster.subscribe("daily_reset", lambda event: daily_limiter.forget())
 
 # --- Webhook Server ---
 async def handle_webhook(request):
@@ -42,9 +69,9 @@ async def start_web_server():
     app.router.add_get('/', handle_ping)
     runner = web.AppRunner(app)
     await runner.setup()
-    site = web.TCPSite(runner, '0.0.0.0', 3000)
+    site = web.TCPSite(runner, '0.0.0.0', settings.WEBHOOK_PORT)
     await site.start()
-    print("Webhook Server started on port 3000")
+    print(f"Webhook Server started on port {settings.WEBHOOK_PORT}")
 
 @bot.event
 async def on_ready():
@@ -53,6 +80,11 @@ async def on_ready():
     # Inject the supermachine generator into the bot so cogs can access it
     bot.supermachine = supermachine_gen
     
+    # Every process runs the same tree - one sync is enough
+    if settings.PROCESS_INDEX != 0:
+        print('------')
+        return
+    
     try:
         if settings.DISCORD_GUILD_ID:
             guild = discord.Object(id=settings.DISCORD_GUILD_ID)
@@ -75,18 +107,35 @@ async def load_extensions():
 
 
 async def main():
+    # Make sure all tables exist (avatar cache, players, ...)
+    init_db()
+    
     # Start Web Server
     await start_web_server()
     
     # Inject Supermachine BEFORE loading extensions so Cogs can access it
     bot.supermachine = supermachine_gen
     
-    async with bot:
-        await load_extensions()
-        if settings.DISCORD_TOKEN:
-            await bot.start(settings.DISCORD_TOKEN)
-        else:
-            print("Error: DISCORD_TOKEN not found in environment variables.")
+    # Fetch the Supermachine token while Discord logs in, so the first battle doesn't pay for it
+    prewarm_task = asyncio.create_task(supermachine_gen.tokens.prewarm())
+    
+    # Under launcher.py: report shard latency/guild counts to the coordinator and follow cluster events
+    cluster.start(bot)
+    
+    try:
+        async with bot:
+            await load_extensions()
+            if settings.DISCORD_TOKEN:
+                await bot.start(settings.DISCORD_TOKEN)
+            else:
+                print("Error: DISCORD_TOKEN not found in environment variables.")
+    finally:
+        prewarm_task.cancel()
+        cluster.stop()
+        transcoder.shutdown()
+        # Close pooled provider connections on shutdown
+        await http_client.close()
+        await async_engine.dispose()
 
 if __name__ == '__main__':
     try:
@@ -0,0 +1,171 @@
+"""
+Generation worker for the job queue (JOB_QUEUE_ENABLED=true on the bot).
+
+Runs WORKER_PROCESSES processes, each working up to WORKER_CONCURRENCY jobs
+at once from the jobs table: scene/backdrop images through the hybrid
+generator and avatar descriptions through NVIDIA Vision. Workers have no
+public webhook, so Supermachine is only used with
+SUPERMACHINE_COMPLETION_MODE=poll. Progress goes back
+to the bot over its unix socket. Jobs are leased, so work from a crashed
+worker is picked up again, and queued jobs wait in the database while the
+bot or the workers restart. Crashed processes are restarted.
+
+    python python_backend/worker.py
+"""
+import asyncio
+import multiprocessing
+import os
+import socket
+import time
+from config import settings
+from database.db_manager import init_db
+from database.job_queue import JobQueue
+from engine.deadline import Deadline
+from integrations.http_client import http_client
+from integrations.hybrid_image import generate_hybrid_image
+from integrations.jobs import ProgressReporter
+from integrations.nvidia_image_generator import NvidiaImageGenerator
+from integrations.nvidia_vision import NvidiaVision
+from integrations.supermachine import SupermachineImageGenerator
+
+RESTART_DELAY = 5
+
+class Worker:
+    def __init__(self, index):
+        self.name = f"{socket.gethostname()}:{os.getpid()}:{index}"
+        self.queue = JobQueue()
+        self.reporter = ProgressReporter()
+        self.slots = asyncio.Semaphore(settings.WORKER_CONCURRENCY)
+        # Workers have no public webhook, so Supermachine only joins in when status polling was opted into
+        self.supermachine = SupermachineImageGenerator() if settings.SUPERMACHINE_COMPLETION_MODE == "poll" else None
+        self.artist = NvidiaImageGenerator()
+        self.vision = NvidiaVision()
+        self.handlers = {'image': self.run_image, 'vision': self.run_vision}
+        self.tasks = set()
+
+    async def run(self):
+        print(f"🛠️ Worker {self.name} ready ({settings.WORKER_CONCURRENCY} slots)")
+        while True:
+            await self.slots.acquire()
+            try:
+                claimed = await self.queue.claim(self.name, kinds=list(self.handlers))
+            except Exception as e:
+                print(f"Job claim failed: {e}")
+                claimed = None
+            if not claimed:
+                self.slots.release()
+                await asyncio.sleep(settings.JOB_POLL_INTERVAL)
+                continue
+            task = asyncio.create_task(self.execute(*claimed))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+
+    async def execute(self, job_id, kind, payload):
+        reply_to = payload.get('reply_to')
+        started = time.monotonic()
+        try:
+            await self.reporter.send(reply_to, job_id, "progress", message=f"started on {self.name}")
+            work = asyncio.create_task(self.handlers[kind](job_id, payload))
+            # Keep the lease alive while the job runs; a lost lease means it was cancelled
+            while True:
+                done, _ = await asyncio.wait({work}, timeout=settings.JOB_LEASE_SECONDS / 3)
+                if done:
+                    break
+                try:
+                    renewed = await self.queue.renew(job_id, self.name)
+                except Exception as e:
+                    # Can't prove we still hold the lease - stop, the job is picked up again when it lapses
+                    work.cancel()
+                    print(f"🛑 Job {job_id} ({kind}) lease renewal failed, dropping it: {e}")
+                    return
+                if not renewed:
+                    work.cancel()
+                    print(f"🛑 Job {job_id} ({kind}) was cancelled, dropping it")
+                    return
+
+            try:
+                result = work.result()
+            except Exception as e:
+                print(f"❌ Job {job_id} ({kind}) failed: {e}")
+                await self.queue.fail(job_id, e, worker=self.name)
+                await self.reporter.send(reply_to, job_id, "failed", error=str(e))
+                return
+
+            if not await self.queue.complete(job_id, result, worker=self.name):
+                # Cancelled while finishing up - nobody will collect the output
+                if result.get('path'):
+                    os.remove(result['path'])
+                return
+            print(f"✅ Job {job_id} ({kind}) done in {time.monotonic() - started:.1f}s")
+            await self.reporter.send(reply_to, job_id, "done")
+        finally:
+            self.slots.release()
+
+    async def run_image(self, job_id, payload):
+        deadline = Deadline(payload.get('budget') or settings.JOB_TIMEOUT, label=f"job {job_id}")
+        image = await generate_hybrid_image(
+            self.supermachine, self.artist, payload['prompt'],
+            prefer_nvidia=payload.get('prefer_nvidia', False),
+            control_image_url=payload.get('control_image_url'),
+            deadline=deadline,
+        )
+        if not image:
+            raise RuntimeError("No provider returned an image")
+        # Handed to the bot as a file rather than through the database
+        path = os.path.abspath(os.path.join(settings.JOB_OUTPUT_DIR, f"{job_id}.{image.extension}"))
+        try:
+            await asyncio.to_thread(self._write_output, path, image)
+        finally:
+            image.close()
+        return {'path': path, 'size': image.size}
+
+    def _write_output(self, path, image):
+        image.fp.seek(0)
+        with open(path, "wb") as f:
+            while chunk := image.fp.read(64 * 1024):
+                f.write(chunk)
+
+    async def run_vision(self, job_id, payload):
+        return {'description': await self.vision._describe_uncached(payload['url'])}
+
+async def serve(index):
+    worker = Worker(index)
+    try:
+        await worker.run()
+    finally:
+        worker.reporter.close()
+        await http_client.close()
+
+def run_process(index):
+    try:
+        asyncio.run(serve(index))
+    except KeyboardInterrupt:
+        pass
+
+def main():
+    # Make sure the jobs table exists even if the bot hasn't started yet
+    init_db()
+    os.makedirs(settings.JOB_OUTPUT_DIR, exist_ok=True)
+
+    processes = {}
+    try:
+        while True:
+            for index in range(settings.WORKER_PROCESSES):
+                proc = processes.get(index)
+                if proc and proc.is_alive():
+                    continue
+                if proc:
+                    print(f"💥 Worker {index} exited with code {proc.exitcode}. Restarting...")
+                proc = multiprocessing.Process(target=run_process, args=(index,), daemon=True)
+                proc.start()
+                processes[index] = proc
+            time.sleep(RESTART_DELAY)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for proc in processes.values():
+            proc.terminate()
+            proc.join()
+
+if __name__ == '__main__':
+    main()